@@ -116,4 +116,23 @@ Example of correct output format:
   "slogan": "Your creative slogan here",
   "description": "Your detailed description here"
 }}
-"""
\ No newline at end of file
+"""
+SLOGAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "slogan": {"type": "string"},
+        "description": {"type": "string"},
+    },
+    "required": ["slogan", "description"],
+    "additionalProperties": False,
+}
+
+LYRICS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "SongTitle": {"type": "string"},
+        "Lyrics": {"type": "string"},
+    },
+    "required": ["SongTitle", "Lyrics"],
+    "additionalProperties": False,
+}
@@ -13,12 +13,16 @@ from starlette.responses import JSONResponse
 from common.log import setup_logger
 from common.response import RestResponse
 from common.tracing import Otel
+from clients.fal_jobs import start_fal_job_poller, stop_fal_job_poller
+from clients.llm_client import close_openai_clients
 from config import SETTINGS
+from infra.http_session import HTTP
 from middleware.auth_middleware import JWTAuthMiddleware
+from middleware.idempotency_middleware import IdempotencyMiddleware
 from middleware.trace_middleware import TraceIdMiddleware
 from routes import api_router, voice_router, auth_router, twitter_tts_router
-
-# from services.twitter_tts_processor import start_twitter_tts_processor, stop_twitter_tts_processor
+from services.sub_task_reaper import start_sub_task_reaper, stop_sub_task_reaper
+from services.twitter_tts_processor import start_twitter_tts_processor, stop_twitter_tts_processor
 
 Otel.init()
 setup_logger()
@@ -27,20 +31,24 @@ setup_logger()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Starting lifespan")
+    await HTTP.start()
+    await start_fal_job_poller()
+    await start_sub_task_reaper()
+    await start_twitter_tts_processor()
     yield
+    await stop_twitter_tts_processor()
+    await stop_sub_task_reaper()
+    await stop_fal_job_poller()
+    await HTTP.close()
+    await close_openai_clients()
     logging.info("Stopping lifespan")
 
 
-#     await start_twitter_tts_processor()
-#     logger.info("Twitter TTS background processor started successfully")
-#     yield
-#     await stop_twitter_tts_processor()
-#     logger.info("Twitter TTS background processor stopped successfully")
-#
-
 logger = logging.getLogger(__name__)
 app = FastAPI(lifespan=lifespan)
 FastAPIInstrumentor.instrument_app(app)
+# added first so it runs inside the auth middleware and sees the user
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(JWTAuthMiddleware)
 app.add_middleware(TraceIdMiddleware)
 app.include_router(api_router.router)
@@ -0,0 +1,241 @@
+import contextlib
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from enum import StrEnum
+
+import aiohttp
+import fal_client
+import openai
+
+from common.metrics import METRICS
+from config import SETTINGS
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit is open, the call was not sent"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuit {name} is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# names of open circuits hit inside the current track_open_circuits() scope
+_open_hits: ContextVar[list[str] | None] = ContextVar("open_circuit_hits", default=None)
+
+
+@contextlib.contextmanager
+def track_open_circuits():
+    """
+    Collect the circuits that rejected a call within the block, including calls made by
+    child tasks and by clients that swallow the error. Lets background tasks tell
+    "upstream unavailable, retry later" apart from a real failure.
+    """
+    hits: list[str] = []
+    token = _open_hits.set(hits)
+    try:
+        yield hits
+    finally:
+        _open_hits.reset(token)
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    """Client errors (4xx other than 408/429) say nothing about upstream health"""
+    status = None
+    if isinstance(e, openai.APIStatusError):
+        status = e.status_code
+    elif isinstance(e, aiohttp.ClientResponseError):
+        status = e.status
+    elif isinstance(e, fal_client.FalClientHTTPError):
+        status = e.status_code
+    if status is not None and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+def _parse_thresholds(value: str) -> dict[str, float]:
+    thresholds = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, seconds = item.split("=", 1)
+        try:
+            thresholds[name.strip()] = float(seconds)
+        except ValueError:
+            logging.warning(f"Invalid CIRCUIT_SLOW_CALLS entry: {item}")
+    return thresholds
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream host/model.
+
+    Closed: outcomes of the last CIRCUIT_WINDOW seconds are kept; once there are
+    CIRCUIT_MIN_CALLS of them and the error rate or slow call rate crosses its threshold
+    the circuit opens. Open: calls fail fast for CIRCUIT_OPEN_SECONDS. Half open: up to
+    CIRCUIT_HALF_OPEN_CALLS probe calls go through; all succeeding closes the circuit,
+    any failure opens it again.
+    """
+
+    def __init__(self, name: str, slow_call_seconds: float):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CircuitState.CLOSED
+        self._outcomes: deque[tuple[float, bool, bool]] = deque()  # (at, failed, slow)
+        self._open_until = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._stats = {"opened": 0, "rejected": 0}
+        self._publish()
+
+    def check(self):
+        """
+        Raises:
+            CircuitOpenError: while the circuit is open
+        """
+        if self.state == CircuitState.OPEN and time.monotonic() < self._open_until:
+            self._reject()
+
+    def before_call(self) -> bool:
+        """
+        Admit a call.
+
+        Returns:
+            True if the call is a half open probe
+
+        Raises:
+            CircuitOpenError: while the circuit is open or all probe slots are taken
+        """
+        if self.state == CircuitState.CLOSED:
+            return False
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() < self._open_until:
+                self._reject()
+            self._transition(CircuitState.HALF_OPEN)
+        if self._probes >= SETTINGS.CIRCUIT_HALF_OPEN_CALLS:
+            self._reject()
+        self._probes += 1
+        return True
+
+    def record(self, latency: float, failed: bool | None, probe: bool = False):
+        """
+        Record the outcome of an admitted call.
+
+        Args:
+            latency: seconds the call took
+            failed: True for an upstream failure, None if the call was abandoned (cancelled)
+            probe: value returned by before_call
+        """
+        if probe:
+            self._probes -= 1
+        if failed is None:
+            return
+        slow = latency > self.slow_call_seconds
+        now = time.monotonic()
+
+        if self.state == CircuitState.HALF_OPEN:
+            if not probe:
+                return
+            if failed or slow:
+                self._open(now)
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= SETTINGS.CIRCUIT_HALF_OPEN_CALLS:
+                    self._transition(CircuitState.CLOSED)
+            return
+        if self.state == CircuitState.OPEN:
+            return
+
+        self._outcomes.append((now, failed, slow))
+        self._prune(now)
+        calls = len(self._outcomes)
+        if calls < SETTINGS.CIRCUIT_MIN_CALLS:
+            return
+        failures = sum(1 for _, f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, _, s in self._outcomes if s)
+        if failures / calls >= SETTINGS.CIRCUIT_ERROR_RATE or slow_calls / calls >= SETTINGS.CIRCUIT_SLOW_RATE:
+            logging.warning(f"M circuit {self.name} opening: {failures}/{calls} failed, {slow_calls} slow")
+            self._open(now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._prune(now)
+        calls = len(self._outcomes)
+        failures = sum(1 for _, f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, _, s in self._outcomes if s)
+        return {
+            **self._stats,
+            "state": self.state,
+            "calls": calls,
+            "error_rate": round(failures / calls, 4) if calls else 0.0,
+            "slow_rate": round(slow_calls / calls, 4) if calls else 0.0,
+            "slow_call_seconds": self.slow_call_seconds,
+            "retry_in": round(max(self._open_until - now, 0), 1) if self.state == CircuitState.OPEN else 0,
+        }
+
+    def _reject(self):
+        self._stats["rejected"] += 1
+        METRICS.incr("circuit.rejected", circuit=self.name)
+        hits = _open_hits.get()
+        if hits is not None:
+            hits.append(self.name)
+        raise CircuitOpenError(self.name, max(self._open_until - time.monotonic(), 0))
+
+    def _open(self, now: float):
+        self._open_until = now + SETTINGS.CIRCUIT_OPEN_SECONDS
+        self._stats["opened"] += 1
+        METRICS.incr("circuit.opened", circuit=self.name)
+        self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState):
+        if state != self.state:
+            logging.info(f"M circuit {self.name} {self.state} -> {state}")
+        self.state = state
+        self._outcomes.clear()
+        self._probe_successes = 0
+        self._publish()
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - SETTINGS.CIRCUIT_WINDOW:
+            self._outcomes.popleft()
+
+    def _publish(self):
+        value = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}[self.state]
+        METRICS.set_gauge("circuit.state", value, circuit=self.name)
+
+
+class CircuitBreakers:
+    """
+    Registry of breakers, named like the governor limiters ("proxy:gpt-4o-image", "fal:<app>", "xapi").
+    Slow call thresholds are looked up by full name, then by provider prefix.
+    """
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._slow_calls = _parse_thresholds(SETTINGS.CIRCUIT_SLOW_CALLS)
+        METRICS.register_collector("circuits", self.stats)
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            slow = self._slow_calls.get(name) or self._slow_calls.get(name.split(":", 1)[0]) \
+                   or SETTINGS.CIRCUIT_SLOW_CALL_SECONDS
+            breaker = CircuitBreaker(name, slow)
+            self._breakers[name] = breaker
+        return breaker
+
+    def stats(self) -> dict:
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
+
+
+# Global breaker registry
+BREAKERS = CircuitBreakers()
@@ -0,0 +1,334 @@
+import asyncio
+import datetime
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import fal_client
+
+from clients.governor import GOVERNOR
+from config import SETTINGS
+from entities.dto import FalJob, FalJobStatus
+from infra.db import fal_job_save, fal_job_lease_due, fal_job_finish, fal_job_update, fal_job_get_by_request_id, \
+    create_fal_job_indexes
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[FalJob], Awaitable[None]]
+
+_PENDING = (FalJobStatus.QUEUED, FalJobStatus.IN_PROGRESS)
+
+
+class FalJobPoller:
+    """
+    Central submit-and-poll orchestration for fal requests.
+
+    Requests are submitted once and persisted in the fal_job collection. A single loop polls
+    the status of every pending job and, on completion, runs the handler registered for the
+    job kind (e.g. writing a video result into its sub task) and wakes up local waiters.
+    Pending jobs are picked up again after a restart, and polling is leased per job so several
+    processes can run the poller at once.
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self.processing_task: Optional[asyncio.Task] = None
+        self._handlers: dict[str, JobHandler] = {}
+        self._waiters: dict[str, asyncio.Event] = {}
+        self._waiter_counts: dict[str, int] = {}  # concurrent waits sharing an event
+        self._background: set[asyncio.Task] = set()
+
+    def register_handler(self, kind: str, handler: JobHandler):
+        """
+        Register the completion handler for a job kind.
+
+        Args:
+            kind: Job kind passed to submit
+            handler: Coroutine called once with the finished job (completed, failed or cancelled)
+        """
+        self._handlers[kind] = handler
+
+    async def start(self):
+        """Start the background poller"""
+        if self.is_running:
+            logger.warning("fal job poller is already running")
+            return
+
+        await create_fal_job_indexes()
+        self.is_running = True
+        self.processing_task = asyncio.create_task(self._process_loop())
+        logger.info("fal job poller started")
+
+    async def stop(self):
+        """Stop the background poller"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        if self.processing_task:
+            self.processing_task.cancel()
+            try:
+                await self.processing_task
+            except asyncio.CancelledError:
+                pass
+        logger.info("fal job poller stopped")
+
+    async def submit(self, application: str, arguments: dict, kind: str = "", task_id: str = "",
+                     sub_task_id: str = "", poll_interval: float | None = None) -> str:
+        """
+        Submit a fal request and persist it for polling.
+
+        Args:
+            application: fal application id
+            arguments: application arguments
+            kind: completion handler kind, empty for jobs that are only awaited inline
+            task_id: owning task id
+            sub_task_id: owning sub task id
+            poll_interval: seconds between status polls, defaults to FAL_POLL_INTERVAL
+
+        Returns:
+            fal request id
+        """
+        handle = await GOVERNOR.call(f"fal:{application}", lambda: fal_client.submit_async(
+            application,
+            arguments=arguments,
+            webhook_url=SETTINGS.FAL_WEBHOOK_URL or None,
+        ))
+        now = datetime.datetime.now()
+        interval = poll_interval if poll_interval is not None else SETTINGS.FAL_POLL_INTERVAL
+        job = FalJob(
+            request_id=handle.request_id,
+            application=application,
+            kind=kind,
+            task_id=task_id,
+            sub_task_id=sub_task_id,
+            poll_interval=interval,
+            next_poll_at=now + datetime.timedelta(seconds=interval),
+            created_at=now,
+        )
+        await fal_job_save(job)
+        logger.info(f"M fal job submitted {application} {job.request_id} kind={kind} sub_task={sub_task_id}")
+        return job.request_id
+
+    async def wait(self, request_id: str, timeout: float | None = None) -> FalJob:
+        """
+        Wait until a job reaches a terminal status.
+
+        Completion is normally signalled by the local poller; the job document is re-read
+        periodically in case another process finished it.
+
+        Returns:
+            The finished job
+
+        Raises:
+            asyncio.TimeoutError: if the job is still pending after timeout
+        """
+        timeout = timeout if timeout is not None else SETTINGS.FAL_JOB_TIMEOUT
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = self._waiters.setdefault(request_id, asyncio.Event())
+        self._waiter_counts[request_id] = self._waiter_counts.get(request_id, 0) + 1
+        try:
+            while True:
+                job = await fal_job_get_by_request_id(request_id)
+                if job and job.status not in _PENDING:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"fal job {request_id} timed out")
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, max(SETTINGS.FAL_POLL_INTERVAL * 5, 10)))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # the event is shared, only the last waiter removes it
+            self._waiter_counts[request_id] -= 1
+            if not self._waiter_counts[request_id]:
+                del self._waiter_counts[request_id]
+                self._waiters.pop(request_id, None)
+
+    async def run(self, application: str, arguments: dict, timeout: float | None = None,
+                  poll_interval: float = 1) -> Any:
+        """
+        Submit a request and wait for its result without holding a fal handler open.
+
+        Returns:
+            The fal result
+
+        Raises:
+            Exception: if the job failed, was cancelled or timed out
+        """
+        request_id = await self.submit(application, arguments, poll_interval=poll_interval)
+        try:
+            job = await self.wait(request_id, timeout)
+        except asyncio.CancelledError:
+            # the caller gave up (e.g. lost a hedged race), stop paying for the render
+            task = asyncio.create_task(self.cancel(application, request_id))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            raise
+        if job.status != FalJobStatus.COMPLETED:
+            raise Exception(f"fal job {request_id} {job.status}: {job.error}")
+        return job.result
+
+    async def cancel(self, application: str, request_id: str):
+        """Cancel a pending job upstream and mark it cancelled"""
+        try:
+            await fal_client.cancel_async(application, request_id)
+        except Exception as e:
+            logger.warning(f"fal cancel failed {request_id}: {e}")
+        await self._finish(request_id, FalJobStatus.CANCELLED, error="cancelled")
+
+    async def resume(self, application: str, request_id: str, kind: str, task_id: str = "", sub_task_id: str = "",
+                     created_at: datetime.datetime | None = None) -> bool:
+        """
+        Pick up a request whose owner lost track of it, e.g. across a restart.
+
+        A pending job is left to the poller. A request missing from the fal_job collection is
+        tracked again, and the handler of a finished job runs again for owners that never saw
+        it finish, so handlers must drop results of sub tasks that are no longer waiting.
+
+        Args:
+            application: fal application id
+            request_id: fal request id
+            kind: completion handler kind
+            task_id: owning task id
+            sub_task_id: owning sub task id
+            created_at: submit time, the job timeout counts from it; defaults to now
+
+        Returns:
+            True if the request was tracked again or its handler ran again
+        """
+        job = await fal_job_get_by_request_id(request_id)
+        if job and job.status in _PENDING:
+            return False
+
+        if job is None:
+            now = datetime.datetime.now()
+            await fal_job_save(FalJob(
+                request_id=request_id,
+                application=application,
+                kind=kind,
+                task_id=task_id,
+                sub_task_id=sub_task_id,
+                poll_interval=SETTINGS.FAL_POLL_INTERVAL,
+                next_poll_at=now,
+                created_at=created_at or now,
+            ))
+            logger.info(f"M fal job resumed {application} {request_id} kind={kind} sub_task={sub_task_id}")
+            return True
+
+        handler = self._handlers.get(job.kind)
+        if not handler:
+            return False
+        logger.info(f"M fal job {request_id} {job.status} redelivered kind={job.kind}")
+        try:
+            await handler(job)
+        except Exception as e:
+            logger.error(f"M fal job handler {job.kind} failed for {request_id}: {e}", exc_info=True)
+        return True
+
+    async def handle_webhook(self, payload: dict):
+        """
+        Handle a fal webhook call.
+
+        The payload is only used as a hint: the result is fetched from fal so a forged call
+        cannot inject data, and unknown request ids are ignored.
+        """
+        request_id = payload.get("request_id") or payload.get("gateway_request_id")
+        if not request_id:
+            return
+        job = await fal_job_get_by_request_id(request_id)
+        if not job or job.status not in _PENDING:
+            return
+        await self._poll(job)
+
+    async def _process_loop(self):
+        """Main polling loop"""
+        while self.is_running:
+            try:
+                jobs = await fal_job_lease_due(SETTINGS.FAL_POLL_BATCH_SIZE)
+                if jobs:
+                    semaphore = asyncio.Semaphore(SETTINGS.FAL_POLL_CONCURRENCY)
+
+                    async def _guarded(job: FalJob):
+                        async with semaphore:
+                            await self._poll(job)
+
+                    await asyncio.gather(*[_guarded(job) for job in jobs], return_exceptions=True)
+                await asyncio.sleep(SETTINGS.FAL_POLL_LOOP_INTERVAL)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in fal job polling loop: {e}", exc_info=True)
+                await asyncio.sleep(SETTINGS.FAL_POLL_LOOP_INTERVAL)
+
+    async def _poll(self, job: FalJob):
+        age = (datetime.datetime.now() - job.created_at).total_seconds()
+        try:
+            status = await fal_client.status_async(job.application, job.request_id)
+        except Exception as e:
+            logger.warning(f"fal status failed {job.request_id}: {e}")
+            if job.poll_errors + 1 >= SETTINGS.FAL_JOB_MAX_POLL_ERRORS:
+                await self._finish(job.request_id, FalJobStatus.FAILED, error=f"status poll failed: {e}")
+            else:
+                await fal_job_update(job.request_id, {"poll_errors": job.poll_errors + 1})
+            return
+
+        if isinstance(status, fal_client.Completed):
+            if status.error:
+                await self._finish(job.request_id, FalJobStatus.FAILED, error=status.error)
+                return
+            try:
+                result = await GOVERNOR.call(f"fal:{job.application}",
+                                             lambda: fal_client.result_async(job.application, job.request_id))
+            except Exception as e:
+                logger.error(f"M fal result failed {job.request_id}: {e}", exc_info=True)
+                await self._finish(job.request_id, FalJobStatus.FAILED, error=str(e))
+                return
+            await self._finish(job.request_id, FalJobStatus.COMPLETED, result=result)
+            return
+
+        if age > SETTINGS.FAL_JOB_TIMEOUT:
+            logger.warning(f"M fal job timed out {job.request_id} after {age:.0f}s")
+            try:
+                await fal_client.cancel_async(job.application, job.request_id)
+            except Exception:
+                pass
+            await self._finish(job.request_id, FalJobStatus.FAILED, error="timeout")
+            return
+
+        fields = {"poll_errors": 0}
+        if isinstance(status, fal_client.InProgress) and job.status != FalJobStatus.IN_PROGRESS:
+            fields["status"] = FalJobStatus.IN_PROGRESS
+        await fal_job_update(job.request_id, fields)
+
+    async def _finish(self, request_id: str, status: FalJobStatus, result: dict | None = None, error: str = ""):
+        job = await fal_job_finish(request_id, status, result, error)
+        event = self._waiters.get(request_id)
+        if event:
+            event.set()
+        if not job:
+            # finished elsewhere
+            return
+
+        logger.info(f"M fal job {request_id} {status} kind={job.kind} {error}")
+        handler = self._handlers.get(job.kind)
+        if handler:
+            try:
+                await handler(job)
+            except Exception as e:
+                logger.error(f"M fal job handler {job.kind} failed for {request_id}: {e}", exc_info=True)
+
+
+# Global poller instance
+FAL_JOBS = FalJobPoller()
+
+
+async def start_fal_job_poller():
+    """Start the fal job poller"""
+    await FAL_JOBS.start()
+
+
+async def stop_fal_job_poller():
+    """Stop the fal job poller"""
+    await FAL_JOBS.stop()
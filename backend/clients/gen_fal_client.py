@@ -1,15 +1,44 @@
 import logging
 
-import fal_client
-
+from clients.fal_jobs import FAL_JOBS
 from config import SETTINGS
 from entities.dto import GenVideoResp
 from infra.file import download_and_upload_url
 
 
+def parse_fal_video_url(result: dict | None) -> str | None:
+    if result and isinstance(result, dict):
+        if "video" in result and result["video"] and isinstance(result["video"], dict):
+            if "url" in result["video"] and result["video"]["url"]:
+                return result["video"]["url"]
+    return None
+
+
+async def veo3_submit_video_v2(img_url: str, prompt: str, task_id: str, sub_task_id: str,
+                               kind: str = "video") -> str:
+    """
+    Submit an image to video job, the registered handler for kind completes the sub task.
+
+    Returns:
+        fal request id
+    """
+    return await FAL_JOBS.submit(
+        SETTINGS.IMAGE_TO_VIDEO_V2,
+        arguments={
+            "prompt": prompt,
+            "image_url": img_url,
+            "negative_prompt": "blur, distort, and low quality",
+            "cfg_scale": 0.5
+        },
+        kind=kind,
+        task_id=task_id,
+        sub_task_id=sub_task_id,
+    )
+
+
 async def veo3_gen_video_svc_v2(img_url: str, prompt: str) -> GenVideoResp | None:
     try:
-        handler = await fal_client.submit_async(
+        result = await FAL_JOBS.run(
             SETTINGS.IMAGE_TO_VIDEO_V2,
             arguments={
                 "prompt": prompt,
@@ -17,20 +46,17 @@ async def veo3_gen_video_svc_v2(img_url: str, prompt: str) -> GenVideoResp | Non
                 "negative_prompt": "blur, distort, and low quality",
                 "cfg_scale": 0.5
             },
+            poll_interval=SETTINGS.FAL_POLL_INTERVAL,
         )
-
-        result = await handler.get()
         logging.debug(f"result: {result}")
-        if result and isinstance(result, dict):
-            if "video" in result and result["video"] and isinstance(result["video"], dict):
-                if "url" in result["video"] and result["video"]["url"]:
-                    _view_url = result["video"]["url"]
-                    a_view_url = await download_and_upload_url(_view_url)
-                    return GenVideoResp(
-                        out_id="",
-                        view_url=a_view_url,
-                        download_url=""
-                    )
+        _view_url = parse_fal_video_url(result)
+        if _view_url:
+            a_view_url = await download_and_upload_url(_view_url)
+            return GenVideoResp(
+                out_id="",
+                view_url=a_view_url,
+                download_url=""
+            )
     except Exception as e:
         logging.error(f"M veo3_gen_video_svc_v2 error: {e}", exc_info=True)
     return None
@@ -38,47 +64,42 @@ async def veo3_gen_video_svc_v2(img_url: str, prompt: str) -> GenVideoResp | Non
 
 async def veo3_gen_video_svc_v3(img_url: str, prompt: str) -> GenVideoResp | None:
     try:
-        handler = await fal_client.submit_async(
+        result = await FAL_JOBS.run(
             SETTINGS.IMAGE_TO_VIDEO_V3,
             arguments={
                 "prompt": prompt,
                 "image_url": img_url,
             },
+            poll_interval=SETTINGS.FAL_POLL_INTERVAL,
         )
-
-        result = await handler.get()
         logging.debug(f"result: {result}")
-        if result and isinstance(result, dict):
-            if "video" in result and result["video"] and isinstance(result["video"], dict):
-                if "url" in result["video"] and result["video"]["url"]:
-                    _view_url = result["video"]["url"]
-                    a_view_url = await download_and_upload_url(_view_url)
-                    return GenVideoResp(
-                        out_id="",
-                        view_url=a_view_url,
-                        download_url=""
-                    )
+        _view_url = parse_fal_video_url(result)
+        if _view_url:
+            a_view_url = await download_and_upload_url(_view_url)
+            return GenVideoResp(
+                out_id="",
+                view_url=a_view_url,
+                download_url=""
+            )
     except Exception as e:
-        logging.error(f"M veo3_gen_video_svc_v2 error: {e}", exc_info=True)
+        logging.error(f"M veo3_gen_video_svc_v3 error: {e}", exc_info=True)
     return None
 
 
 async def gen_img_svc_v3(img_url: str, prompt: str) -> str | None:
     try:
-        handler = await fal_client.submit_async(
-            SETTINGS.IMAGE_TO_VIDEO_V3,
+        result = await FAL_JOBS.run(
+            SETTINGS.IMAGE_TO_IMAGE_V3,
             arguments={
                 "prompt": prompt,
                 "image_url": img_url,
             },
         )
-
-        result = await handler.get()
         if result and isinstance(result, dict):
             if "images" in result and result["images"] and isinstance(result["images"], list):
                 img = result["images"][0]
                 if "url" in img and img["url"]:
                     return img["url"]
     except Exception as e:
-        logging.error(f"M veo3_gen_video_svc_v2 error: {e}", exc_info=True)
+        logging.error(f"M gen_img_svc_v3 error: {e}", exc_info=True)
     return None
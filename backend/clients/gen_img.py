@@ -1,10 +1,19 @@
+import asyncio
+import hashlib
 import logging
+import time
 
 import aiohttp
-from openai import AsyncOpenAI
+import openai
 
+from clients.governor import GOVERNOR, UpstreamRateLimited, parse_retry_after
+from clients.llm_client import proxy_client
+from common.json_extract import extract_json_object, matches_schema
+from common.metrics import METRICS
+from common.ttl_cache import AsyncTTLCache
 from config import SETTINGS
 from infra.file import download_and_upload_url, img_url_to_base64
+from infra.http_session import HTTP
 
 
 async def gen_gpt_4o_img_svc(img_urls: list[str], prompt: str, scenario: str = "") -> str | None:
@@ -34,47 +43,126 @@ async def gen_gpt_4o_img_svc(img_urls: list[str], prompt: str, scenario: str = "
             "Content-Type": "application/json",
         }
 
-        logging.info(f"Generating...")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{SETTINGS.PROXY_OPENAI_BASE_URL}/chat/completions", json=data, headers=headers,
-                                    timeout=1200) as response:
+        async def _post() -> dict | None:
+            logging.info(f"Generating...")
+            async with HTTP.session().post(f"{SETTINGS.PROXY_OPENAI_BASE_URL}/chat/completions", json=data,
+                                           headers=headers, timeout=aiohttp.ClientTimeout(total=1200)) as response:
                 logging.info(f"Response: {response.status}")
+                if response.status in (429, 503):
+                    raise UpstreamRateLimited(f"gen_img: http status: {response.status}", response.status,
+                                              parse_retry_after(response.headers))
+                if response.status >= 500:
+                    response.raise_for_status()
                 if response.status != 200:
                     logging.warning(f'gen_img: http status: {response.status} {scenario}')
                     return None
-                result = await response.json()
-                if "error" in result:
-                    return None
-                if "choices" in result and isinstance(result["choices"], list):
-                    for choice in result["choices"]:
-                        if "message" in choice and "content" in choice["message"]:
-                            content = choice["message"]["content"]
-                            import re
-                            matches = re.findall(r"!\[.*?\]\((https?://[^\s]+)\)", content)
-                            for image_url in matches:
-                                if image_url:
-                                    ret_img = await download_and_upload_url(image_url)
-                                    if ret_img:
-                                        return ret_img
+                return await response.json()
+
+        result = await GOVERNOR.call("proxy:gpt-4o-image", _post)
+        if not result or "error" in result:
+            return None
+        if "choices" in result and isinstance(result["choices"], list):
+            for choice in result["choices"]:
+                if "message" in choice and "content" in choice["message"]:
+                    content = choice["message"]["content"]
+                    import re
+                    matches = re.findall(r"!\[.*?\]\((https?://[^\s]+)\)", content)
+                    for image_url in matches:
+                        if image_url:
+                            ret_img = await download_and_upload_url(image_url)
+                            if ret_img:
+                                return ret_img
     except Exception as e:
         logging.error(f"gen_img error: {e} {scenario}", exc_info=True)
     return None
 
 
-client = AsyncOpenAI(
-    api_key=SETTINGS.PROXY_OPENAI_API_KEY,
-    base_url=SETTINGS.PROXY_OPENAI_BASE_URL
-)
+# completions of identical prompts, e.g. the slogan of a popular account onboarded again
+_text_cache = AsyncTTLCache("llm_text", ttl=SETTINGS.LLM_CACHE_TTL, max_size=SETTINGS.LLM_CACHE_SIZE)
+
+
+def _text_cache_key(model: str, prompt: str, **params) -> tuple:
+    return model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), tuple(sorted(params.items()))
+
 
+# models whose endpoint rejected json_schema response_format, prompted for plain JSON instead
+_json_schema_unsupported: set[str] = set()
 
-async def gen_text(prompt: str) -> str | None:
-    resp = await client.chat.completions.create(
-        model="grok-3",
+
+async def _complete(model: str, prompt: str, response_format: dict | None = None) -> str | None:
+    kwargs = {"response_format": response_format} if response_format else {}
+    resp = await GOVERNOR.call(f"proxy:{model}", lambda: proxy_client.chat.completions.create(
+        model=model,
         messages=[
             {
                 "role": "user",
                 "content": prompt
             }
-        ]
-    )
-    return resp.choices[0].message.content
+        ],
+        **kwargs
+    ))
+    # empty completions are returned as None, which is never cached
+    return resp.choices[0].message.content or None
+
+
+async def gen_json(prompt: str, schema: dict, name: str, bypass_cache: bool = False) -> dict | None:
+    """
+    Complete a prompt into a JSON object matching schema.
+
+    The schema is sent as a json_schema response_format; endpoints that reject it are
+    remembered and prompted for plain JSON. The object is extracted from the response with a
+    tolerant parser (prose, code fences, nested braces, trailing commas, truncation). Unusable
+    responses are retried, at most LLM_JSON_MAX_ATTEMPTS times within LLM_JSON_DEADLINE
+    seconds, and a retry is only started if it can finish in the remaining time.
+
+    :param prompt: User prompt, should describe the expected JSON.
+    :param schema: JSON schema of the object.
+    :param name: Schema name, also part of the cache key.
+    :param bypass_cache: Skip a cached response, for explicit regenerates.
+    :return: The object, or None if no attempt produced a usable one.
+    """
+    model = "grok-3"
+    key = _text_cache_key(model, prompt, schema=name)
+    response_format = {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+    start = time.monotonic()
+    longest = 0.0
+
+    for attempt in range(SETTINGS.LLM_JSON_MAX_ATTEMPTS):
+        remaining = SETTINGS.LLM_JSON_DEADLINE - (time.monotonic() - start)
+        if attempt and remaining < longest:
+            logging.warning(f"M gen_json {name}: {remaining:.0f}s left, not enough for another attempt")
+            break
+
+        async def _load() -> str | None:
+            if model in _json_schema_unsupported:
+                return await _complete(model, prompt)
+            try:
+                return await _complete(model, prompt, response_format)
+            except openai.BadRequestError as e:
+                logging.warning(f"M {model} rejected json_schema response_format, using plain JSON: {e}")
+                _json_schema_unsupported.add(model)
+                return await _complete(model, prompt)
+
+        attempt_start = time.monotonic()
+        text = None
+        try:
+            text = await asyncio.wait_for(
+                _text_cache.get_or_load(key, _load, bypass=bypass_cache or attempt > 0)
+                if SETTINGS.LLM_CACHE_TTL > 0 else _load(),
+                timeout=max(remaining, 1))
+            data = extract_json_object(text)
+            if matches_schema(data, schema):
+                METRICS.incr("llm_json.attempts", attempt + 1, schema=name)
+                return data
+            logging.warning(f"M gen_json {name} attempt {attempt + 1} unusable response: {text}")
+        except asyncio.TimeoutError:
+            logging.warning(f"M gen_json {name} attempt {attempt + 1} timed out")
+        except Exception as e:
+            logging.error(f"M gen_json {name} attempt {attempt + 1} error: {e}", exc_info=True)
+        longest = max(longest, time.monotonic() - attempt_start)
+        # an unusable response must not be served to the next caller
+        _text_cache.invalidate(key)
+
+    METRICS.incr("llm_json.failed", schema=name)
+    return None
+
@@ -2,12 +2,11 @@ import json
 import logging
 import re
 
-import aiohttp
-import requests
-
+from clients.sse import iter_sse
 from config import SETTINGS
 from entities.dto import GenVideoResp
 from infra.file import download_and_upload_url, img_url_to_base64
+from infra.http_session import HTTP
 
 task_id_pattern = re.compile(r"Task ID: `([^`]+)`")
 watch_pattern = re.compile(r"\[▶️ Watch Online\]\(([^)]+)\)")
@@ -44,43 +43,35 @@ async def veo3_gen_video_svc(img_url: str, prompt: str) -> GenVideoResp | None:
 
         data = {}
         success = False
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                if resp.status == 200:
-                    async for chunk in resp.content:
-                        if chunk:
-                            text = chunk.decode("utf-8", errors="ignore").strip()
-                            logging.info(f"veo3_gen_video_chunk {text}")
-
-                            for line in text.splitlines():
-                                line = line.strip()
-                                if not line.startswith("data: "):
-                                    continue
-                                if line == "data: [DONE]":
-                                    continue
-
-                            json_str = line[len("data: "):].strip()
-                            try:
-                                obj = json.loads(json_str)
-                            except json.JSONDecodeError:
-                                logging.warning(f"Not valid JSON: {json_str}")
-                                continue
+        content = ""
+        async with HTTP.session().post(url, json=payload, headers=headers) as resp:
+            if resp.status == 200:
+                async for event in iter_sse(resp.content.iter_any()):
+                    logging.info(f"veo3_gen_video_chunk {event.data}")
+                    try:
+                        obj = event.json()
+                    except json.JSONDecodeError:
+                        logging.warning(f"Not valid JSON: {event.data}")
+                        continue
 
-                            content = obj["choices"][0]["delta"].get("content", "")
+                    if not obj.get("choices"):
+                        continue
+                    # links may be split across deltas, match on everything received so far
+                    content += obj["choices"][0].get("delta", {}).get("content") or ""
 
-                            m = task_id_pattern.search(content)
-                            if m:
-                                data["task_id"] = m.group(1)
+                    m = task_id_pattern.search(content)
+                    if m:
+                        data["task_id"] = m.group(1)
 
-                            wm = watch_pattern.search(content)
-                            dm = download_pattern.search(content)
-                            if wm:
-                                data["watch_url"] = wm.group(1)
-                            if dm:
-                                data["download_url"] = dm.group(1)
-                                success = True
-                else:
-                    logging.error(f"Request failed with status {resp.status}")
+                    wm = watch_pattern.search(content)
+                    dm = download_pattern.search(content)
+                    if wm:
+                        data["watch_url"] = wm.group(1)
+                    if dm:
+                        data["download_url"] = dm.group(1)
+                        success = True
+            else:
+                logging.error(f"Request failed with status {resp.status}")
         if success:
             logging.info(f"veo3_gen_video_svc success {data}")
             return GenVideoResp(
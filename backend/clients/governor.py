@@ -0,0 +1,333 @@
+import asyncio
+import datetime
+import email.utils
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+import fal_client
+import openai
+
+from clients.circuit_breaker import BREAKERS, CircuitOpenError, is_upstream_failure
+from common.metrics import METRICS
+from common.timing import add_span
+from config import SETTINGS
+
+
+class UpstreamRateLimited(Exception):
+    """Upstream answered with a throttling status, raised by clients that do not raise on their own"""
+
+    def __init__(self, msg: str, status: int = 429, retry_after: float | None = None):
+        super().__init__(msg)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LimiterQueueFull(Exception):
+    """Too many calls are already waiting for the limiter"""
+
+
+_THROTTLE_STATUS = {429, 502, 503, 504, 529}
+
+
+def parse_retry_after(headers) -> float | None:
+    """
+    Seconds to wait according to retry-after-ms / Retry-After (seconds or HTTP date).
+    """
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return float(value) / 1000
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            at = email.utils.parsedate_to_datetime(value)
+            return max((at - datetime.datetime.now(at.tzinfo)).total_seconds(), 0)
+    except Exception:
+        return None
+
+
+def classify_error(e: BaseException) -> tuple[bool, bool, float | None]:
+    """
+    Classify an upstream error.
+
+    Returns:
+        (retryable, throttled, retry_after): retryable errors are retried with backoff,
+        throttled errors shrink the limiter window
+    """
+    if isinstance(e, UpstreamRateLimited):
+        return True, True, e.retry_after
+    if isinstance(e, openai.APIStatusError):
+        throttled = e.status_code in _THROTTLE_STATUS
+        return throttled, throttled, parse_retry_after(e.response.headers) if throttled else None
+    if isinstance(e, openai.APITimeoutError):
+        return False, True, None
+    if isinstance(e, openai.APIConnectionError):
+        return True, False, None
+    if isinstance(e, aiohttp.ClientResponseError):
+        throttled = e.status in _THROTTLE_STATUS
+        return throttled, throttled, parse_retry_after(e.headers) if throttled else None
+    if isinstance(e, fal_client.FalClientHTTPError):
+        throttled = e.status_code in _THROTTLE_STATUS
+        return throttled, throttled, parse_retry_after(e.response_headers) if throttled else None
+    if isinstance(e, asyncio.TimeoutError):
+        # the request may still be running upstream, do not resend it
+        return False, True, None
+    if isinstance(e, aiohttp.ClientConnectionError):
+        return True, False, None
+    return False, False, None
+
+
+class Limiter:
+    """
+    Concurrency limiter for one provider/model.
+
+    The window starts at max_in_flight and is adjusted with AIMD: it grows by about one slot
+    per window of successful calls and is halved when upstream throttles or latency jumps
+    well above its moving average. Callers beyond the window queue in FIFO order, up to
+    queue_depth waiters.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, queue_depth: int):
+        self.name = name
+        self.max_in_flight = max(max_in_flight, 1)
+        self.queue_depth = queue_depth
+        self.limit: float = float(self.max_in_flight)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._latency_ewma: float | None = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        self._stats = {"calls": 0, "throttled": 0, "retries": 0, "rejected": 0, "decreases": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def acquire(self) -> float:
+        """
+        Take a slot, queueing if the window is full.
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            LimiterQueueFull: if queue_depth callers are already waiting
+        """
+        self._stats["calls"] += 1
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            return 0.0
+        if len(self._waiters) >= self.queue_depth:
+            self._stats["rejected"] += 1
+            METRICS.incr("governor.rejected", limiter=self.name)
+            raise LimiterQueueFull(f"{self.name}: {len(self._waiters)} calls already waiting")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._publish()
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # slot was granted just before the cancellation
+                self._release_slot()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+                self._publish()
+            raise
+        waited = time.monotonic() - start
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        METRICS.incr("governor.queue_wait_seconds", waited, limiter=self.name)
+        return waited
+
+    def release(self, latency: float, throttled: bool = False):
+        """
+        Return a slot and feed the outcome into the window.
+
+        Args:
+            latency: seconds the call took
+            throttled: upstream signalled overload (429/503/timeout)
+        """
+        now = time.monotonic()
+        if throttled:
+            self._stats["throttled"] += 1
+            METRICS.incr("governor.throttled", limiter=self.name)
+            self._decrease(now)
+        else:
+            slow = (self._latency_ewma is not None and self._samples >= SETTINGS.GOVERNOR_LATENCY_MIN_SAMPLES
+                    and latency > self._latency_ewma * SETTINGS.GOVERNOR_LATENCY_FACTOR)
+            if slow:
+                self._decrease(now)
+            elif self.limit < self.max_in_flight:
+                self.limit = min(self.limit + 1 / self.limit, float(self.max_in_flight))
+            self._latency_ewma = latency if self._latency_ewma is None \
+                else 0.8 * self._latency_ewma + 0.2 * latency
+            self._samples += 1
+        self._release_slot()
+
+    def abandon(self):
+        """Return a slot without feeding the window, for calls that never reached upstream or were cancelled"""
+        self._release_slot()
+
+    def record_retry(self):
+        self._stats["retries"] += 1
+        METRICS.incr("governor.retries", limiter=self.name)
+
+    def stats(self) -> dict:
+        waited = self._stats["calls"] - self._stats["rejected"]
+        return {
+            **self._stats,
+            "limit": round(self.limit, 2),
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "queue_depth": self.queue_depth,
+            "avg_queue_wait": round(self._wait_total / waited, 4) if waited else 0.0,
+            "max_queue_wait": round(self._wait_max, 4),
+            "latency_ewma": round(self._latency_ewma, 4) if self._latency_ewma is not None else None,
+        }
+
+    def _decrease(self, now: float):
+        # at most one decrease per cooldown, a burst of 429s is one congestion signal
+        if now - self._last_decrease < SETTINGS.GOVERNOR_DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self._stats["decreases"] += 1
+        self.limit = max(self.limit * SETTINGS.GOVERNOR_DECREASE_FACTOR, float(SETTINGS.GOVERNOR_MIN_IN_FLIGHT))
+        logging.info(f"M governor {self.name} window decreased to {self.limit:.2f}")
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+        self._publish()
+
+    def _publish(self):
+        METRICS.set_gauge("governor.in_flight", self.in_flight, limiter=self.name)
+        METRICS.set_gauge("governor.waiting", len(self._waiters), limiter=self.name)
+        METRICS.set_gauge("governor.limit", round(self.limit, 2), limiter=self.name)
+
+
+def _parse_limits(value: str) -> dict[str, tuple[int, int]]:
+    limits = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, spec = item.split("=", 1)
+        max_in_flight, _, queue_depth = spec.partition(":")
+        try:
+            limits[name.strip()] = (int(max_in_flight), int(queue_depth or SETTINGS.GOVERNOR_DEFAULT_QUEUE_DEPTH))
+        except ValueError:
+            logging.warning(f"Invalid GOVERNOR_LIMITS entry: {item}")
+    return limits
+
+
+class Governor:
+    """
+    Registry of named limiters, e.g. "fal:<application>", "proxy:<model>" or "xapi".
+
+    Limits are looked up by full name, then by provider prefix (the part before ":"),
+    then fall back to the defaults.
+    """
+
+    def __init__(self):
+        self._limiters: dict[str, Limiter] = {}
+        self._limits = _parse_limits(SETTINGS.GOVERNOR_LIMITS)
+        METRICS.register_collector("governor", self.stats)
+
+    def limiter(self, name: str) -> Limiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            max_in_flight, queue_depth = self._limits.get(name) or self._limits.get(name.split(":", 1)[0]) or (
+                SETTINGS.GOVERNOR_DEFAULT_MAX_IN_FLIGHT, SETTINGS.GOVERNOR_DEFAULT_QUEUE_DEPTH)
+            limiter = Limiter(name, max_in_flight, queue_depth)
+            self._limiters[name] = limiter
+        return limiter
+
+    async def call(self, name: str, fn: Callable[[], Awaitable[Any]], max_retries: int | None = None) -> Any:
+        """
+        Run fn under the named limiter, retrying throttled calls with jittered exponential
+        backoff. A Retry-After from upstream is honored as the minimum delay. Calls fail fast
+        with CircuitOpenError while the circuit breaker of the same name is open.
+
+        Args:
+            name: limiter name
+            fn: zero-argument coroutine function performing one upstream call
+            max_retries: defaults to GOVERNOR_MAX_RETRIES
+
+        Returns:
+            Result of fn
+
+        Raises:
+            CircuitOpenError: if the circuit is open
+            LimiterQueueFull: if too many calls are waiting
+        """
+        limiter = self.limiter(name)
+        breaker = BREAKERS.get(name)
+        max_retries = SETTINGS.GOVERNOR_MAX_RETRIES if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            breaker.check()
+            await limiter.acquire()
+            try:
+                probe = breaker.before_call()
+            except CircuitOpenError:
+                limiter.abandon()
+                raise
+            started_at = datetime.datetime.now()
+            start = time.monotonic()
+            throttled = False
+            failed = None
+            try:
+                result = await fn()
+                failed = False
+                return result
+            except Exception as e:
+                failed = is_upstream_failure(e)
+                retryable, throttled, retry_after = classify_error(e)
+                if not retryable or attempt >= max_retries:
+                    raise
+                if retry_after is not None and retry_after > SETTINGS.GOVERNOR_RETRY_AFTER_MAX:
+                    logging.warning(f"M governor {name} retry-after {retry_after}s too long, giving up")
+                    raise
+            finally:
+                latency = time.monotonic() - start
+                if failed is None:
+                    limiter.abandon()
+                else:
+                    limiter.release(latency, throttled)
+                breaker.record(latency, failed, probe)
+                add_span("provider", name, started_at, latency, failed is False)
+
+            attempt += 1
+            delay = min(SETTINGS.GOVERNOR_BACKOFF_MAX, SETTINGS.GOVERNOR_BACKOFF_BASE * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            if retry_after is not None:
+                delay = max(delay, retry_after + random.uniform(0, SETTINGS.GOVERNOR_BACKOFF_BASE))
+            limiter.record_retry()
+            logging.info(f"M governor {name} retry {attempt}/{max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+# Global governor instance
+GOVERNOR = Governor()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from common.metrics import METRICS
+from config import SETTINGS
+
+
+def _parse_budgets(value: str) -> dict[str, float]:
+    budgets = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, budget = item.split("=", 1)
+        try:
+            budgets[name.strip()] = float(budget)
+        except ValueError:
+            logging.warning(f"Invalid HEDGE_BUDGETS entry: {item}")
+    return budgets
+
+
+class HedgePolicy:
+    """
+    Hedging state for one scenario.
+
+    The hedge delay is the HEDGE_QUANTILE of recent primary latencies, clamped to
+    [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY]. The budget caps the share of recent calls that
+    may fire a backup request.
+    """
+
+    def __init__(self, scenario: str, budget: float):
+        self.scenario = scenario
+        self.budget = budget
+        self._latencies: deque[float] = deque(maxlen=SETTINGS.HEDGE_WINDOW)
+        self._recent: deque[bool] = deque(maxlen=SETTINGS.HEDGE_WINDOW)
+        self._stats = {"calls": 0, "hedged": 0, "over_budget": 0, "primary_wins": 0, "backup_wins": 0,
+                       "failed": 0}
+
+    def delay(self) -> float:
+        if len(self._latencies) < SETTINGS.HEDGE_MIN_SAMPLES:
+            return SETTINGS.HEDGE_DEFAULT_DELAY
+        ordered = sorted(self._latencies)
+        value = ordered[min(int(len(ordered) * SETTINGS.HEDGE_QUANTILE), len(ordered) - 1)]
+        return min(max(value, SETTINGS.HEDGE_MIN_DELAY), SETTINGS.HEDGE_MAX_DELAY)
+
+    def allow_hedge(self) -> bool:
+        if not self._recent:
+            return self.budget > 0
+        return sum(self._recent) / len(self._recent) < self.budget
+
+    def record_latency(self, latency: float):
+        self._latencies.append(latency)
+
+    def stats(self) -> dict:
+        calls = self._stats["calls"]
+        hedged = self._stats["hedged"]
+        return {
+            **self._stats,
+            "budget": self.budget,
+            "delay": round(self.delay(), 2),
+            "hedge_rate": round(hedged / calls, 4) if calls else 0.0,
+            "backup_win_rate": round(self._stats["backup_wins"] / hedged, 4) if hedged else 0.0,
+        }
+
+
+_policies: dict[str, HedgePolicy] = {}
+_budgets = _parse_budgets(SETTINGS.HEDGE_BUDGETS)
+
+
+def hedge_policy(scenario: str) -> HedgePolicy:
+    policy = _policies.get(scenario)
+    if policy is None:
+        policy = HedgePolicy(scenario, _budgets.get(scenario, SETTINGS.HEDGE_BUDGET))
+        _policies[scenario] = policy
+    return policy
+
+
+def hedge_stats() -> dict:
+    return {scenario: policy.stats() for scenario, policy in _policies.items()}
+
+
+METRICS.register_collector("hedge", hedge_stats)
+
+
+async def hedged(scenario: str,
+                 primary: Callable[[], Awaitable[Any]],
+                 backup: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run primary and, if it has not produced a result within the scenario's hedge delay
+    (or failed), race it against backup. The first truthy result wins and the other
+    request is cancelled.
+
+    Args:
+        scenario: hedge scenario, selects latency history and budget
+        primary: zero-argument coroutine function, returns a falsy value on failure
+        backup: alternative provider with the same contract
+
+    Returns:
+        The first good result, or None if every attempt failed
+    """
+    policy = hedge_policy(scenario)
+    policy._stats["calls"] += 1
+    METRICS.incr("hedge.calls", scenario=scenario)
+
+    start = time.monotonic()
+    primary_task = asyncio.create_task(primary())
+    tasks = {primary_task: "primary"}
+    backup_fired = False
+    try:
+        done, _ = await asyncio.wait([primary_task], timeout=policy.delay())
+        if done:
+            policy.record_latency(time.monotonic() - start)
+            result = _result(primary_task)
+            if result:
+                policy._recent.append(False)
+                policy._stats["primary_wins"] += 1
+                return result
+            # fail over regardless of budget, a failed primary costs nothing more
+            logging.info(f"M hedge {scenario} primary failed, running backup")
+        elif not policy.allow_hedge():
+            policy._stats["over_budget"] += 1
+            policy._recent.append(False)
+            await asyncio.wait([primary_task])
+            result = _result(primary_task)
+            policy.record_latency(time.monotonic() - start)
+            if result:
+                policy._stats["primary_wins"] += 1
+                return result
+            policy._stats["failed"] += 1
+            return None
+        else:
+            logging.info(f"M hedge {scenario} primary slower than {policy.delay():.1f}s, firing backup")
+
+        backup_fired = True
+        policy._recent.append(True)
+        policy._stats["hedged"] += 1
+        METRICS.incr("hedge.fired", scenario=scenario)
+        tasks[asyncio.create_task(backup())] = "backup"
+
+        pending = {t for t in tasks if not t.done()}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if tasks[task] == "primary":
+                    policy.record_latency(time.monotonic() - start)
+                result = _result(task)
+                if result:
+                    source = tasks[task]
+                    policy._stats[f"{source}_wins"] += 1
+                    METRICS.incr("hedge.wins", scenario=scenario, source=source)
+                    logging.info(f"M hedge {scenario} won by {source} in {time.monotonic() - start:.1f}s")
+                    return result
+
+        policy._stats["failed"] += 1
+        METRICS.incr("hedge.failed", scenario=scenario)
+        return None
+    finally:
+        for task, source in tasks.items():
+            if not task.done():
+                if source == "primary" and backup_fired:
+                    # censored sample, the primary took at least this long
+                    policy.record_latency(time.monotonic() - start)
+                task.cancel()
+
+
+def _result(task: asyncio.Task) -> Any:
+    if task.cancelled():
+        return None
+    e = task.exception()
+    if e:
+        logging.warning(f"M hedge attempt failed: {e}")
+        return None
+    return task.result()
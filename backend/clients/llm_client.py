@@ -1,11 +1,62 @@
+import logging
+
+import httpx
 import openai
 
 from config import SETTINGS
 
-openai_client = openai.AsyncClient(api_key=SETTINGS.OPENAI_API_KEY)
+try:
+    import h2  # noqa: F401
+
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+_clients: dict[tuple[str, str], openai.AsyncClient] = {}
+
+
+def get_openai_client(api_key: str, base_url: str = "") -> openai.AsyncClient:
+    """
+    Get the long-lived client for (base_url, api_key), creating it on first use.
+
+    :param api_key: API key of the endpoint.
+    :param base_url: Base URL of an OpenAI compatible endpoint, empty for the official API.
+    :return: Shared openai.AsyncClient.
+    """
+    key = (base_url or "", api_key)
+    client = _clients.get(key)
+    if client is None:
+        http2 = SETTINGS.OPENAI_HTTP2 and HAS_HTTP2
+        if SETTINGS.OPENAI_HTTP2 and not HAS_HTTP2:
+            logging.warning("OPENAI_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=SETTINGS.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=SETTINGS.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=SETTINGS.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+        )
+        kwargs = {"api_key": api_key, "http_client": http_client}
+        if base_url:
+            kwargs["base_url"] = base_url
+        client = openai.AsyncClient(**kwargs)
+        _clients[key] = client
+    return client
+
+
+async def close_openai_clients():
+    """Close every registered client and its connection pool."""
+    for client in list(_clients.values()):
+        try:
+            await client.close()
+        except Exception as e:
+            logging.warning(f"Failed to close openai client: {e}")
+    _clients.clear()
+
 
+openai_client = get_openai_client(SETTINGS.OPENAI_API_KEY)
 
-proxy_client = openai.AsyncClient(
-    api_key=SETTINGS.PROXY_OPENAI_API_KEY,
-    base_url=SETTINGS.PROXY_OPENAI_BASE_URL,
-)
+# proxy calls go through clients.governor, which owns retries and backoff
+proxy_client = get_openai_client(SETTINGS.PROXY_OPENAI_API_KEY,
+                                 SETTINGS.PROXY_OPENAI_BASE_URL).with_options(max_retries=0)
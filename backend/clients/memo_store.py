@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from common.metrics import METRICS
+from common.ttl_cache import AsyncTTLCache
+from config import SETTINGS
+from infra.db import gen_memo_get, gen_memo_put, create_gen_memo_indexes
+from infra.http_session import HTTP
+
+
+class GenerationMemo:
+    """
+    Content-addressed memo of generation results.
+
+    Image and video generations are treated as pure functions of their normalized inputs
+    (source image content, prompt, template images) and the provider/model version, so a
+    result is keyed by a hash of those and reused across tasks and tenants. Only kinds listed
+    in GEN_MEMO_KINDS are memoized; callers pass fresh=True to skip the lookup, the new result
+    then replaces the memoized one.
+    """
+
+    def __init__(self):
+        self._kinds = {k.strip() for k in SETTINGS.GEN_MEMO_KINDS.split(",") if k.strip()}
+        self._local = AsyncTTLCache("gen_memo", ttl=SETTINGS.GEN_MEMO_LOCAL_TTL, max_size=2048)
+        self._digests = AsyncTTLCache("gen_memo_digest", ttl=SETTINGS.GEN_MEMO_DIGEST_TTL, max_size=4096)
+        self._indexes_created = False
+        self._stats: dict[str, dict] = defaultdict(lambda: {"hits": 0, "misses": 0, "fresh": 0, "stores": 0,
+                                                            "errors": 0, "saved_usd": 0.0})
+        METRICS.register_collector("gen_memo", self.stats)
+
+    def enabled(self, kind: str) -> bool:
+        return kind in self._kinds
+
+    @staticmethod
+    def key(kind: str, version: str, inputs: dict) -> str:
+        """
+        Memo key of a generation.
+
+        Args:
+            kind: result kind, e.g. "cover"
+            version: provider/model version the result depends on
+            inputs: normalized inputs, JSON serializable
+        """
+        raw = json.dumps({"kind": kind, "version": f"{SETTINGS.GEN_MEMO_VERSION}:{version}", "inputs": inputs},
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def content_digest(self, url: str) -> str:
+        """
+        sha256 of the content at url, so a re-uploaded identical image maps to the same key.
+        Falls back to the url itself if the content cannot be read.
+        """
+        if not url:
+            return ""
+
+        async def _load():
+            try:
+                async with HTTP.session().get(url) as response:
+                    response.raise_for_status()
+                    digest = hashlib.sha256()
+                    size = 0
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        size += len(chunk)
+                        if size > SETTINGS.GEN_MEMO_DIGEST_MAX_BYTES:
+                            return f"url:{url}"
+                        digest.update(chunk)
+                    return f"sha256:{digest.hexdigest()}"
+            except Exception as e:
+                logging.warning(f"M gen memo digest of {url} failed: {e}")
+                return f"url:{url}"
+
+        return await self._digests.get_or_load(url, _load)
+
+    async def get(self, kind: str, key: str, cost: float = 0.0, fresh: bool = False) -> dict | None:
+        """
+        Look up a memoized result.
+
+        Args:
+            kind: result kind, e.g. "cover"
+            key: output of key()
+            cost: USD a generation costs, reported as avoided on a hit
+            fresh: skip the lookup
+
+        Returns:
+            The memoized result, None on a miss, when fresh or when the kind is not memoized
+        """
+        if not self.enabled(kind):
+            return None
+        stats = self._stats[kind]
+        if fresh:
+            stats["fresh"] += 1
+            return None
+        try:
+            result = await self._local.get_or_load(key, lambda: self._load(key))
+        except Exception as e:
+            stats["errors"] += 1
+            logging.warning(f"M gen memo lookup failed: {e}")
+            return None
+        if result is None:
+            stats["misses"] += 1
+            METRICS.incr("gen_memo.misses", kind=kind)
+            return None
+        stats["hits"] += 1
+        stats["saved_usd"] += cost
+        METRICS.incr("gen_memo.hits", kind=kind)
+        METRICS.incr("gen_memo.saved_usd", cost, kind=kind)
+        logging.info(f"M gen memo hit {kind} {key[:12]}")
+        return result
+
+    async def put(self, kind: str, key: str, result: dict, inputs: dict | None = None):
+        """
+        Memoize the result of a successful generation whose urls are already uploaded.
+
+        Args:
+            kind: result kind
+            key: output of key()
+            result: result to return on later hits
+            inputs: stored along for inspection, optional
+        """
+        if not self.enabled(kind):
+            return
+        try:
+            if not self._indexes_created:
+                self._indexes_created = True
+                await create_gen_memo_indexes()
+            await gen_memo_put(key, kind, inputs or {}, result, SETTINGS.GEN_MEMO_TTL)
+            self._local.put(key, result)
+            self._stats[kind]["stores"] += 1
+        except Exception as e:
+            self._stats[kind]["errors"] += 1
+            logging.warning(f"M gen memo store failed: {e}")
+
+    @staticmethod
+    async def _load(key: str) -> dict | None:
+        entry = await gen_memo_get(key)
+        return entry["result"] if entry else None
+
+    def stats(self) -> dict:
+        ret = {}
+        for kind, stats in self._stats.items():
+            total = stats["hits"] + stats["misses"]
+            ret[kind] = {
+                **stats,
+                "saved_usd": round(stats["saved_usd"], 4),
+                "hit_ratio": round(stats["hits"] / total, 4) if total else 0.0,
+            }
+        return ret
+
+
+# Global generation memo
+GEN_MEMO = GenerationMemo()
@@ -1,29 +1,31 @@
 import io
 import logging
 
-import aiohttp
-import openai
 from openai.types import ImagesResponse
 
-from config import SETTINGS
+from clients.governor import GOVERNOR
+from clients.llm_client import proxy_client
+from infra.http_session import HTTP
 
 
 async def gemini_gen_img_svc(img_url: str, prompt: str, scenario: str = "") -> ImagesResponse | None:
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(img_url) as resp:
-                img_bytes = await resp.read()
+        async with HTTP.session().get(img_url) as resp:
+            img_bytes = await resp.read()
 
         image_file = io.BytesIO(img_bytes)
         image_file.name = "template.png"
         logging.info(f"M gemini_gen_img_svc: {img_url} {scenario}")
 
-        ret = await openai.AsyncClient(api_key=SETTINGS.PROXY_OPENAI_API_KEY,
-                                       base_url=SETTINGS.PROXY_OPENAI_BASE_URL).images.edit(
-            image=image_file,
-            prompt=prompt,
-            model="gemini-2.5-flash-image"
-        )
+        async def _edit():
+            image_file.seek(0)
+            return await proxy_client.images.edit(
+                image=image_file,
+                prompt=prompt,
+                model="gemini-2.5-flash-image"
+            )
+
+        ret = await GOVERNOR.call("proxy:gemini-2.5-flash-image", _edit)
 
         if ret and ret.data[0].url:
             logging.info(f"M gemini_gen_img_svc success {img_url} {scenario}")
@@ -40,19 +42,22 @@ async def gpt_image_1_gen_imgs_svc(img_urls: list[str], prompt: str, scenario: s
     try:
         image_files = []
         for img_url in img_urls:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(img_url) as resp:
-                    img_bytes = await resp.read()
+            async with HTTP.session().get(img_url) as resp:
+                img_bytes = await resp.read()
             image_file = io.BytesIO(img_bytes)
             image_file.name = "template.png"
             logging.info(f"M gpt_image_1_gen_imgs_svc: {img_url} {scenario}")
             image_files.append(image_file)
-        ret = await openai.AsyncClient(api_key=SETTINGS.PROXY_OPENAI_API_KEY,
-                                       base_url=SETTINGS.PROXY_OPENAI_BASE_URL).images.edit(
-            image=image_files,
-            prompt=prompt,
-            model="gpt-image-1"
-        )
+        async def _edit():
+            for f in image_files:
+                f.seek(0)
+            return await proxy_client.images.edit(
+                image=image_files,
+                prompt=prompt,
+                model="gpt-image-1"
+            )
+
+        ret = await GOVERNOR.call("proxy:gpt-image-1", _edit)
 
         if ret and ret.data[0] and (ret.data[0].url or ret.data[0].b64_json):
             logging.info(f"M gpt_image_1_gen_imgs_svc success {img_urls} {scenario}")
@@ -0,0 +1,159 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+
+class SSEEvent:
+    """One server-sent event"""
+
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(self, event: str = "message", data: str = "", id: str | None = None, retry: int | None = None):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    @property
+    def is_done(self) -> bool:
+        """OpenAI style end of stream marker"""
+        return self.data.strip() == "[DONE]"
+
+    def json(self) -> Any:
+        return json.loads(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, SSEEvent) and (self.event, self.data, self.id, self.retry) == (
+            other.event, other.data, other.id, other.retry)
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data!r}, id={self.id!r}, retry={self.retry!r})"
+
+
+class SSEDecoder:
+    """
+    Incremental text/event-stream decoder.
+
+    Raw bytes are buffered across chunks and only complete lines are decoded, so events and
+    multi-byte characters split at any chunk boundary are preserved. Each feed only scans the
+    bytes it has not looked at yet. Lines may end with LF, CR or CRLF; multi-line ``data:``
+    fields are joined with LF.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0  # scanned up to here, no line terminator before it
+        self._event = ""
+        self._data: list[str] = []
+        self._id: str | None = None
+        self._retry: int | None = None
+
+    def feed(self, chunk: bytes) -> list[SSEEvent]:
+        """
+        Add a chunk of the stream.
+
+        Returns:
+            Events completed by this chunk
+        """
+        self._buffer += chunk
+        events = []
+        buf = self._buffer
+        n = len(buf)
+        start = 0
+        i = self._pos
+        # next terminator positions, only searched again once passed
+        lf = buf.find(b"\n", i)
+        cr = buf.find(b"\r", i)
+        while i < n:
+            if lf != -1 and lf < i:
+                lf = buf.find(b"\n", i)
+            if cr != -1 and cr < i:
+                cr = buf.find(b"\r", i)
+            if lf == -1 and cr == -1:
+                i = n
+                break
+            if cr != -1 and (lf == -1 or cr < lf):
+                if cr + 1 == n:
+                    # CR at the end of the chunk, could be the first half of CRLF
+                    i = cr
+                    break
+                eol, end = cr, cr + 2 if buf[cr + 1] == 0x0A else cr + 1
+            else:
+                eol, end = lf, lf + 1
+            event = self._line(bytes(buf[start:eol]))
+            if event is not None:
+                events.append(event)
+            start = i = end
+        del buf[:start]
+        self._pos = i - start
+        return events
+
+    def flush(self) -> list[SSEEvent]:
+        """
+        End of stream: process a trailing unterminated line and dispatch the pending event.
+
+        Returns:
+            The last event, if any
+        """
+        events = []
+        if self._buffer:
+            line = bytes(self._buffer).rstrip(b"\r")
+            self._buffer.clear()
+            self._pos = 0
+            event = self._line(line)
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _line(self, raw: bytes) -> SSEEvent | None:
+        if not raw:
+            return self._dispatch()
+        line = raw.decode("utf-8", errors="replace")
+        if line.startswith(":"):
+            return None
+        field, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            if "\0" not in value:
+                self._id = value
+        elif field == "retry":
+            if value.isdigit():
+                self._retry = int(value)
+        return None
+
+    def _dispatch(self) -> SSEEvent | None:
+        if not self._data:
+            self._event = ""
+            return None
+        event = SSEEvent(event=self._event or "message", data="\n".join(self._data), id=self._id,
+                         retry=self._retry)
+        self._event = ""
+        self._data = []
+        return event
+
+
+async def iter_sse(chunks: AsyncIterable[bytes], stop_on_done: bool = True) -> AsyncIterator[SSEEvent]:
+    """
+    Decode an async byte stream, e.g. ``aiohttp`` ``resp.content.iter_any()``.
+
+    Args:
+        chunks: raw response chunks
+        stop_on_done: stop at a ``data: [DONE]`` event without yielding it
+    """
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            if stop_on_done and event.is_done:
+                return
+            yield event
+    for event in decoder.flush():
+        if stop_on_done and event.is_done:
+            return
+        yield event
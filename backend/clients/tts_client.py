@@ -1,14 +1,21 @@
 import base64
+import hashlib
 import io
+import json
 import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
-
-import aiohttp
-import openai
-import fal_client
+from typing import Optional, Dict, Any, AsyncIterator
 
+from clients.fal_jobs import FAL_JOBS
+from clients.llm_client import openai_client
+from clients.tts_pipeline import synthesize_long_text
+from common.metrics import METRICS
+from common.ttl_cache import AsyncTTLCache
 from config import SETTINGS
+from infra.db import tts_cache_get, tts_cache_put, create_tts_cache_indexes
+from infra.file import upload_audio_file
+from infra.http_session import HTTP
 
 
 class BaseTTSClient(ABC):
@@ -40,14 +47,33 @@ class BaseTTSClient(ABC):
         """Convert text to speech and return as base64"""
         pass
 
+    async def text_to_speech_stream(
+        self,
+        text: str,
+        voice: str = "alloy",
+        model: str = "tts-1",
+        response_format: str = "mp3",
+        speed: float = 1.0,
+        **kwargs
+    ) -> AsyncIterator[bytes]:
+        """
+        Convert text to speech and yield audio chunks as soon as they are available.
+        Providers without streaming support yield the whole audio once.
+
+        Raises:
+            Exception: if the conversion failed
+        """
+        audio_data = await self.text_to_speech(text, voice, model, response_format, speed, **kwargs)
+        if not audio_data:
+            raise Exception("text to speech failed")
+        yield audio_data
+
 
 class OpenAITTSClient(BaseTTSClient):
     """OpenAI TTS client implementation"""
     
     def __init__(self):
-        self.client = openai.AsyncClient(
-            api_key=SETTINGS.OPENAI_API_KEY,
-        )
+        self.client = openai_client
     
     async def text_to_speech(
         self,
@@ -105,6 +131,37 @@ class OpenAITTSClient(BaseTTSClient):
         except Exception as e:
             logging.error(f"M OpenAI TTS conversion error: {e}", exc_info=True)
             return None
+
+    async def text_to_speech_stream(
+        self,
+        text: str,
+        voice: str = "alloy",
+        model: str = "tts-1",
+        response_format: str = "mp3",
+        speed: float = 1.0,
+        **kwargs
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream speech from OpenAI's TTS API, chunks are relayed while the audio is generated
+        """
+        logging.info(f"M Streaming text to speech with OpenAI: {text[:50]}...")
+        api_args = {
+            "model": model,
+            "voice": voice,
+            "input": text,
+            "response_format": response_format,
+            "speed": speed
+        }
+        for key, value in kwargs.items():
+            if key not in ["voice_id", "audio_url"]:
+                api_args[key] = value
+
+        size = 0
+        async with self.client.audio.speech.with_streaming_response.create(**api_args) as response:
+            async for chunk in response.iter_bytes(SETTINGS.TTS_STREAM_CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
+        logging.info(f"M OpenAI TTS stream finished, audio size: {size} bytes")
     
     async def text_to_speech_base64(
         self,
@@ -171,46 +228,68 @@ class VoiceCloneTTSClient(BaseTTSClient):
             Audio data as bytes, or None if failed
         """
         try:
-
-            arguments = {}
-            if text:
-                logging.info(f"M Converting text to speech with voice cloning: {text[:50]}...")
-                arguments["text"] = text
-            if kwargs.get("voice_id"):
-                arguments.update({
-                    "voice_setting": {
-                        "voice_id": kwargs.get("voice_id"),
-                    }
-                })
-            if kwargs.get("audio_url"):
-                arguments.update({"audio_url": kwargs.get("audio_url")})
-            if kwargs.get("prompt"):
-                logging.info(f"Converting prompt to speech with voice cloning: {kwargs.get("prompt")[:50]}...")
-                arguments.update({"prompt": kwargs.get("prompt")})
-            if kwargs.get("reference_audio_url"):
-                arguments.update({"reference_audio_url": kwargs.get("reference_audio_url")})
-            voice_application = SETTINGS.VOICE_APPLICATION_ID
-            if kwargs.get("voice_application"):
-                voice_application = kwargs.get("voice_application")
-            handler = await fal_client.submit_async(
-                voice_application,
-                arguments=arguments,
-            )
-
-            result = await handler.get()
-            async with aiohttp.ClientSession() as session:
-                if 'audio' in result and 'url' in result['audio']:
-                    # Download the audio file
-                    audio_url = result['audio']['url']
-                    async with session.get(audio_url) as audio_response:
-                        if audio_response.status == 200:
-                            audio_data = await audio_response.read()
-                            logging.info(f"Voice clone TTS conversion successful, audio size: {len(audio_data)} bytes")
-                            return audio_data
+            audio_url = await self._synthesize(text, **kwargs)
+            if audio_url:
+                # Download the audio file
+                async with HTTP.session().get(audio_url) as audio_response:
+                    if audio_response.status == 200:
+                        audio_data = await audio_response.read()
+                        logging.info(f"Voice clone TTS conversion successful, audio size: {len(audio_data)} bytes")
+                        return audio_data
                     
         except Exception as e:
             logging.error(f"Voice clone TTS conversion error: {e}", exc_info=True)
             return None
+
+    async def text_to_speech_stream(
+        self,
+        text: str,
+        voice: str = "alloy",
+        model: str = "speech-02-hd",
+        response_format: str = "mp3",
+        speed: float = 1.0,
+        **kwargs
+    ) -> AsyncIterator[bytes]:
+        """
+        Synthesize with voice cloning and relay the audio download chunk by chunk
+        """
+        audio_url = await self._synthesize(text, **kwargs)
+        if not audio_url:
+            raise Exception("voice clone TTS returned no audio")
+        size = 0
+        async with HTTP.session().get(audio_url) as audio_response:
+            audio_response.raise_for_status()
+            async for chunk in audio_response.content.iter_chunked(SETTINGS.TTS_STREAM_CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
+        logging.info(f"Voice clone TTS stream finished, audio size: {size} bytes")
+
+    async def _synthesize(self, text: str, **kwargs) -> Optional[str]:
+        """Run the fal voice application, returns the url of the generated audio"""
+        arguments = {}
+        if text:
+            logging.info(f"M Converting text to speech with voice cloning: {text[:50]}...")
+            arguments["text"] = text
+        if kwargs.get("voice_id"):
+            arguments.update({
+                "voice_setting": {
+                    "voice_id": kwargs.get("voice_id"),
+                }
+            })
+        if kwargs.get("audio_url"):
+            arguments.update({"audio_url": kwargs.get("audio_url")})
+        if kwargs.get("prompt"):
+            logging.info(f"Converting prompt to speech with voice cloning: {kwargs.get("prompt")[:50]}...")
+            arguments.update({"prompt": kwargs.get("prompt")})
+        if kwargs.get("reference_audio_url"):
+            arguments.update({"reference_audio_url": kwargs.get("reference_audio_url")})
+        voice_application = SETTINGS.VOICE_APPLICATION_ID
+        if kwargs.get("voice_application"):
+            voice_application = kwargs.get("voice_application")
+        result = await FAL_JOBS.run(voice_application, arguments)
+        if result and 'audio' in result and 'url' in result['audio']:
+            return result['audio']['url']
+        return None
     
     async def text_to_speech_base64(
         self,
@@ -300,6 +379,18 @@ class TTSClient:
         """Delegate to the appropriate TTS client"""
         return await self._client.text_to_speech_base64(text, voice, model, response_format, speed, **kwargs)
 
+    def text_to_speech_stream(
+        self,
+        text: str,
+        voice: str = None,
+        model: str = None,
+        response_format: str = None,
+        speed: float = 1.0,
+        **kwargs
+    ) -> AsyncIterator[bytes]:
+        """Delegate to the appropriate TTS client"""
+        return self._client.text_to_speech_stream(text, voice, model, response_format, speed, **kwargs)
+
     async def call_language_model(
         self,
         prompt: str,
@@ -324,15 +415,12 @@ class TTSClient:
         try:
             logging.info(f"Calling language model {model} with prompt: {prompt[:50]}...")
             
-            # For language model calls, we still use OpenAI
-            client = openai.AsyncClient(api_key=SETTINGS.OPENAI_API_KEY)
-            
             messages = []
             if system_message:
                 messages.append({"role": "system", "content": system_message})
             messages.append({"role": "user", "content": prompt})
             
-            response = await client.chat.completions.create(
+            response = await openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -377,9 +465,6 @@ class TTSClient:
         try:
             logging.info(f"Calling language model {model} with audio input, prompt: {prompt[:50]}...")
             
-            # For language model calls with audio, we still use OpenAI
-            client = openai.AsyncClient(api_key=SETTINGS.OPENAI_API_KEY)
-            
             messages = []
             if system_message:
                 messages.append({"role": "system", "content": system_message})
@@ -400,7 +485,7 @@ class TTSClient:
                 ]
             })
             
-            response = await client.chat.completions.create(
+            response = await openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -474,6 +559,185 @@ async def text_to_speech_base64_svc(
     return await tts_client.text_to_speech_base64(text, voice, model, response_format, speed, **kwargs)
 
 
+def text_to_speech_stream_svc(
+    text: str,
+    voice: str = None,
+    model: str = None,
+    response_format: str = None,
+    speed: float = 1.0,
+    **kwargs
+) -> AsyncIterator[bytes]:
+    """
+    Service function for streaming text-to-speech conversion
+
+    Returns:
+        Async iterator of audio chunks, raises if the conversion fails
+    """
+    return tts_client.text_to_speech_stream(text, voice, model, response_format, speed, **kwargs)
+
+
+def _parse_costs(value: str) -> dict[str, float]:
+    costs = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, cost = item.split("=", 1)
+        try:
+            costs[name.strip()] = float(cost)
+        except ValueError:
+            logging.warning(f"Invalid TTS_CACHE_COSTS entry: {item}")
+    return costs
+
+
+class TTSResultCache:
+    """
+    Deterministic TTS result cache: a hash of the synthesis parameters maps to the uploaded
+    audio url.
+
+    Entries live in the tts_cache collection for TTS_CACHE_TTL seconds, shared by every
+    process. A local LRU in front of it answers repeated lookups without a round trip and
+    coalesces concurrent identical requests into one synthesis.
+    """
+
+    KEY_FIELDS = ("provider", "voice_application", "text", "prompt", "voice", "voice_id", "audio_url",
+                  "reference_audio_url", "model", "speed", "response_format")
+
+    def __init__(self):
+        self._local = AsyncTTLCache("tts_result", ttl=SETTINGS.TTS_CACHE_LOCAL_TTL,
+                                    max_size=SETTINGS.TTS_CACHE_LOCAL_SIZE)
+        self._costs = _parse_costs(SETTINGS.TTS_CACHE_COSTS)
+        self._indexes_created = False
+        self._stats = {"hits": 0, "local_hits": 0, "misses": 0, "errors": 0, "saved_usd": 0.0,
+                       "synthesis_seconds": 0.0}
+        METRICS.register_collector("tts_cache", self.stats)
+
+    @classmethod
+    def params(cls, **kwargs) -> dict:
+        """Normalized synthesis parameters, the cache key is derived from these only"""
+        params = {field: kwargs.get(field) for field in cls.KEY_FIELDS}
+        params["provider"] = params["provider"] or SETTINGS.TTS_PROVIDER.lower()
+        params["voice_application"] = params["voice_application"] or SETTINGS.VOICE_APPLICATION_ID
+        params["response_format"] = (params["response_format"] or "mp3").lower()
+        params["speed"] = float(params["speed"] or 1.0)
+        return params
+
+    @staticmethod
+    def key(params: dict) -> str:
+        raw = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get_or_synthesize(self, params: dict, synthesize) -> Optional[str]:
+        """
+        Return the cached audio url for params, calling synthesize on a miss.
+
+        Args:
+            params: output of params()
+            synthesize: zero-argument coroutine function, returns the uploaded audio url or None
+
+        Returns:
+            Audio url, or None if synthesis failed (failures are not cached)
+        """
+        if SETTINGS.TTS_CACHE_TTL <= 0:
+            return await synthesize()
+        key = self.key(params)
+        found, url = self._local.get(key)
+        if found and url:
+            self._hit(params, local=True)
+            return url
+        return await self._local.get_or_load(key, lambda: self._load(key, params, synthesize))
+
+    async def _load(self, key: str, params: dict, synthesize) -> Optional[str]:
+        try:
+            if not self._indexes_created:
+                self._indexes_created = True
+                await create_tts_cache_indexes()
+            entry = await tts_cache_get(key)
+            if entry:
+                self._hit(params)
+                return entry["audio_url"]
+        except Exception as e:
+            self._stats["errors"] += 1
+            logging.warning(f"M TTS cache lookup failed: {e}")
+
+        self._stats["misses"] += 1
+        METRICS.incr("tts_cache.misses")
+        start = time.monotonic()
+        url = await synthesize()
+        self._stats["synthesis_seconds"] += time.monotonic() - start
+        if url:
+            try:
+                await tts_cache_put(key, url, params, SETTINGS.TTS_CACHE_TTL)
+            except Exception as e:
+                self._stats["errors"] += 1
+                logging.warning(f"M TTS cache store failed: {e}")
+        return url
+
+    def _hit(self, params: dict, local: bool = False):
+        cost = self._costs.get(params["voice_application"], SETTINGS.TTS_CACHE_DEFAULT_COST)
+        self._stats["local_hits" if local else "hits"] += 1
+        self._stats["saved_usd"] += cost
+        METRICS.incr("tts_cache.hits")
+        METRICS.incr("tts_cache.saved_usd", cost)
+
+    def stats(self) -> dict:
+        hits = self._stats["hits"] + self._stats["local_hits"]
+        total = hits + self._stats["misses"]
+        misses = self._stats["misses"]
+        return {
+            **self._stats,
+            "coalesced": self._local.stats()["coalesced"],  # concurrent duplicates that waited for one synthesis
+            "saved_usd": round(self._stats["saved_usd"], 4),
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "avg_synthesis_seconds": round(self._stats["synthesis_seconds"] / misses, 2) if misses else 0.0,
+        }
+
+
+TTS_CACHE = TTSResultCache()
+
+
+async def text_to_speech_url_svc(
+    text: str,
+    voice: str = None,
+    model: str = None,
+    response_format: str = None,
+    speed: float = 1.0,
+    **kwargs
+) -> Optional[str]:
+    """
+    Synthesize text, upload the audio and return its url. Identical requests are served
+    from TTS_CACHE. Long text goes through the sentence pipeline.
+
+    Not for music generation, whose output is not a function of its parameters.
+
+    Args:
+        text: The text to convert to speech
+        voice: The voice to use
+        model: The TTS model to use
+        response_format: The audio format (mp3, wav, pcm, flac...)
+        speed: The speed of the speech
+        **kwargs: Additional parameters like voice_id, audio_url, voice_application, etc.
+
+    Returns:
+        Uploaded audio url, or None if failed
+    """
+    response_format = response_format or "mp3"
+    params = TTS_CACHE.params(text=text, voice=voice, model=model, response_format=response_format, speed=speed,
+                              **kwargs)
+
+    async def _synthesize() -> Optional[str]:
+        audio_data = await synthesize_long_text(
+            text,
+            lambda segment: text_to_speech_svc(segment, voice, model, response_format, speed, **kwargs),
+            response_format,
+        )
+        if not audio_data:
+            return None
+        return await upload_audio_file(audio_data, response_format)
+
+    return await TTS_CACHE.get_or_synthesize(params, _synthesize)
+
+
 async def call_model(
     prompt: str,
     model: str = "gpt-4o",
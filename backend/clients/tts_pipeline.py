@@ -0,0 +1,228 @@
+import asyncio
+import io
+import logging
+import re
+import time
+import wave
+from array import array
+from typing import Awaitable, Callable, Optional
+
+from common.metrics import METRICS
+from config import SETTINGS
+
+_SENTENCE = re.compile(r'.+?(?:[.!?…]+["\'”’)\]]*(?=\s|$)|[。！？]+["\'”’)\]]*|\n|$)', re.S)
+_PROSODY_BREAK = re.compile(r'(?<=[,;:，；：、—])\s*')
+
+STITCHABLE_FORMATS = ("mp3", "wav", "pcm")
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    """Split a sentence longer than max_chars at commas/semicolons, then at spaces"""
+    pieces = []
+    for clause in _PROSODY_BREAK.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(clause[:cut])
+            clause = clause[cut:].lstrip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def segment_text(text: str, max_chars: int | None = None) -> list[str]:
+    """
+    Split text into segments at sentence boundaries, packing consecutive sentences up to
+    max_chars. Sentences longer than max_chars are split at prosody breaks (commas etc.).
+    """
+    max_chars = max_chars or SETTINGS.TTS_SEGMENT_MAX_CHARS
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    units = []
+    for sentence in _SENTENCE.findall(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        units.extend(_split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence])
+
+    segments = []
+    current = ""
+    for unit in units:
+        if current and len(current) + 1 + len(unit) > max_chars:
+            segments.append(current)
+            current = unit
+        else:
+            current = f"{current} {unit}" if current else unit
+    if current:
+        segments.append(current)
+    return segments
+
+
+# MPEG audio layer III frame header tables
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG 1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],  # MPEG 2 / 2.5
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(data: bytes, pos: int) -> Optional[tuple[int, int, int, int]]:
+    """
+    Parse the layer III frame header at pos.
+
+    Returns:
+        (frame length, MPEG version bits, channel mode, header length) or None
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    padding = (data[pos + 2] >> 1) & 0x01
+    channel_mode = data[pos + 3] >> 6
+    bitrate = _MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    coefficient = 144 if version == 3 else 72
+    return coefficient * bitrate // sample_rate + padding, version, channel_mode, 4
+
+
+def _strip_id3(data: bytes) -> bytes:
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def _mp3_frames(data: bytes) -> bytes:
+    """
+    Audio frames of one mp3 file, without ID3 tags and without the Xing/Info/VBRI header
+    frame, which describes the length of that file only.
+    """
+    data = _strip_id3(data)
+    start = 0
+    while start + 4 <= len(data) and _mp3_frame(data, start) is None:
+        start += 1
+    frame = _mp3_frame(data, start)
+    if frame is None:
+        return data
+    length, version, channel_mode, header = frame
+    if version == 3:
+        side_info = 17 if channel_mode == 3 else 32
+    else:
+        side_info = 9 if channel_mode == 3 else 17
+    tag = data[start + header + side_info:start + header + side_info + 4]
+    if tag in (b"Xing", b"Info") or data[start + 36:start + 40] == b"VBRI":
+        start += length
+    return data[start:]
+
+
+def concat_mp3(parts: list[bytes]) -> bytes:
+    """Concatenate mp3 files frame by frame into one stream"""
+    return b"".join(_mp3_frames(part) for part in parts)
+
+
+def crossfade_pcm(parts: list[bytes], sample_rate: int, channels: int = 1, crossfade_ms: int | None = None) -> bytes:
+    """
+    Join signed 16 bit little endian PCM parts, overlapping each boundary with a linear
+    crossfade of crossfade_ms.
+    """
+    crossfade_ms = SETTINGS.TTS_CROSSFADE_MS if crossfade_ms is None else crossfade_ms
+    overlap = sample_rate * crossfade_ms // 1000 * channels
+    out = array("h")
+    for part in parts:
+        samples = array("h")
+        samples.frombytes(part[:len(part) - len(part) % 2])
+        n = min(overlap, len(out), len(samples))
+        n -= n % channels
+        if n:
+            tail = len(out) - n
+            for i in range(n):
+                w = (i // channels + 1) / (n // channels + 1)
+                out[tail + i] = int(out[tail + i] * (1 - w) + samples[i] * w)
+            samples = samples[n:]
+        out.extend(samples)
+    return out.tobytes()
+
+
+def concat_wav(parts: list[bytes]) -> bytes:
+    """Join wav files with a crossfade, all parts must share the format of the first"""
+    params = None
+    frames = []
+    for part in parts:
+        with wave.open(io.BytesIO(part), "rb") as w:
+            if params is None:
+                params = w.getparams()
+            elif (w.getnchannels(), w.getsampwidth(), w.getframerate()) != (
+                    params.nchannels, params.sampwidth, params.framerate):
+                raise ValueError("wav segments have different formats")
+            frames.append(w.readframes(w.getnframes()))
+    if params.sampwidth != 2:
+        joined = b"".join(frames)
+    else:
+        joined = crossfade_pcm(frames, params.framerate, params.nchannels)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(params.nchannels)
+        w.setsampwidth(params.sampwidth)
+        w.setframerate(params.framerate)
+        w.writeframes(joined)
+    return buf.getvalue()
+
+
+def stitch_audio(parts: list[bytes], response_format: str) -> bytes:
+    response_format = (response_format or "mp3").lower()
+    if response_format == "mp3":
+        return concat_mp3(parts)
+    if response_format == "wav":
+        return concat_wav(parts)
+    if response_format == "pcm":
+        return crossfade_pcm(parts, SETTINGS.TTS_PCM_SAMPLE_RATE)
+    raise ValueError(f"cannot stitch {response_format} audio")
+
+
+async def synthesize_long_text(text: str,
+                               synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+                               response_format: str = "mp3") -> Optional[bytes]:
+    """
+    Synthesize text segment by segment, TTS_SEGMENT_CONCURRENCY segments at a time, and
+    stitch the results into one file. Short text and formats that cannot be joined without
+    re-encoding are synthesized in one call.
+
+    Args:
+        text: text to read
+        synthesize: provider call for one segment, returns audio bytes or None
+        response_format: audio format produced by synthesize
+
+    Returns:
+        Audio bytes, or None if any segment failed
+    """
+    segments = segment_text(text)
+    if len(segments) <= 1 or (response_format or "mp3").lower() not in STITCHABLE_FORMATS:
+        return await synthesize(text)
+
+    start = time.monotonic()
+    semaphore = asyncio.Semaphore(SETTINGS.TTS_SEGMENT_CONCURRENCY)
+
+    async def _one(segment: str) -> Optional[bytes]:
+        async with semaphore:
+            return await synthesize(segment)
+
+    parts = await asyncio.gather(*[_one(s) for s in segments])
+    if not all(parts):
+        logging.error(f"M TTS pipeline: {sum(1 for p in parts if not p)}/{len(parts)} segments failed")
+        return None
+
+    audio = stitch_audio(list(parts), response_format)
+    METRICS.incr("tts_pipeline.segments", len(segments))
+    logging.info(f"M TTS pipeline: {len(text)} chars in {len(segments)} segments, {len(audio)} bytes, "
+                 f"{time.monotonic() - start:.1f}s")
+    return audio
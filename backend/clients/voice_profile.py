@@ -0,0 +1,151 @@
+import datetime
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from clients.fal_jobs import FAL_JOBS
+from common.metrics import METRICS
+from common.ttl_cache import AsyncTTLCache
+from config import SETTINGS
+from entities.dto import VoiceProfile
+from infra.db import voice_profile_get, voice_profile_save, voice_profile_touch, voice_profile_delete, \
+    create_voice_profile_indexes
+
+
+class VoiceProfileProvider(ABC):
+    """Clones a voice from reference audio into a reusable provider voice id"""
+
+    name: str = ""
+
+    @abstractmethod
+    async def clone(self, reference_audio_url: str) -> Optional[str]:
+        """
+        Args:
+            reference_audio_url: audio of the voice to clone
+
+        Returns:
+            Provider voice id, or None if cloning failed
+        """
+        pass
+
+
+class FalVoiceProfileProvider(VoiceProfileProvider):
+    """Voice cloning with the fal clone application, the voice is synthesized by VOICE_APPLICATION_ID"""
+
+    name = "fal"
+
+    async def clone(self, reference_audio_url: str) -> Optional[str]:
+        result = await FAL_JOBS.run(SETTINGS.VOICE_APPLICATION_CLONE, {"audio_url": reference_audio_url})
+        if result and result.get("custom_voice_id"):
+            return result["custom_voice_id"]
+        logging.error(f"M voice clone returned no voice id for {reference_audio_url}")
+        return None
+
+
+class InMemoryVoiceProfileProvider(VoiceProfileProvider):
+    """Stand-in provider for tests and local runs, voice ids are derived from the reference url"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.voices: dict[str, str] = {}
+
+    async def clone(self, reference_audio_url: str) -> Optional[str]:
+        voice_id = "mem-" + hashlib.sha256(reference_audio_url.encode("utf-8")).hexdigest()[:16]
+        self.voices[voice_id] = reference_audio_url
+        return voice_id
+
+
+class VoiceProfiles:
+    """
+    Cloned voice per reference audio url.
+
+    The first synthesis with a reference audio clones it once and persists the provider voice
+    id in the voice_profile collection; later syntheses use the voice id and skip the clone
+    step. Concurrent lookups for the same reference share one clone call.
+    """
+
+    def __init__(self, provider: VoiceProfileProvider | None):
+        self.provider = provider
+        self._local = AsyncTTLCache("voice_profile", ttl=SETTINGS.VOICE_PROFILE_LOCAL_TTL)
+        self._indexes_created = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def profile_id(self, reference_audio_url: str) -> str:
+        raw = f"{self.provider.name}:{SETTINGS.VOICE_APPLICATION_CLONE}:{reference_audio_url}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def voice_id(self, reference_audio_url: str) -> Optional[str]:
+        """
+        Voice id for a reference audio, cloning it on first use.
+
+        Returns:
+            Provider voice id, or None if profiles are disabled or cloning failed
+        """
+        if not self.enabled or not reference_audio_url:
+            return None
+        profile_id = self.profile_id(reference_audio_url)
+        try:
+            return await self._local.get_or_load(profile_id, lambda: self._load(profile_id, reference_audio_url))
+        except Exception as e:
+            logging.error(f"M voice profile for {reference_audio_url} failed: {e}", exc_info=True)
+            return None
+
+    async def invalidate(self, reference_audio_url: str):
+        """Forget a voice the provider no longer accepts, the next use clones it again"""
+        if not self.enabled or not reference_audio_url:
+            return
+        profile_id = self.profile_id(reference_audio_url)
+        self._local.invalidate(profile_id)
+        await voice_profile_delete(profile_id)
+        METRICS.incr("voice_profile.invalidated")
+
+    async def _load(self, profile_id: str, reference_audio_url: str) -> Optional[str]:
+        if not self._indexes_created:
+            self._indexes_created = True
+            await create_voice_profile_indexes()
+
+        now = datetime.datetime.now()
+        expires_at = now + datetime.timedelta(seconds=SETTINGS.VOICE_PROFILE_TTL)
+        profile = await voice_profile_get(profile_id)
+        if profile and (profile.expires_at is None or profile.expires_at > now):
+            # every use pushes back the provider's expiry of unused voices
+            await voice_profile_touch(profile_id, expires_at)
+            METRICS.incr("voice_profile.reused")
+            return profile.voice_id
+
+        voice_id = await self.provider.clone(reference_audio_url)
+        if not voice_id:
+            return None
+        await voice_profile_save(VoiceProfile(
+            profile_id=profile_id,
+            provider=self.provider.name,
+            reference_audio_url=reference_audio_url,
+            voice_id=voice_id,
+            created_at=now,
+            last_used_at=now,
+            expires_at=expires_at,
+        ))
+        METRICS.incr("voice_profile.cloned")
+        logging.info(f"M voice profile created for {reference_audio_url}: {voice_id}")
+        return voice_id
+
+
+def _create_provider() -> VoiceProfileProvider | None:
+    provider = SETTINGS.VOICE_PROFILE_PROVIDER.lower()
+    if provider == "fal":
+        if not SETTINGS.VOICE_APPLICATION_CLONE or not SETTINGS.VOICE_APPLICATION_ID:
+            logging.warning("VOICE_APPLICATION_CLONE/VOICE_APPLICATION_ID not set, voice profiles disabled")
+            return None
+        return FalVoiceProfileProvider()
+    if provider == "memory":
+        return InMemoryVoiceProfileProvider()
+    return None
+
+
+# Global voice profile registry
+VOICE_PROFILES = VoiceProfiles(_create_provider())
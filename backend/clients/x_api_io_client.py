@@ -1,65 +1,124 @@
+import asyncio
 import json
 import logging
 
-import aiohttp
-
+from clients.governor import GOVERNOR
+from common.batch_loader import BatchLoader
+from common.ttl_cache import AsyncTTLCache
 from config import SETTINGS
+from infra.http_session import HTTP
 
 host = SETTINGS.XAPI_IO_HOST
 headers = {
     f"X-API-Key": SETTINGS.XAPI_IO_API_KEY,
 }
 
+user_info_cache = AsyncTTLCache("xapi_user_info",
+                                ttl=SETTINGS.XAPI_CACHE_USER_INFO_TTL,
+                                negative_ttl=SETTINGS.XAPI_CACHE_NEGATIVE_TTL,
+                                max_size=SETTINGS.XAPI_CACHE_MAX_SIZE)
+user_last_tweets_cache = AsyncTTLCache("xapi_user_last_tweets",
+                                       ttl=SETTINGS.XAPI_CACHE_LAST_TWEETS_TTL,
+                                       negative_ttl=SETTINGS.XAPI_CACHE_NEGATIVE_TTL,
+                                       max_size=SETTINGS.XAPI_CACHE_MAX_SIZE)
+tweet_cache = AsyncTTLCache("xapi_tweet",
+                            ttl=SETTINGS.XAPI_CACHE_TWEET_TTL,
+                            negative_ttl=SETTINGS.XAPI_CACHE_NEGATIVE_TTL,
+                            max_size=SETTINGS.XAPI_CACHE_MAX_SIZE)
+
+
+async def _get(url: str) -> dict | None:
+    """
+    GET an xAPI url.
+
+    Returns the payload on success, None when upstream reports not found,
+    and raises on transport or server errors so they are never cached.
+    """
+    async def _fetch() -> dict | None:
+        logging.info(f"Fetching {url}")
+        async with HTTP.session().get(url, headers=headers) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            res = await response.json()
+            if "status" in res and "success" == res["status"]:
+                return res
+        return None
+
+    return await GOVERNOR.call("xapi", _fetch)
+
+
+async def _fetch_user_info(username: str):
+    res = await _get(f"{host}/twitter/user/info?userName={username}")
+    if res:
+        logging.info(f"fetched {json.dumps(res["data"], ensure_ascii=False)}")
+        return res["data"]
+    return None
+
+
+async def _fetch_user_last_tweets(username: str):
+    res = await _get(f"{host}/twitter/user/last_tweets?userName={username}")
+    if res:
+        logging.info(f"fetched {json.dumps(res["data"]["tweets"], ensure_ascii=False)}")
+        return res["data"]["tweets"]
+    return None
 
-async def x_get_user_info_by_username(username: str):
-    url = f"{host}/twitter/user/info?userName={username}"
-    logging.info(f"Fetching {url}")
 
+async def _fetch_tweets(ids: list[str]) -> dict[str, dict]:
+    res = await _get(f"{host}/twitter/tweets?tweet_ids={",".join(ids)}")
+    tweets = {}
+    if res and res.get("tweets"):
+        for tweet in res["tweets"]:
+            if isinstance(tweet, dict) and tweet.get("id"):
+                tweets[str(tweet["id"])] = tweet
+        logging.info(f"fetched {len(tweets)}/{len(ids)} tweets {json.dumps(list(tweets), ensure_ascii=False)}")
+    return tweets
+
+
+tweet_loader = BatchLoader("xapi_tweets",
+                           _fetch_tweets,
+                           window=SETTINGS.XAPI_TWEET_BATCH_WINDOW_MS / 1000,
+                           max_batch_size=SETTINGS.XAPI_TWEET_BATCH_MAX_SIZE)
+
+
+async def x_get_user_info_by_username(username: str, bypass_cache: bool = False):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status()
-                if response.status == 200:
-                    res = await response.json()
-                    if "status" in res and "success" == res["status"]:
-                        logging.info(f"fetched {json.dumps(res["data"], ensure_ascii=False)}")
-                        return res["data"]
+        return await user_info_cache.get_or_load(username.lower(),
+                                                 lambda: _fetch_user_info(username),
+                                                 bypass=bypass_cache)
     except Exception as ex:
         logging.error("Failed to fetch user info", exc_info=True)
     return None
 
 
-async def x_get_user_last_tweets_by_username(username: str):
-    url = f"{host}/twitter/user/last_tweets?userName={username}"
-    logging.info(f"Fetching {url}")
-
+async def x_get_user_last_tweets_by_username(username: str, bypass_cache: bool = False):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status()
-                if response.status == 200:
-                    res = await response.json()
-                    if "status" in res and "success" == res["status"]:
-                        logging.info(f"fetched {json.dumps(res["data"]["tweets"], ensure_ascii=False)}")
-                        return res["data"]["tweets"]
+        return await user_last_tweets_cache.get_or_load(username.lower(),
+                                                        lambda: _fetch_user_last_tweets(username),
+                                                        bypass=bypass_cache)
     except Exception as ex:
         logging.error("Failed x_get_user_last_tweets_by_username", exc_info=True)
     return None
 
 
-async def x_get_tweets_by_id(id: str):
-    url = f"{host}/twitter/tweets?tweet_ids={id}"
-    logging.info(f"Fetching {url}")
-
+async def x_get_tweets_by_id(id: str, bypass_cache: bool = False):
+    """
+    Concurrent calls within XAPI_TWEET_BATCH_WINDOW_MS are coalesced into one multi-id request.
+    """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status()
-                if response.status == 200:
-                    res = await response.json()
-                    if "status" in res and "success" == res["status"]:
-                        logging.info(f"fetched {json.dumps(res["tweets"][0], ensure_ascii=False)}")
-                        return res["tweets"][0]
+        return await tweet_cache.get_or_load(id,
+                                             lambda: tweet_loader.load(id),
+                                             bypass=bypass_cache)
     except Exception as ex:
-        logging.error("Failed x_get_user_last_tweets_by_username", exc_info=True)
+        logging.error("Failed x_get_tweets_by_id", exc_info=True)
     return None
+
+
+async def x_get_tweets_by_ids(ids: list[str], bypass_cache: bool = False) -> dict[str, dict]:
+    """
+    Fetch several tweets with a single upstream call for all cache misses.
+
+    :return: Dict of tweet id to tweet, tweets not found are omitted.
+    """
+    tweets = await asyncio.gather(*[x_get_tweets_by_id(i, bypass_cache) for i in ids])
+    return {i: t for i, t in zip(ids, tweets) if t}
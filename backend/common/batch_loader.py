@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+from common.metrics import METRICS
+
+
+class BatchLoader:
+    """
+    DataLoader style batcher.
+
+    Keys requested within ``window`` seconds of each other (or until ``max_batch_size`` keys are
+    pending) are collected and resolved with a single ``batch_fn`` call. ``batch_fn`` receives the
+    de-duplicated keys and returns a dict; keys missing from the result resolve to None.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[list], Awaitable[dict]], window: float = 0.01,
+                 max_batch_size: int = 100):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+        self._stats = {"keys": 0, "batches": 0, "deduplicated": 0}
+        METRICS.register_collector(f"batch_loader.{name}", self.stats)
+
+    async def load(self, key: Hashable) -> Any:
+        """
+        Resolve a single key through the next batch.
+
+        :param key: Key to load.
+        :return: Value from batch_fn, or None if it was not returned.
+        """
+        self._stats["keys"] += 1
+        future = self._pending.get(key)
+        if future is not None:
+            self._stats["deduplicated"] += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: list[Hashable]) -> list[Any]:
+        """
+        Resolve several keys, batched together with any other pending keys.
+
+        :param keys: Keys to load.
+        :return: Values in the same order as keys.
+        """
+        return list(await asyncio.gather(*[self.load(k) for k in keys]))
+
+    def stats(self) -> dict:
+        """
+        Batching statistics.
+
+        :return: Keys requested, batches issued and average batch size.
+        """
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "avg_batch_size": round((self._stats["keys"] - self._stats["deduplicated"]) / batches, 2)
+            if batches else 0.0,
+        }
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._stats["batches"] += 1
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: dict[Hashable, asyncio.Future]):
+        try:
+            result = await self.batch_fn(list(batch.keys())) or {}
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"batch loader {self.name} failed for {len(batch)} keys: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # mark retrieved, waiters still receive it
+                    future.exception()
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(result.get(key))
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from common.metrics import METRICS
+
+
+class CancellationRegistry:
+    """
+    In-flight background runs keyed by sub_task_id.
+
+    A run is wrapped in its own asyncio task so it can be cancelled from a regenerate or an
+    explicit cancel request; cancellation propagates into the provider calls it is awaiting
+    (hedged requests, fal jobs cancel upstream on CancelledError). Runs in other processes
+    are not reachable, their results are dropped on write instead.
+    """
+
+    def __init__(self):
+        self._runs: dict[str, asyncio.Task] = {}
+        self._stats = {"started": 0, "cancelled": 0}
+        METRICS.register_collector("sub_task_runs", self.stats)
+
+    async def run(self, sub_task_id: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) as the cancellable run of sub_task_id, for use with
+        ``background.add_task(SUB_TASK_RUNS.run, sub_task_id, fn)``.
+
+        Returns:
+            The result of fn, None if the run was cancelled through the registry
+        """
+        task = asyncio.create_task(fn(*args, **kwargs))
+        self._runs[sub_task_id] = task
+        self._stats["started"] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                # cancelled through the registry, not the caller
+                logging.info(f"M sub task run {sub_task_id} cancelled")
+                return None
+            task.cancel()
+            raise
+        finally:
+            if self._runs.get(sub_task_id) is task:
+                self._runs.pop(sub_task_id, None)
+
+    def cancel(self, sub_task_id: str) -> bool:
+        """
+        Cancel the run of sub_task_id in this process.
+
+        Returns:
+            True if a run was found
+        """
+        task = self._runs.pop(sub_task_id, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        self._stats["cancelled"] += 1
+        METRICS.incr("sub_task_runs.cancelled")
+        return True
+
+    def is_running(self, sub_task_id: str) -> bool:
+        task = self._runs.get(sub_task_id)
+        return task is not None and not task.done()
+
+    def stats(self) -> dict:
+        return {**self._stats, "running": len(self._runs)}
+
+
+# Global registry of background sub task runs
+SUB_TASK_RUNS = CancellationRegistry()
@@ -6,6 +6,8 @@ ERROR_MESSAGES = {
     ErrorCode.INTERNAL_ERROR: "Internal server error",
     ErrorCode.INVALID_PARAMETERS: "Invalid parameters",
     ErrorCode.RATELIMITER: "Too many requests, please try again later",
+    ErrorCode.IDEMPOTENCY_KEY_REUSED: "Idempotency-Key was already used for a different request",
+    ErrorCode.REQUEST_IN_PROGRESS: "A request with this Idempotency-Key is still in progress",
 
     # Authentication errors (10100-10199)
     ErrorCode.AUTH_ERROR: "Authentication failed",
@@ -7,6 +7,8 @@ class ErrorCode(IntEnum):
     INTERNAL_ERROR = 10000
     INVALID_PARAMETERS = 10001
     RATELIMITER = 10002
+    IDEMPOTENCY_KEY_REUSED = 10003
+    REQUEST_IN_PROGRESS = 10004
 
     # Authentication related errors (10100-10199)
     AUTH_ERROR = 10100
@@ -0,0 +1,116 @@
+import json
+import re
+from typing import Any
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _loads(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        # LLMs like trailing commas; only strips commas outside strings in practice
+        return json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+
+
+def _scan(text: str, start: int) -> tuple[int, list[str], bool]:
+    """
+    Scan a JSON value starting at text[start] == "{" with string and escape awareness.
+
+    :return: (end index after the closing brace or len(text), open brackets left, inside a string)
+    """
+    stack: list[str] = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in _CLOSERS:
+            stack.append(c)
+        elif c in "}]":
+            if not stack or _CLOSERS[stack[-1]] != c:
+                return i + 1, stack, False
+            stack.pop()
+            if not stack:
+                return i + 1, [], False
+    return len(text), stack, in_string
+
+
+def extract_json_object(text: str | None) -> dict | None:
+    """
+    Find the first JSON object in free-form LLM output.
+
+    Handles prose and code fences around the object, nested braces, braces inside strings,
+    trailing commas, and output truncated before the object was closed (open strings and
+    brackets are closed, the last incomplete member may be dropped).
+
+    :param text: LLM response text.
+    :return: The parsed object, or None if there is none.
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    while start != -1:
+        end, stack, in_string = _scan(text, start)
+        raw = text[start:end]
+        if stack:
+            # truncated output: close what is open
+            raw = raw + ('"' if in_string else "") + "".join(_CLOSERS[c] for c in reversed(stack))
+        try:
+            value = _loads(raw)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            if stack:
+                value = _repair_truncated(text[start:end], stack, in_string)
+                if value is not None:
+                    return value
+        start = text.find("{", start + 1)
+    return None
+
+
+def _repair_truncated(raw: str, stack: list[str], in_string: bool) -> dict | None:
+    """Drop the incomplete trailing member of a truncated object, e.g. a key without a value"""
+    cut = max(raw.rfind(","), raw.rfind("{"))
+    while cut > 0:
+        head = raw[:cut + 1] if raw[cut] == "{" else raw[:cut]
+        end, head_stack, head_in_string = _scan(head, 0)
+        if not head_in_string:
+            try:
+                value = _loads(head + "".join(_CLOSERS[c] for c in reversed(head_stack)))
+                if isinstance(value, dict):
+                    return value
+            except json.JSONDecodeError:
+                pass
+        cut = max(raw.rfind(",", 0, cut), raw.rfind("{", 0, cut))
+    return None
+
+
+def matches_schema(value: Any, schema: dict) -> bool:
+    """
+    Minimal JSON schema check for flat objects: required properties are present and
+    string properties are non-empty strings.
+
+    :param value: Parsed value.
+    :param schema: JSON schema with "properties" and "required".
+    :return: True if value can be used.
+    """
+    if not isinstance(value, dict):
+        return False
+    properties = schema.get("properties", {})
+    for name in schema.get("required", []):
+        if name not in value:
+            return False
+        if properties.get(name, {}).get("type") == "string" and not (
+                isinstance(value[name], str) and value[name].strip()):
+            return False
+    return True
@@ -0,0 +1,77 @@
+import threading
+from collections import defaultdict
+from typing import Callable
+
+
+def _series(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    joined = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{joined}}}"
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry.
+
+    Counters and gauges are keyed by ``name{label=value,...}``; collectors are callables
+    evaluated at snapshot time for components that keep their own statistics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def incr(self, name: str, value: float = 1.0, **labels):
+        """
+        Increase a counter.
+
+        :param name: Counter name.
+        :param value: Amount to add.
+        :param labels: Optional labels.
+        """
+        with self._lock:
+            self._counters[_series(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Set a gauge to an absolute value.
+
+        :param name: Gauge name.
+        :param value: Current value.
+        :param labels: Optional labels.
+        """
+        with self._lock:
+            self._gauges[_series(name, labels)] = value
+
+    def register_collector(self, name: str, fn: Callable[[], dict]):
+        """
+        Register a callable whose result is included in every snapshot.
+
+        :param name: Section name in the snapshot.
+        :param fn: Callable returning a JSON serializable dict.
+        """
+        self._collectors[name] = fn
+
+    def snapshot(self) -> dict:
+        """
+        Current values of all counters, gauges and collectors.
+
+        :return: JSON serializable dict.
+        """
+        with self._lock:
+            ret = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+        for name, fn in self._collectors.items():
+            try:
+                ret[name] = fn()
+            except Exception as e:
+                ret[name] = {"error": str(e)}
+        return ret
+
+
+METRICS = Metrics()
@@ -0,0 +1,218 @@
+import asyncio
+import contextlib
+import logging
+import time
+from enum import StrEnum
+
+from common.metrics import METRICS
+from config import SETTINGS
+
+
+class Priority(StrEnum):
+    INTERACTIVE = "interactive"  # the user is waiting on it: cover, lyrics, audio
+    BULK = "bulk"  # long renders: videos, music
+
+
+class SchedulerQueueFull(Exception):
+    """The tenant already has too many jobs waiting in the pool"""
+
+
+class _Request:
+    __slots__ = ("key", "tenant", "priority", "start_tag", "finish_tag", "future", "enqueued_at")
+
+    def __init__(self, key: str, tenant: str, priority: Priority, start_tag: float, finish_tag: float):
+        self.key = key
+        self.tenant = tenant
+        self.priority = priority
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class FairPool:
+    """
+    Weighted fair queue for one kind of expensive job.
+
+    At most capacity jobs run at once and at most tenant_cap of them per tenant. Waiting jobs
+    are served in order of their virtual finish tag (start-time fair queuing): a job's tag
+    advances the clock of its flow, the tenant's jobs of one priority class, by 1 / weight,
+    so a tenant with many queued jobs only gets its share while other tenants' jobs keep
+    flowing. Interactive jobs weigh SCHEDULER_INTERACTIVE_WEIGHT times more than bulk, and
+    since the classes keep separate clocks, a tenant's interactive job does not wait behind
+    its own bulk backlog, e.g. an audio behind queued Twitter TTS tasks in the tts pool.
+    """
+
+    def __init__(self, name: str, capacity: int, tenant_cap: int):
+        self.name = name
+        self.capacity = max(capacity, 1)
+        self.tenant_cap = max(tenant_cap, 1)
+        self.running = 0
+        self._virtual_time = 0.0
+        self._flow_finish: dict[tuple[str, Priority], float] = {}
+        self._tenant_running: dict[str, int] = {}
+        self._waiting: list[_Request] = []
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0}
+        self._wait_max = 0.0
+
+    def queue_full(self, tenant: str) -> bool:
+        return sum(1 for r in self._waiting if r.tenant == tenant) >= SETTINGS.SCHEDULER_TENANT_QUEUE_DEPTH
+
+    def submit(self, key: str, tenant: str, priority: Priority) -> _Request:
+        if self.queue_full(tenant):
+            self._stats["rejected"] += 1
+            METRICS.incr("scheduler.rejected", pool=self.name)
+            raise SchedulerQueueFull(f"{self.name}: too many jobs of this tenant waiting")
+        weight = SETTINGS.SCHEDULER_INTERACTIVE_WEIGHT if priority == Priority.INTERACTIVE else 1.0
+        start_tag = max(self._virtual_time, self._flow_finish.get((tenant, priority), 0.0))
+        request = _Request(key, tenant, priority, start_tag, start_tag + 1 / weight)
+        self._flow_finish[(tenant, priority)] = request.finish_tag
+        self._waiting.append(request)
+        self._waiting.sort(key=lambda r: r.finish_tag)
+        self._dispatch()
+        if not request.future.done():
+            self._stats["queued"] += 1
+        self._publish()
+        return request
+
+    def cancel(self, request: _Request):
+        if request in self._waiting:
+            self._waiting.remove(request)
+            self._publish()
+
+    def release(self, request: _Request):
+        self.running -= 1
+        self._tenant_running[request.tenant] -= 1
+        if not self._tenant_running[request.tenant]:
+            self._tenant_running.pop(request.tenant)
+        self._dispatch()
+        self._publish()
+
+    def position(self, key: str) -> int | None:
+        """1-based position among waiting jobs that can run before it, None if not waiting"""
+        for i, request in enumerate(self._waiting):
+            if request.key == key:
+                return i + 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "capacity": self.capacity,
+            "tenant_cap": self.tenant_cap,
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "tenants_running": len(self._tenant_running),
+            "max_queue_wait": round(self._wait_max, 2),
+        }
+
+    def _dispatch(self):
+        i = 0
+        while self.running < self.capacity and i < len(self._waiting):
+            request = self._waiting[i]
+            if request.future.done() or self._tenant_running.get(request.tenant, 0) >= self.tenant_cap:
+                i += 1
+                continue
+            self._waiting.pop(i)
+            self.running += 1
+            self._tenant_running[request.tenant] = self._tenant_running.get(request.tenant, 0) + 1
+            self._virtual_time = max(self._virtual_time, request.start_tag)
+            self._stats["admitted"] += 1
+            waited = time.monotonic() - request.enqueued_at
+            self._wait_max = max(self._wait_max, waited)
+            METRICS.incr("scheduler.queue_wait_seconds", waited, pool=self.name, priority=request.priority)
+            request.future.set_result(None)
+        if not self._waiting and not self.running:
+            # idle: forget old tags so the clocks do not grow without bound
+            self._virtual_time = 0.0
+            self._flow_finish.clear()
+
+    def _publish(self):
+        METRICS.set_gauge("scheduler.running", self.running, pool=self.name)
+        METRICS.set_gauge("scheduler.waiting", len(self._waiting), pool=self.name)
+
+
+def _parse_pools(value: str) -> dict[str, tuple[int, int]]:
+    pools = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, spec = item.split("=", 1)
+        capacity, _, tenant_cap = spec.partition(":")
+        try:
+            pools[name.strip()] = (int(capacity), int(tenant_cap or SETTINGS.SCHEDULER_TENANT_MAX_IN_FLIGHT))
+        except ValueError:
+            logging.warning(f"Invalid SCHEDULER_POOLS entry: {item}")
+    return pools
+
+
+class Scheduler:
+    """
+    Tenant fair-share admission for expensive generation jobs, one FairPool per job kind
+    ("image", "video", "music", "llm", "tts"). Separate pools isolate the kinds from each
+    other; priority classes order the jobs within a pool both kinds of callers share. Provider level concurrency and retries stay
+    with the governor; the scheduler decides whose job gets to use it next.
+    """
+
+    def __init__(self):
+        self._pools: dict[str, FairPool] = {}
+        self._limits = _parse_pools(SETTINGS.SCHEDULER_POOLS)
+        METRICS.register_collector("scheduler", self.stats)
+
+    def pool(self, name: str) -> FairPool:
+        pool = self._pools.get(name)
+        if pool is None:
+            capacity, tenant_cap = self._limits.get(name) or (SETTINGS.SCHEDULER_DEFAULT_CAPACITY,
+                                                              SETTINGS.SCHEDULER_TENANT_MAX_IN_FLIGHT)
+            pool = FairPool(name, capacity, tenant_cap)
+            self._pools[name] = pool
+        return pool
+
+    @contextlib.asynccontextmanager
+    async def slot(self, pool_name: str, tenant: str, priority: Priority, key: str):
+        """
+        Hold a slot of the pool for the duration of the block, waiting for the tenant's turn.
+
+        Args:
+            pool_name: job kind
+            tenant: tenant id, jobs without a tenant share one queue
+            priority: interactive or bulk
+            key: job key (sub_task_id), used for queue position reporting
+
+        Raises:
+            SchedulerQueueFull: if the tenant has too many jobs waiting
+        """
+        pool = self.pool(pool_name)
+        request = pool.submit(key, tenant or "", priority)
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled():
+                pool.release(request)
+            else:
+                pool.cancel(request)
+            raise
+        try:
+            yield
+        finally:
+            pool.release(request)
+
+    def queue_full(self, pool_name: str, tenant: str) -> bool:
+        """True if a new job of the tenant would be rejected by the pool"""
+        return self.pool(pool_name).queue_full(tenant or "")
+
+    def position(self, key: str) -> dict | None:
+        """Queue position of a waiting job, None if it is not waiting in this process"""
+        for name, pool in self._pools.items():
+            position = pool.position(key)
+            if position is not None:
+                return {"pool": name, "position": position, "running": pool.running, "capacity": pool.capacity}
+        return None
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+
+# Global scheduler instance
+SCHEDULER = Scheduler()
@@ -0,0 +1,80 @@
+import contextlib
+import datetime
+import functools
+import time
+from contextvars import ContextVar
+from typing import Iterator
+
+from config import SETTINGS
+
+# spans of the sub task run in the current context, None outside of a run
+_spans: ContextVar[list[dict] | None] = ContextVar("timing_spans", default=None)
+
+
+@contextlib.contextmanager
+def record_timings() -> Iterator[list[dict]]:
+    """
+    Collect the timing spans recorded in this context, including tasks started from it.
+
+    Usage::
+
+        with record_timings() as spans:
+            await run()
+        persist(spans)
+    """
+    spans: list[dict] = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+def add_span(stage: str, provider: str, started_at: datetime.datetime, duration: float, ok: bool = True):
+    """
+    Record a finished span, a no-op outside of record_timings.
+
+    Args:
+        stage: what was timed, e.g. "queued", "provider", "upload"
+        provider: upstream or pool name, e.g. "proxy:gpt-4o-image", empty if none
+        started_at: wall clock start
+        duration: seconds
+        ok: False if the step failed or was cancelled
+    """
+    spans = _spans.get()
+    if spans is None or len(spans) >= SETTINGS.TIMING_MAX_SPANS:
+        return
+    spans.append({
+        "stage": stage,
+        "provider": provider,
+        "started_at": started_at,
+        "duration": round(duration, 3),
+        "ok": ok,
+    })
+
+
+@contextlib.contextmanager
+def span(stage: str, provider: str = ""):
+    """Time the block as one span"""
+    started_at = datetime.datetime.now()
+    start = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        add_span(stage, provider, started_at, time.monotonic() - start, ok)
+
+
+def timed(stage: str, provider: str = ""):
+    """Decorator timing every call of a coroutine function as one span"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(stage, provider):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
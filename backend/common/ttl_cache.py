@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from common.metrics import METRICS
+
+
+class AsyncTTLCache:
+    """
+    In-process LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent misses for the same key share one loader call. A ``None`` result is treated
+    as "not found" and cached for ``negative_ttl`` seconds (0 disables negative caching).
+    Loader exceptions are propagated to every waiter and never cached. The load runs in its
+    own task, so a cancelled caller leaves it running for the other waiters and the cache.
+    """
+
+    def __init__(self, name: str, ttl: float, negative_ttl: float = 0, max_size: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "load_errors": 0,
+        }
+        METRICS.register_collector(f"cache.{name}", self.stats)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None = None,
+                          bypass: bool = False) -> Any:
+        """
+        Return the cached value for key, calling loader on a miss.
+
+        :param key: Cache key.
+        :param loader: Zero-argument coroutine function producing the value.
+        :param ttl: Override the cache TTL for this entry.
+        :param bypass: Skip the lookup and refresh the entry from loader.
+        :return: Cached or freshly loaded value.
+        """
+        if not bypass:
+            found, value = self._lookup(key)
+            if found:
+                self._stats["negative_hits" if value is None else "hits"] += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._stats["coalesced"] += 1
+                return await asyncio.shield(inflight)
+
+        self._stats["misses"] += 1
+        # the load runs in its own task, cancelling one caller must not cancel it for the others
+        task = asyncio.get_running_loop().create_task(self._load(key, loader, ttl))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._load_done(key, t))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None) -> Any:
+        self._stats["loads"] += 1
+        try:
+            value = await loader()
+        except BaseException:
+            self._stats["load_errors"] += 1
+            raise
+        self.put(key, value, ttl)
+        return value
+
+    def _load_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+        if not task.cancelled():
+            # mark retrieved, callers (if any) still receive it
+            task.exception()
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        Store a value.
+
+        :param key: Cache key.
+        :param value: Value, None is stored as a negative entry.
+        :param ttl: Override the cache TTL for this entry.
+        """
+        ttl = self.negative_ttl if value is None else (ttl if ttl is not None else self.ttl)
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """
+        Look up a key without loading.
+
+        :param key: Cache key.
+        :return: (found, value).
+        """
+        return self._lookup(key)
+
+    def invalidate(self, key: Hashable):
+        """
+        Drop a single entry.
+
+        :param key: Cache key.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all entries."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Cache statistics.
+
+        :return: Counters plus hit ratio and upstream calls saved.
+        """
+        served = self._stats["hits"] + self._stats["negative_hits"] + self._stats["coalesced"]
+        total = served + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "hit_ratio": round(served / total, 4) if total else 0.0,
+            "upstream_calls_saved": served,
+        }
+
+    def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
@@ -55,5 +55,156 @@ class Settings(BaseSettings):
     X_APP_REDIRECT_URI: str = ""
     APP_HOME_URI: str = ""
 
+    # Outbound HTTP pool
+    HTTP_POOL_LIMIT: int = 200
+    HTTP_POOL_LIMIT_PER_HOST: int = 32
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: float = 30
+    HTTP_TIMEOUT: float = 300
+    HTTP_CONNECT_TIMEOUT: float = 10
+    HTTP_WARMUP: bool = False
+    HTTP_WARMUP_URLS: str = ""  # comma separated, in addition to XAPI_IO_HOST and PROXY_OPENAI_BASE_URL
+
+    # OpenAI SDK clients
+    OPENAI_HTTP2: bool = False  # requires the h2 package
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30
+
+    # xAPI response cache (seconds)
+    XAPI_CACHE_USER_INFO_TTL: int = 600
+    XAPI_CACHE_LAST_TWEETS_TTL: int = 300
+    XAPI_CACHE_TWEET_TTL: int = 3600
+    XAPI_CACHE_NEGATIVE_TTL: int = 120
+    XAPI_CACHE_MAX_SIZE: int = 4096
+    XAPI_TWEET_BATCH_WINDOW_MS: int = 10
+    XAPI_TWEET_BATCH_MAX_SIZE: int = 100
+
+    # fal job poller
+    FAL_POLL_INTERVAL: float = 5  # seconds between status polls of one job
+    FAL_POLL_LOOP_INTERVAL: float = 1
+    FAL_POLL_BATCH_SIZE: int = 100
+    FAL_POLL_CONCURRENCY: int = 20
+    FAL_JOB_TIMEOUT: int = 3600
+    PIPELINE_POLL_INTERVAL: float = 3  # seconds between sub task status checks of a running stage
+    PIPELINE_STAGE_TIMEOUT: float = 3600
+    FAL_JOB_MAX_POLL_ERRORS: int = 10
+    FAL_WEBHOOK_URL: str = ""  # public url of /innerapi/fal/webhook, optional
+
+    # Twitter TTS task processor, drains the /api/twitter-tts/create queue
+    TWITTER_TTS_CONCURRENCY: str = "tts=8,voice_clone=4,music_gen=2"  # tasks in flight per type and process
+    TWITTER_TTS_POLL_INTERVAL: float = 2  # seconds between claims while the queue is empty
+    TWITTER_TTS_LEASE: float = 300  # renewed while a task runs, other workers take it over once expired
+    TWITTER_TTS_MAX_ATTEMPTS: int = 3
+    TWITTER_TTS_RETRY_DELAY: float = 60  # seconds before a task hit by an open circuit is claimed again
+
+    # Reaper of sub tasks left in progress, e.g. by a restart of the process running them
+    REAPER_INTERVAL: float = 300
+    # comma separated sub task field=seconds without a heartbeat (or since created_at, before the first one)
+    # after which a sub task still in progress is stale
+    REAPER_DEADLINES: str = "cover=1800,lyrics=600,music=1800,audio=1800,videos=5400"
+    REAPER_DEFAULT_DEADLINE: float = 3600
+    REAPER_BATCH_SIZE: int = 200  # tasks per run
+    REAPER_HEARTBEAT_INTERVAL: float = 60  # a queued or running sub task renews heartbeat_at this often
+
+    # Upstream concurrency governor
+    # comma separated name=max_in_flight:queue_depth, name is a limiter ("proxy:grok-3") or provider ("proxy")
+    GOVERNOR_LIMITS: str = "fal=16:512,xapi=32:256,proxy=32:256,proxy:gpt-4o-image=8:128," \
+                           "proxy:gemini-2.5-flash-image=8:128,proxy:gpt-image-1=8:128"
+    GOVERNOR_DEFAULT_MAX_IN_FLIGHT: int = 32
+    GOVERNOR_DEFAULT_QUEUE_DEPTH: int = 256
+    GOVERNOR_MIN_IN_FLIGHT: int = 1
+    GOVERNOR_DECREASE_FACTOR: float = 0.5
+    GOVERNOR_DECREASE_COOLDOWN: float = 2
+    GOVERNOR_LATENCY_FACTOR: float = 3  # latency above factor * moving average counts as congestion
+    GOVERNOR_LATENCY_MIN_SAMPLES: int = 10
+    GOVERNOR_MAX_RETRIES: int = 4
+    GOVERNOR_BACKOFF_BASE: float = 0.5
+    GOVERNOR_BACKOFF_MAX: float = 30
+    GOVERNOR_RETRY_AFTER_MAX: float = 120
+
+    # Sub task timing spans and ETA
+    TIMING_MAX_SPANS: int = 200  # per sub task run
+    TIMING_STATS_WINDOW: int = 24 * 3600  # seconds of finished sub tasks the stats are computed from
+    TIMING_STATS_MAX_TASKS: int = 2000
+    TIMING_STATS_TTL: float = 60
+    TIMING_ETA_MIN_SAMPLES: int = 5
+
+    # Content-addressed memo of generation results, inputs hash -> uploaded urls
+    GEN_MEMO_KINDS: str = ""  # opt-in, comma separated kinds to memoize: cover, video
+    GEN_MEMO_VERSION: str = "1"  # bump to stop serving results of older prompts or models
+    GEN_MEMO_TTL: int = 30 * 24 * 3600
+    GEN_MEMO_LOCAL_TTL: float = 600
+    GEN_MEMO_DIGEST_TTL: float = 3600  # seconds a source image content digest is reused for
+    GEN_MEMO_DIGEST_MAX_BYTES: int = 10 * 1024 * 1024
+
+    # Idempotency-Key support of paid generation endpoints
+    IDEMPOTENCY_PATHS: str = "/api/aigc_task/gen_cover_img,/api/aigc_task/gen_scenario_video," \
+                             "/api/aigc_task/gen_music,/api/aigc_task/gen_lyrics,/api/aigc_task/gen_twitter_audio," \
+                             "/api/aigc_task/generate_all,/api/twitter-tts/create"
+    IDEMPOTENCY_TTL: int = 24 * 3600  # seconds a response is replayed for
+    IDEMPOTENCY_LOCK_TTL: float = 120  # seconds without renewal before an unfinished request's key can be taken over
+    IDEMPOTENCY_WAIT: float = 30  # seconds a concurrent duplicate waits for the original response
+    IDEMPOTENCY_POLL_INTERVAL: float = 0.2
+    IDEMPOTENCY_MAX_BODY: int = 1024 * 1024  # larger responses are not stored
+
+    # Tenant fair-share scheduler of generation jobs
+    # comma separated pool=capacity:tenant_max_in_flight, a video slot is held until its fal job finishes
+    SCHEDULER_POOLS: str = "image=16:3,video=12:3,music=8:2,llm=32:4,tts=16:3"
+    SCHEDULER_DEFAULT_CAPACITY: int = 16
+    SCHEDULER_TENANT_MAX_IN_FLIGHT: int = 3
+    SCHEDULER_TENANT_QUEUE_DEPTH: int = 50  # waiting jobs per tenant and pool before new ones are rejected
+    SCHEDULER_INTERACTIVE_WEIGHT: float = 4  # interactive jobs get this many turns per bulk turn in a shared pool
+
+    # Hedged image generation (seconds)
+    HEDGE_DEFAULT_DELAY: float = 120  # used until HEDGE_MIN_SAMPLES latencies are known
+    HEDGE_MIN_DELAY: float = 30
+    HEDGE_MAX_DELAY: float = 600
+    HEDGE_QUANTILE: float = 0.9
+    HEDGE_WINDOW: int = 200
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_BUDGET: float = 0.2  # max share of calls that fire a backup
+    HEDGE_BUDGETS: str = ""  # per scenario overrides, comma separated scenario=budget
+
+    # Upstream circuit breakers, named like the governor limiters
+    CIRCUIT_WINDOW: float = 60  # seconds of outcomes considered
+    CIRCUIT_MIN_CALLS: int = 10
+    CIRCUIT_ERROR_RATE: float = 0.5
+    CIRCUIT_SLOW_RATE: float = 0.8
+    CIRCUIT_SLOW_CALL_SECONDS: float = 60
+    CIRCUIT_SLOW_CALLS: str = "xapi=10,proxy:grok-3=60,proxy:gpt-4o-image=600,proxy:gpt-image-1=300," \
+                              "proxy:gemini-2.5-flash-image=300,fal=60"  # name=seconds overrides
+    CIRCUIT_OPEN_SECONDS: float = 30
+    CIRCUIT_HALF_OPEN_CALLS: int = 2
+
+    # Streaming TTS
+    TTS_STREAM_CHUNK_SIZE: int = 16 * 1024
+    S3_PART_SIZE: int = 5 * 1024 * 1024  # S3 minimum multipart part size
+
+    # Long text TTS pipeline
+    TTS_MAX_CHARS: int = 4000
+    TTS_SEGMENT_MAX_CHARS: int = 200
+    TTS_SEGMENT_CONCURRENCY: int = 4
+    TTS_CROSSFADE_MS: int = 10
+    TTS_PCM_SAMPLE_RATE: int = 32000
+
+    # TTS result cache, synthesis parameters -> uploaded audio url
+    TTS_CACHE_TTL: int = 7 * 24 * 3600  # seconds, 0 disables the cache
+    TTS_CACHE_LOCAL_TTL: float = 600
+    TTS_CACHE_LOCAL_SIZE: int = 2048
+    TTS_CACHE_DEFAULT_COST: float = 0.5  # USD per synthesis, used for the saved cost metric
+    TTS_CACHE_COSTS: str = ""  # per application overrides, comma separated application=USD
+
+    # LLM response cache for deterministic prompts (slogan, lyrics)
+    LLM_CACHE_TTL: float = 24 * 3600  # seconds, 0 disables the cache
+    LLM_CACHE_SIZE: int = 2048
+    LLM_JSON_MAX_ATTEMPTS: int = 3  # structured output attempts per call
+    LLM_JSON_DEADLINE: float = 120  # seconds for all attempts of a structured output call
+
+    # Cloned voice profiles, reference audio is cloned once and synthesized by voice id afterwards
+    VOICE_PROFILE_PROVIDER: str = "fal"  # "fal", "memory" (stand-in for tests) or "" to clone on every call
+    VOICE_PROFILE_TTL: int = 6 * 24 * 3600  # seconds unused before the provider may drop the voice
+    VOICE_PROFILE_LOCAL_TTL: float = 600
+
 
 SETTINGS = Settings()
@@ -71,6 +71,24 @@ class TaskStatus(StrEnum):
     IN_PROGRESS = "in_progress"
     DONE = "done"
     FAILED = "failed"
+    RETRYABLE = "retryable"  # upstream unavailable (circuit open), safe to submit again
+    CANCELLED = "cancelled"
+
+
+class PipelineStageStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    SKIPPED = "skipped"  # a dependency failed
+
+
+class FalJobStatus(StrEnum):
+    QUEUED = "queued"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class TaskType(StrEnum):
@@ -107,6 +125,14 @@ class AIGCTaskID(BaseModel):
     task_id: str = Field(description="task_id", default="")
 
 
+class TimingSpan(BaseModel):
+    stage: str = Field(description="queued, run, provider, upload, download or render")
+    provider: str = Field(description="upstream or scheduler pool", default="")
+    started_at: datetime.datetime = Field(description="started_at")
+    duration: float = Field(description="seconds")
+    ok: bool = Field(description="False if the step failed or was cancelled", default=True)
+
+
 class SubTask(BaseModel):
     sub_task_id: str = Field(description="sub_task_id")
     status: TaskStatus = Field(description="status", default=TaskStatus.IN_PROGRESS)
@@ -114,6 +140,13 @@ class SubTask(BaseModel):
     done_at: datetime.datetime | None = Field(description="done_at", default=None)
     history: list[dict[str, Any]] = Field(description="history", default_factory=list)
     fee: list[Fee] = Field(description="fee", default_factory=list)
+    provider_application: str = Field(description="provider application of the async job", default="")
+    provider_request_id: str = Field(description="provider request id of the async job", default="")
+    timings: list[TimingSpan] = Field(description="timing spans of the current run", default_factory=list)
+    eta_seconds: float | None = Field(description="estimated seconds until done while in progress, None if "
+                                                  "unknown; computed on read", default=None)
+    heartbeat_at: datetime.datetime | None = Field(description="renewed while the run is queued or running",
+                                                   default=None)
 
     def regenerate(self) -> None:
         if self.status == TaskStatus.DONE:
@@ -125,12 +158,19 @@ class SubTask(BaseModel):
         self.created_at = datetime.datetime.now()
         self.done_at = None
         self.sub_task_id = str(uuid.uuid4())
+        self.provider_application = ""
+        self.provider_request_id = ""
+        self.timings = []
+        self.eta_seconds = None
+        self.heartbeat_at = None
 
 
 class GenCoverImgReq(AIGCTaskID):
     x_link: str = Field(description="x link")
     img_url: str = Field(default="", description="manually specify cover img")
     style_id: int = Field(description="style id", default=1)
+    fresh: bool = Field(description="generate new images even if identical inputs were generated before",
+                        default=False)
 
 
 class BasicInfoReq(AIGCTaskID):
@@ -230,7 +270,9 @@ class GenCoverResp(BaseModel):
 
 class Cover(SubTask):
     input: GenCoverImgReq
-    output: GenCoverResp | None = Field(description="cover", default=None)
+    output: GenCoverResp | None = Field(description="cover, filled in as variants finish", default=None)
+    variants: dict[str, TaskStatus] = Field(description="status per image variant: first_frame, dance, sing, figure",
+                                            default_factory=dict)
 
 
 class Audio(SubTask):
@@ -309,6 +351,8 @@ class VideoKeyType(StrEnum):
 class GenVideoReq(BaseModel):
     task_id: str = Field(description="task_id")
     key: VideoKeyType = Field(description="Unique key")
+    fresh: bool = Field(description="generate a new video even if identical inputs were generated before",
+                        default=False)
     # scenario: str = Field(description="Scenario Description")
 
 
@@ -321,6 +365,80 @@ class GenVideoResp(BaseModel):
 class Video(SubTask):
     input: GenVideoReq
     output: GenVideoResp | None = Field(description="video url", default=None)
+    memo_key: str = Field(description="generation memo key of the inputs, set while videos are memoized",
+                          default="")
+
+
+class PipelineStage(BaseModel):
+    name: str = Field(description="stage name, e.g. cover, lyrics, video_dance")
+    deps: list[str] = Field(description="stages that must be done first", default_factory=list)
+    status: PipelineStageStatus = Field(description="status", default=PipelineStageStatus.PENDING)
+    error: str = Field(description="error message", default="")
+    started_at: datetime.datetime | None = Field(description="started_at", default=None)
+    done_at: datetime.datetime | None = Field(description="done_at", default=None)
+
+
+class Pipeline(BaseModel):
+    """One generate_all run, stages are keyed by name"""
+    pipeline_id: str = Field(description="pipeline_id")
+    stages: dict[str, PipelineStage] = Field(description="stages", default_factory=dict)
+    created_at: datetime.datetime = Field(description="created_at")
+    done_at: datetime.datetime | None = Field(description="done_at", default=None)
+
+
+class CancelSubTaskReq(AIGCTaskID):
+    sub_task_id: str = Field(description="sub task to cancel, every running sub task if empty", default="")
+
+
+class QueuePosition(BaseModel):
+    sub_task_id: str = Field(description="sub task waiting for a generation slot")
+    pool: str = Field(description="job pool, e.g. image, video")
+    position: int = Field(description="1-based position in the pool's fair-share queue")
+    running: int = Field(description="jobs running in the pool")
+    capacity: int = Field(description="max concurrent jobs of the pool")
+
+
+class StageTimingStat(BaseModel):
+    kind: str = Field(description="sub task kind: cover, lyrics, music, audio or video")
+    stage: str = Field(description="timing span stage, total is created_at to done_at")
+    provider: str = Field(description="upstream or scheduler pool", default="")
+    count: int = Field(description="number of samples")
+    p50: float = Field(description="median seconds")
+    p95: float = Field(description="95th percentile seconds")
+    error_rate: float = Field(description="share of failed spans")
+
+
+class GenerateAllReq(GenCoverImgReq):
+    """Inputs of every generation stage, for one-shot digital human generation"""
+    gender: Gender = Field(description="gender", default=Gender.MALE)
+    slogan: str = Field(description="slogan, generated with the cover if empty", default="")
+    voice_clone_url: str = Field(description="voice_clone_url", default="")
+    lang: Language = Field(description="language", default=Language.ENGLISH)
+    video_keys: list[VideoKeyType] = Field(description="scenario videos",
+                                           default_factory=lambda: [VideoKeyType.DANCE, VideoKeyType.SING,
+                                                                    VideoKeyType.FIGURE, VideoKeyType.SPEECH])
+    music_style: str = Field(description="music style", default="pop")
+    music_reference_audio_url: str = Field(description="music reference audio, voice_clone_url if empty",
+                                           default="")
+    x_tts_urls: list[str] = Field(description="x tts url", default_factory=list)
+
+
+class DigitalHumanDraft(BaseModel):
+    """
+    Publishable parts of a task, kept up to date by the sub task updates that complete them
+    so publishing does not rebuild them from the sub tasks and their history
+    """
+    materialized: bool = Field(description="maintained since the task was created or rebuilt, a draft without "
+                                           "it is incomplete", default=False)
+    cover_img: str = Field(description="cover_img", default="")
+    dance_image: str = Field(description="dance image", default="")
+    sing_image: str = Field(description="sing_image", default="")
+    figure_image: str = Field(description="figure image", default="")
+    first_frame_image: str = Field(description="first frame image", default="")
+    videos: dict[str, str] = Field(description="video sub_task_id -> view_url", default_factory=dict)
+    songs: dict[str, Any] = Field(description="songs", default_factory=dict)
+    audios: list[TwitterTTSResp] = Field(description="audios, newest run first", default_factory=list)
+    fee_total: float = Field(description="sum of the fees of all sub task runs", default=0.0)
 
 
 class AIGCTask(AIGCTaskID, TaskAndHuman):
@@ -330,6 +448,10 @@ class AIGCTask(AIGCTaskID, TaskAndHuman):
     music: Music | None = Field(description="music", default=None)
     videos: list[Video] = Field(description="videos", default_factory=list)
     audio: Audio | None = Field(description="audio", default=None)
+    pipeline: Pipeline | None = Field(description="last generate_all run", default=None)
+    # never null, a $set/$push/$inc on a field of a null draft fails the whole sub task update
+    draft: DigitalHumanDraft = Field(description="digital human draft, published as is",
+                                     default_factory=DigitalHumanDraft)
     created_at: datetime.datetime = Field(description="created_at", default=None)
     updated_at: datetime.datetime | None = Field(description="Last update time", default=None)
 
@@ -347,7 +469,8 @@ class AIGCTask(AIGCTaskID, TaskAndHuman):
             raise_error("audio not ready")
         elif self.audio.status == TaskStatus.IN_PROGRESS:
             raise_error("audio not ready")
-        elif self.audio.status == TaskStatus.FAILED and not self.audio.history:
+        elif self.audio.status in (TaskStatus.FAILED, TaskStatus.RETRYABLE, TaskStatus.CANCELLED) \
+                and not self.audio.history:
             raise_error("audio not ready")
 
         if not self.videos or len(self.videos) == 0:
@@ -358,6 +481,36 @@ class AIGCTask(AIGCTaskID, TaskAndHuman):
                 raise_error(f"{video.input.key} video not ready")
 
 
+class FalJob(BaseModel):
+    """Asynchronous fal request tracked by the central poller"""
+    request_id: str = Field(description="fal request id")
+    application: str = Field(description="fal application")
+    kind: str = Field(description="completion handler kind", default="")
+    task_id: str = Field(description="owning task id", default="")
+    sub_task_id: str = Field(description="owning sub task id", default="")
+    status: FalJobStatus = Field(description="status", default=FalJobStatus.QUEUED)
+    result: dict[str, Any] | None = Field(description="fal result", default=None)
+    error: str = Field(description="error message", default="")
+    poll_errors: int = Field(description="consecutive status poll errors", default=0)
+    poll_interval: float = Field(description="seconds between status polls", default=2)
+    next_poll_at: datetime.datetime | None = Field(description="next status poll time", default=None)
+    created_at: datetime.datetime = Field(description="created_at")
+    updated_at: datetime.datetime | None = Field(description="updated_at", default=None)
+    done_at: datetime.datetime | None = Field(description="done_at", default=None)
+
+
+class VoiceProfile(BaseModel):
+    """Provider voice cloned once from a reference audio and reused for synthesis"""
+    profile_id: str = Field(description="hash of provider and reference audio url")
+    provider: str = Field(description="voice profile provider")
+    reference_audio_url: str = Field(description="reference audio the voice was cloned from")
+    voice_id: str = Field(description="provider voice id")
+    created_at: datetime.datetime = Field(description="created_at")
+    last_used_at: datetime.datetime | None = Field(description="last_used_at", default=None)
+    expires_at: datetime.datetime | None = Field(description="provider drops the voice after this time",
+                                                 default=None)
+
+
 class TwitterTTSRequest(BaseModel):
     """Request model for creating Twitter TTS task"""
     twitter_url: str = Field(description="Twitter/X post URL")
@@ -373,6 +526,17 @@ class TwitterTTSRequest(BaseModel):
                                  description="Music style for music generation tasks (pop, rock, jazz, classical, electronic, folk, blues, country, hip_hop, ambient, custom)")
 
 
+class TTSStreamRequest(BaseModel):
+    """Request model for streaming text to speech"""
+    text: str = Field(description="Text to convert", min_length=1, max_length=5000)
+    voice: Optional[str] = Field(default=None, description="TTS voice to use")
+    model: Optional[str] = Field(default=None, description="TTS model to use")
+    response_format: str = Field(default="mp3", description="Audio format")
+    speed: float = Field(default=1.0, description="Speech speed", ge=0.25, le=4.0)
+    voice_id: Optional[str] = Field(default=None, description="Optional voice ID for TTS")
+    audio_url: Optional[str] = Field(default=None, description="Optional reference audio URL for voice cloning")
+
+
 class TwitterTTSResponse(BaseModel):
     """Response for Twitter TTS task"""
     task_id: str = Field(description="Generated task ID")
@@ -406,6 +570,9 @@ class TwitterTTSTask(BaseModel):
     username: Optional[str] | None = Field(default=None, description="Username for the TTS task")
     style: Optional[str] | None = Field(default=None, description="Music style for music generation tasks")
     digital_human_id: Optional[str] | None = Field(default=None, description="Digital human ID")
+    lease_owner: str | None = Field(description="processor worker holding the task", default=None)
+    lease_until: datetime.datetime | None = Field(description="time the task can be claimed again", default=None)
+    attempts: int = Field(description="processing attempts", default=0)
 
 
 class TwitterTTSTaskListResponse(BaseModel):
@@ -3,10 +3,13 @@ import uuid
 from typing import Literal
 
 import motor.motor_asyncio
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from common.error import raise_error
 from config import SETTINGS
-from entities.dto import AIGCTask, TwitterTTSTask, DigitalHuman, Profile
+from entities.dto import AIGCTask, TwitterTTSTask, DigitalHuman, Profile, FalJob, FalJobStatus, VoiceProfile, SubTask, \
+    TaskStatus, TaskType
 from entities.dto import PredefinedVoice
 
 client = motor.motor_asyncio.AsyncIOMotorClient(SETTINGS.MONGO_STR)
@@ -25,6 +28,11 @@ logs_col = db["logs"]
 messages_col = db["messages"]
 x_oauth_col = db["x_oauth"]
 profiles_col = db["profiles"]
+fal_job_col = db["fal_job"]
+tts_cache_col = db["tts_cache"]
+voice_profile_col = db["voice_profile"]
+idempotency_col = db["idempotency_key"]
+gen_memo_col = db["gen_memo"]
 
 
 async def digital_human_chat_count(digital_human_id: str):
@@ -125,6 +133,40 @@ async def aigc_task_get_by_id(task_id: str) -> AIGCTask | None:
         return None
 
 
+async def aigc_task_find_updated_since(since: datetime.datetime, limit: int) -> list[dict]:
+    """Raw sub task fields of the most recently updated tasks, for timing statistics"""
+    projection = {"_id": 0, "cover": 1, "lyrics": 1, "music": 1, "audio": 1, "videos": 1}
+    cursor = aigc_task_col.find({"updated_at": {"$gte": since}}, projection).sort("updated_at", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def aigc_task_find_stale_sub_tasks(cutoffs: dict[str, datetime.datetime], limit: int) -> list[dict]:
+    """
+    Tasks with a sub task still in progress whose last heartbeat is before the cutoff of its
+    field; created_at stands in for the heartbeat until the first one.
+
+    Args:
+        cutoffs: sub task field, e.g. "cover" or "videos" -> heartbeat cutoff
+        limit: max tasks
+
+    Returns:
+        Raw documents holding task_id and the status fields of the sub tasks
+    """
+    clauses = []
+    for path, cutoff in cutoffs.items():
+        for stale in ({"status": TaskStatus.IN_PROGRESS, "heartbeat_at": {"$lt": cutoff}},
+                      {"status": TaskStatus.IN_PROGRESS, "heartbeat_at": None, "created_at": {"$lt": cutoff}}):
+            if path == "videos":
+                clauses.append({"videos": {"$elemMatch": stale}})
+            else:
+                clauses.append({f"{path}.{k}": v for k, v in stale.items()})
+    fields = ("sub_task_id", "status", "created_at", "heartbeat_at", "provider_application", "provider_request_id",
+              "variants")
+    projection = {"_id": 0, "task_id": 1, **{f"{path}.{f}": 1 for path in cutoffs for f in fields}}
+    cursor = aigc_task_col.find({"$or": clauses}, projection).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
 async def aigc_task_delete_by_id(task_id: str):
     await aigc_task_col.delete_one({'task_id': task_id})
 
@@ -138,6 +180,95 @@ async def aigc_task_save(task: AIGCTask):
     await aigc_task_col.replace_one({"task_id": task.task_id}, task.model_dump(), upsert=True)
 
 
+async def aigc_task_update_sub_task(task_id: str, path: str, sub_task_id: str, fields: dict,
+                                    push: dict | None = None, task_fields: dict | None = None,
+                                    draft: dict | None = None, expected_status: TaskStatus | None = None) -> bool:
+    """
+    Set fields on one sub task without rewriting the whole task.
+
+    The update only applies while the sub task still has sub_task_id and is not cancelled,
+    so writes from superseded or cancelled runs are dropped. A pushed fee is added to the
+    running fee total of the task's digital human draft in the same update.
+
+    Args:
+        task_id: AIGC task id
+        path: sub task field, e.g. "cover" or "videos" (list of sub tasks)
+        sub_task_id: expected sub_task_id
+        fields: field name -> value, relative to the sub task
+        push: list field name -> item to append, relative to the sub task
+        task_fields: field name -> value on the task itself, set in the same update
+        draft: field name -> value on the task's digital human draft, set in the same update;
+            "audios" are put in front of the draft audios instead
+        expected_status: only update while the sub task has this status
+
+    Returns:
+        True if the sub task matched
+    """
+    prefix = f"{path}.$" if path == "videos" else path
+    update = {f"{prefix}.{k}": v for k, v in fields.items()}
+    update.update(task_fields or {})
+    update.update({f"draft.{k}": v for k, v in (draft or {}).items() if k != "audios"})
+    update["updated_at"] = datetime.datetime.now()
+    ops = {"$set": update}
+    pushes = {f"{prefix}.{k}": v for k, v in (push or {}).items()}
+    if draft and draft.get("audios"):
+        pushes["draft.audios"] = {"$each": draft["audios"], "$position": 0}
+    if pushes:
+        ops["$push"] = pushes
+    if push and "fee" in push:
+        ops["$inc"] = {"draft.fee_total": push["fee"]["amount"]}
+    status = expected_status or {"$ne": TaskStatus.CANCELLED}
+    if path == "videos":
+        query = {"task_id": task_id,
+                 "videos": {"$elemMatch": {"sub_task_id": sub_task_id, "status": status}}}
+    else:
+        query = {"task_id": task_id, f"{path}.sub_task_id": sub_task_id, f"{path}.status": status}
+    ret = await aigc_task_col.update_one(query, ops)
+    return ret.matched_count > 0
+
+
+async def aigc_task_set_sub_task(task_id: str, path: str, sub_task: SubTask):
+    """
+    Store a new or regenerated sub task without rewriting the whole task, so sub tasks
+    started concurrently do not overwrite each other.
+
+    Args:
+        task_id: AIGC task id
+        path: sub task field, e.g. "cover"; for "videos" the video with the same key is replaced
+            or the video appended
+        sub_task: the sub task
+    """
+    now = datetime.datetime.now()
+    doc = sub_task.model_dump()
+    if path != "videos":
+        await aigc_task_col.update_one({"task_id": task_id}, {"$set": {path: doc, "updated_at": now}})
+        return
+    ret = await aigc_task_col.update_one(
+        {"task_id": task_id, "videos.input.key": sub_task.input.key},
+        {"$set": {"videos.$": doc, "updated_at": now}},
+    )
+    if ret.matched_count == 0:
+        await aigc_task_col.update_one({"task_id": task_id}, {"$push": {"videos": doc}, "$set": {"updated_at": now}})
+
+
+async def aigc_task_set_fields(task_id: str, fields: dict):
+    """Set top level task fields"""
+    await aigc_task_col.update_one({"task_id": task_id},
+                                   {"$set": {**fields, "updated_at": datetime.datetime.now()}})
+
+
+async def aigc_task_update_pipeline_stage(task_id: str, pipeline_id: str, name: str, fields: dict,
+                                          pipeline_fields: dict | None = None) -> bool:
+    """
+    Set fields on one stage of the task's pipeline, dropped if a newer pipeline replaced it
+    """
+    update = {f"pipeline.stages.{name}.{k}": v for k, v in fields.items()}
+    update.update({f"pipeline.{k}": v for k, v in (pipeline_fields or {}).items()})
+    update["updated_at"] = datetime.datetime.now()
+    ret = await aigc_task_col.update_one({"task_id": task_id, "pipeline.pipeline_id": pipeline_id}, {"$set": update})
+    return ret.matched_count > 0
+
+
 # Twitter TTS Task operations
 async def twitter_tts_task_save(task: TwitterTTSTask):
     """Save or update Twitter TTS task"""
@@ -206,6 +337,262 @@ async def twitter_tts_task_get_pending() -> list[TwitterTTSTask]:
     return tasks
 
 
+async def twitter_tts_task_claim(task_type: TaskType, owner: str, lease: float) -> TwitterTTSTask | None:
+    """
+    Lease the oldest in-progress task of a type nobody holds a live lease on.
+
+    The claim is a single find_one_and_update, so concurrent workers in other processes
+    never get the same task. Each claim counts as an attempt.
+
+    Args:
+        task_type: task type
+        owner: id of the claiming worker
+        lease: seconds until the task can be claimed by others unless renewed
+
+    Returns:
+        The claimed task, None if there is nothing to claim
+    """
+    now = datetime.datetime.now()
+    ret = await twitter_tts_task_col.find_one_and_update(
+        {
+            "status": TaskStatus.IN_PROGRESS,
+            "task_type": task_type,
+            "$or": [{"lease_until": None}, {"lease_until": {"$lte": now}}],
+        },
+        {
+            "$set": {"lease_owner": owner, "lease_until": now + datetime.timedelta(seconds=lease),
+                     "processing_started_at": now, "updated_at": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if ret:
+        return TwitterTTSTask(**ret)
+    else:
+        return None
+
+
+async def twitter_tts_task_renew_lease(task_id: str, owner: str, lease: float) -> bool:
+    """Extend the lease of a running task, False if the lease was lost to another worker"""
+    ret = await twitter_tts_task_col.update_one(
+        {"task_id": task_id, "lease_owner": owner, "status": TaskStatus.IN_PROGRESS},
+        {"$set": {"lease_until": datetime.datetime.now() + datetime.timedelta(seconds=lease)}},
+    )
+    return ret.matched_count > 0
+
+
+async def twitter_tts_task_release(task_id: str, owner: str, delay: float = 0):
+    """Give a leased task back without counting the attempt, claimable again after delay seconds"""
+    await twitter_tts_task_col.update_one(
+        {"task_id": task_id, "lease_owner": owner, "status": TaskStatus.IN_PROGRESS},
+        {"$set": {"lease_owner": None, "lease_until": datetime.datetime.now() + datetime.timedelta(seconds=delay)},
+         "$inc": {"attempts": -1}},
+    )
+
+
+async def twitter_tts_task_finish(task_id: str, owner: str, fields: dict) -> bool:
+    """
+    Store the outcome of a leased task.
+
+    Returns:
+        True if the worker still held the lease, otherwise the outcome is dropped
+    """
+    now = datetime.datetime.now()
+    ret = await twitter_tts_task_col.update_one(
+        {"task_id": task_id, "lease_owner": owner, "status": TaskStatus.IN_PROGRESS},
+        {"$set": {**fields, "lease_owner": None, "lease_until": None, "updated_at": now}},
+    )
+    return ret.matched_count > 0
+
+
+# fal job operations
+async def fal_job_save(job: FalJob):
+    """Save or update fal job"""
+    job.updated_at = datetime.datetime.now()
+    await fal_job_col.replace_one({"request_id": job.request_id}, job.model_dump(), upsert=True)
+
+
+async def fal_job_get_by_request_id(request_id: str) -> FalJob | None:
+    ret = await fal_job_col.find_one({"request_id": request_id})
+    if ret:
+        return FalJob(**ret)
+    else:
+        return None
+
+
+async def fal_job_lease_due(limit: int) -> list[FalJob]:
+    """
+    Lease pending jobs whose next poll is due.
+
+    Each job is claimed with an atomic next_poll_at bump so concurrent pollers
+    in other processes skip it until the lease expires.
+    """
+    now = datetime.datetime.now()
+    cursor = fal_job_col.find({
+        "status": {"$in": [FalJobStatus.QUEUED, FalJobStatus.IN_PROGRESS]},
+        "next_poll_at": {"$lte": now},
+    }).sort("next_poll_at", 1).limit(limit)
+
+    jobs = []
+    async for doc in cursor:
+        job = FalJob(**doc)
+        leased = await fal_job_col.find_one_and_update(
+            {"request_id": job.request_id, "next_poll_at": doc["next_poll_at"]},
+            {"$set": {"next_poll_at": now + datetime.timedelta(seconds=job.poll_interval)}},
+        )
+        if leased:
+            jobs.append(job)
+    return jobs
+
+
+async def fal_job_finish(request_id: str, status: FalJobStatus, result: dict | None = None,
+                         error: str = "") -> FalJob | None:
+    """
+    Atomically move a pending job to a terminal status.
+
+    Returns:
+        The finished job, or None if it was already finished by someone else
+    """
+    now = datetime.datetime.now()
+    ret = await fal_job_col.find_one_and_update(
+        {"request_id": request_id, "status": {"$in": [FalJobStatus.QUEUED, FalJobStatus.IN_PROGRESS]}},
+        {"$set": {"status": status, "result": result, "error": error, "done_at": now, "updated_at": now}},
+        return_document=True,
+    )
+    if ret:
+        return FalJob(**ret)
+    else:
+        return None
+
+
+async def fal_job_update(request_id: str, fields: dict):
+    fields["updated_at"] = datetime.datetime.now()
+    await fal_job_col.update_one({"request_id": request_id}, {"$set": fields})
+
+
+async def tts_cache_get(key: str) -> dict | None:
+    """Get an unexpired TTS cache entry"""
+    return await tts_cache_col.find_one({"key": key, "expires_at": {"$gt": datetime.datetime.now()}})
+
+
+async def tts_cache_put(key: str, audio_url: str, params: dict, ttl: int):
+    now = datetime.datetime.now()
+    await tts_cache_col.update_one(
+        {"key": key},
+        {"$set": {"audio_url": audio_url, "params": params, "created_at": now,
+                  "expires_at": now + datetime.timedelta(seconds=ttl)}},
+        upsert=True,
+    )
+
+
+async def tts_cache_delete(key: str):
+    await tts_cache_col.delete_one({"key": key})
+
+
+async def gen_memo_get(key: str) -> dict | None:
+    """Get an unexpired generation memo entry"""
+    return await gen_memo_col.find_one({"key": key, "expires_at": {"$gt": datetime.datetime.now()}})
+
+
+async def gen_memo_put(key: str, kind: str, inputs: dict, result: dict, ttl: int):
+    now = datetime.datetime.now()
+    await gen_memo_col.update_one(
+        {"key": key},
+        {"$set": {"kind": kind, "inputs": inputs, "result": result, "created_at": now,
+                  "expires_at": now + datetime.timedelta(seconds=ttl)}},
+        upsert=True,
+    )
+
+
+async def idempotency_claim(key: str, fingerprint: str, lock_ttl: float, ttl: float) -> dict | None:
+    """
+    Claim an idempotency key for a new request.
+
+    A key is free if it was never seen, its entry expired, or the request holding it stopped
+    renewing its lock (e.g. the process died).
+
+    Args:
+        key: scoped idempotency key
+        fingerprint: hash of the request, stored to detect a key reused for another request
+        lock_ttl: seconds the claim is held without completion
+        ttl: seconds the entry is kept
+
+    Returns:
+        None if the key was claimed, otherwise the existing entry
+    """
+    now = datetime.datetime.now()
+    entry = {
+        "fingerprint": fingerprint,
+        "status": "in_progress",
+        "locked_until": now + datetime.timedelta(seconds=lock_ttl),
+        "created_at": now,
+        "expires_at": now + datetime.timedelta(seconds=ttl),
+    }
+    stale = {"$or": [{"expires_at": {"$lte": now}},
+                     {"status": "in_progress", "locked_until": {"$lte": now}}]}
+    try:
+        existing = await idempotency_col.find_one_and_update(
+            {"key": key}, {"$setOnInsert": entry}, upsert=True, return_document=ReturnDocument.BEFORE)
+    except DuplicateKeyError:
+        # a concurrent duplicate inserted first
+        existing = await idempotency_col.find_one({"key": key})
+    if existing is None:
+        return None
+    taken = await idempotency_col.find_one_and_replace({"key": key, **stale}, {"key": key, **entry})
+    return None if taken else (await idempotency_col.find_one({"key": key}) or existing)
+
+
+async def idempotency_renew_lock(key: str, lock_ttl: float) -> bool:
+    """Extend the claim of a request still running, returns False if the key is no longer in progress"""
+    ret = await idempotency_col.update_one(
+        {"key": key, "status": "in_progress"},
+        {"$set": {"locked_until": datetime.datetime.now() + datetime.timedelta(seconds=lock_ttl)}})
+    return ret.matched_count > 0
+
+
+async def idempotency_get(key: str) -> dict | None:
+    return await idempotency_col.find_one({"key": key})
+
+
+async def idempotency_complete(key: str, status_code: int, body: bytes, media_type: str | None):
+    await idempotency_col.update_one({"key": key}, {"$set": {
+        "status": "done",
+        "status_code": status_code,
+        "body": body,
+        "media_type": media_type,
+        "done_at": datetime.datetime.now(),
+    }})
+
+
+async def idempotency_release(key: str):
+    """Drop an unfinished claim so the request can be retried"""
+    await idempotency_col.delete_one({"key": key, "status": "in_progress"})
+
+
+async def voice_profile_save(profile: VoiceProfile):
+    await voice_profile_col.replace_one({"profile_id": profile.profile_id}, profile.model_dump(), upsert=True)
+
+
+async def voice_profile_get(profile_id: str) -> VoiceProfile | None:
+    ret = await voice_profile_col.find_one({"profile_id": profile_id})
+    if ret:
+        return VoiceProfile(**ret)
+    else:
+        return None
+
+
+async def voice_profile_touch(profile_id: str, expires_at: datetime.datetime | None):
+    await voice_profile_col.update_one(
+        {"profile_id": profile_id},
+        {"$set": {"last_used_at": datetime.datetime.now(), "expires_at": expires_at}},
+    )
+
+
+async def voice_profile_delete(profile_id: str):
+    await voice_profile_col.delete_one({"profile_id": profile_id})
+
+
 # Predefined Voice operations
 async def predefined_voice_save(voice: PredefinedVoice):
     """Save or update predefined voice"""
@@ -275,6 +662,9 @@ async def create_twitter_tts_indexes():
         await twitter_tts_task_col.create_index("created_at")
         await twitter_tts_task_col.create_index("tweet_id")
         await twitter_tts_task_col.create_index("username")
+        # claim scan of the processor
+        await twitter_tts_task_col.create_index([("status", 1), ("task_type", 1), ("lease_until", 1),
+                                                 ("created_at", 1)])
         print("Twitter TTS task indexes created successfully")
     except Exception as e:
         print(f"Error creating Twitter TTS task indexes: {e}")
@@ -293,11 +683,81 @@ async def create_predefined_voice_indexes():
         print(f"Error creating predefined voice indexes: {e}")
 
 
+async def create_aigc_task_indexes():
+    """Create indexes for the aigc_task collection"""
+    try:
+        await aigc_task_col.create_index("task_id")
+        await aigc_task_col.create_index("updated_at")
+        # stale sub task scan of the reaper
+        for path in ("cover", "lyrics", "music", "audio", "videos"):
+            await aigc_task_col.create_index([(f"{path}.status", 1), (f"{path}.created_at", 1)])
+            await aigc_task_col.create_index([(f"{path}.status", 1), (f"{path}.heartbeat_at", 1)])
+        print("aigc task indexes created successfully")
+    except Exception as e:
+        print(f"Error creating aigc task indexes: {e}")
+
+
+async def create_fal_job_indexes():
+    """Create indexes for the fal_job collection"""
+    try:
+        await fal_job_col.create_index("request_id", unique=True)
+        await fal_job_col.create_index([("status", 1), ("next_poll_at", 1)])
+        await fal_job_col.create_index("sub_task_id")
+        print("fal job indexes created successfully")
+    except Exception as e:
+        print(f"Error creating fal job indexes: {e}")
+
+
+async def create_tts_cache_indexes():
+    """Create indexes for the tts_cache collection, entries are removed by mongo once expired"""
+    try:
+        await tts_cache_col.create_index("key", unique=True)
+        await tts_cache_col.create_index("expires_at", expireAfterSeconds=0)
+        print("tts cache indexes created successfully")
+    except Exception as e:
+        print(f"Error creating tts cache indexes: {e}")
+
+
+async def create_gen_memo_indexes():
+    """Create indexes for the gen_memo collection, entries are removed by mongo once expired"""
+    try:
+        await gen_memo_col.create_index("key", unique=True)
+        await gen_memo_col.create_index("expires_at", expireAfterSeconds=0)
+        print("gen memo indexes created successfully")
+    except Exception as e:
+        print(f"Error creating gen memo indexes: {e}")
+
+
+async def create_idempotency_indexes():
+    """Create indexes for the idempotency_key collection, entries are removed by mongo once expired"""
+    try:
+        await idempotency_col.create_index("key", unique=True)
+        await idempotency_col.create_index("expires_at", expireAfterSeconds=0)
+        print("idempotency indexes created successfully")
+    except Exception as e:
+        print(f"Error creating idempotency indexes: {e}")
+
+
+async def create_voice_profile_indexes():
+    """Create indexes for the voice_profile collection"""
+    try:
+        await voice_profile_col.create_index("profile_id", unique=True)
+        print("voice profile indexes created successfully")
+    except Exception as e:
+        print(f"Error creating voice profile indexes: {e}")
+
+
 async def init_indexes():
     try:
         await create_user_indexes()
         await create_twitter_tts_indexes()
         await create_predefined_voice_indexes()
+        await create_aigc_task_indexes()
+        await create_fal_job_indexes()
+        await create_tts_cache_indexes()
+        await create_voice_profile_indexes()
+        await create_idempotency_indexes()
+        await create_gen_memo_indexes()
         print("All indexes created successfully")
     except Exception as e:
         print(f"Error creating indexes: {e}")
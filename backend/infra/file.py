@@ -1,56 +1,67 @@
+import asyncio
 import base64
 import logging
 import os
 import uuid
 
 import aioboto3
-import aiohttp
 from fastapi import UploadFile
 from openai.types import Image
 
+from common.timing import timed
 from config import SETTINGS
 from entities.bo import FileBO
 from infra.db import file_col
+from infra.http_session import HTTP
 
 bucket_name = "web3ai"
 
+audio_content_types = {
+    'mp3': 'audio/mpeg',
+    'opus': 'audio/opus',
+    'aac': 'audio/aac',
+    'flac': 'audio/flac',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg'
+}
 
+
+@timed("download")
 async def img_url_to_base64(image_url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(image_url) as response:
-            response.raise_for_status()
-            content = await response.read()
-            encoded_data = base64.b64encode(content).decode("utf-8")
-            return "data:image/png;base64," + encoded_data
+    async with HTTP.session().get(image_url) as response:
+        response.raise_for_status()
+        content = await response.read()
+        encoded_data = base64.b64encode(content).decode("utf-8")
+        return "data:image/png;base64," + encoded_data
 
 
+@timed("upload", "s3")
 async def download_and_upload_url(url):
     file_name = f"{uuid.uuid4()}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                content = await response.read()
-
-                with open(file_name, 'wb') as f:
-                    f.write(content)
-
-                session = aioboto3.Session()
-                async with session.client(
-                        "s3",
-                        region_name="ap-southeast-2",
-                        aws_access_key_id=SETTINGS.AWS_ACCESS_KEY,
-                        aws_secret_access_key=SETTINGS.AWS_SECRET_KEY,
-                ) as s3:
-                    await s3.put_object(
-                        Bucket=bucket_name,
-                        Key=file_name,
-                        Body=content,
-                        ACL="public-read",
-                        ContentType=response.headers.get("Content-Type", "application/octet-stream")
-                    )
-                fileurl = f"https://{bucket_name}.s3.ap-southeast-2.amazonaws.com/{file_name}"
-                return fileurl
+        async with HTTP.session().get(url) as response:
+            response.raise_for_status()
+            content = await response.read()
+
+            with open(file_name, 'wb') as f:
+                f.write(content)
+
+            session = aioboto3.Session()
+            async with session.client(
+                    "s3",
+                    region_name="ap-southeast-2",
+                    aws_access_key_id=SETTINGS.AWS_ACCESS_KEY,
+                    aws_secret_access_key=SETTINGS.AWS_SECRET_KEY,
+            ) as s3:
+                await s3.put_object(
+                    Bucket=bucket_name,
+                    Key=file_name,
+                    Body=content,
+                    ACL="public-read",
+                    ContentType=response.headers.get("Content-Type", "application/octet-stream")
+                )
+            fileurl = f"https://{bucket_name}.s3.ap-southeast-2.amazonaws.com/{file_name}"
+            return fileurl
 
     except Exception as e:
         logging.error(f"download_and_upload_image {e}", exc_info=True)
@@ -60,6 +71,7 @@ async def download_and_upload_url(url):
     return ""
 
 
+@timed("upload", "s3")
 async def upload_audio_file(audio_data: bytes, file_extension: str) -> str | None:
     """
     Upload audio file data to S3 storage
@@ -78,16 +90,7 @@ async def upload_audio_file(audio_data: bytes, file_extension: str) -> str | Non
         file_key = f"{file_uuid}.{file_extension}"
 
         # Determine content type based on file extension
-        content_type_map = {
-            'mp3': 'audio/mpeg',
-            'opus': 'audio/opus',
-            'aac': 'audio/aac',
-            'flac': 'audio/flac',
-            'wav': 'audio/wav',
-            'ogg': 'audio/ogg'
-        }
-
-        content_type = content_type_map.get(file_extension.lower(), 'audio/mpeg')
+        content_type = audio_content_types.get(file_extension.lower(), 'audio/mpeg')
 
         session = aioboto3.Session()
         async with session.client(
@@ -115,6 +118,105 @@ async def upload_audio_file(audio_data: bytes, file_extension: str) -> str | Non
         return None
 
 
+class S3StreamUpload:
+    """
+    Upload a file to S3 while it is being produced.
+
+    Chunks passed to write() are handed to a background task that uploads S3_PART_SIZE parts
+    with a multipart upload, so the producer never waits for S3. Files smaller than one part
+    are stored with a single put_object. The public url is known up front.
+    """
+
+    def __init__(self, file_extension: str = "mp3"):
+        file_extension = file_extension or "mp3"
+        self.file_key = f"{uuid.uuid4()}.{file_extension}"
+        self.content_type = audio_content_types.get(file_extension.lower(), 'application/octet-stream')
+        self.url = f"https://{bucket_name}.s3.ap-southeast-2.amazonaws.com/{self.file_key}"
+        self.size = 0
+        self._queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def write(self, chunk: bytes):
+        if chunk:
+            self.size += len(chunk)
+            self._queue.put_nowait(chunk)
+
+    async def finish(self) -> str | None:
+        """
+        Flush the remaining data and complete the upload.
+
+        Returns:
+            The file url, or None if the upload failed
+        """
+        self._queue.put_nowait(None)
+        try:
+            return await self._task
+        except Exception as e:
+            logging.error(f"Error uploading stream {self.file_key}: {e}", exc_info=True)
+            return None
+
+    async def abort(self):
+        """Stop the upload and drop the uploaded parts"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+
+    async def _run(self) -> str:
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        session = aioboto3.Session()
+        async with session.client(
+                "s3",
+                region_name="ap-southeast-2",
+                aws_access_key_id=SETTINGS.AWS_ACCESS_KEY,
+                aws_secret_access_key=SETTINGS.AWS_SECRET_KEY,
+        ) as s3:
+            try:
+                while True:
+                    chunk = await self._queue.get()
+                    if chunk is None:
+                        break
+                    buffer += chunk
+                    if len(buffer) < SETTINGS.S3_PART_SIZE:
+                        continue
+                    if upload_id is None:
+                        ret = await s3.create_multipart_upload(Bucket=bucket_name, Key=self.file_key,
+                                                               ACL="public-read", ContentType=self.content_type)
+                        upload_id = ret["UploadId"]
+                    body, buffer = bytes(buffer), bytearray()
+                    ret = await s3.upload_part(Bucket=bucket_name, Key=self.file_key, UploadId=upload_id,
+                                               PartNumber=len(parts) + 1, Body=body)
+                    parts.append({"ETag": ret["ETag"], "PartNumber": len(parts) + 1})
+
+                if upload_id is None:
+                    await s3.put_object(Bucket=bucket_name, Key=self.file_key, Body=bytes(buffer),
+                                        ACL="public-read", ContentType=self.content_type)
+                else:
+                    if buffer:
+                        ret = await s3.upload_part(Bucket=bucket_name, Key=self.file_key, UploadId=upload_id,
+                                                   PartNumber=len(parts) + 1, Body=bytes(buffer))
+                        parts.append({"ETag": ret["ETag"], "PartNumber": len(parts) + 1})
+                    await s3.complete_multipart_upload(Bucket=bucket_name, Key=self.file_key, UploadId=upload_id,
+                                                       MultipartUpload={"Parts": parts})
+            except BaseException:
+                if upload_id is not None:
+                    try:
+                        await s3.abort_multipart_upload(Bucket=bucket_name, Key=self.file_key, UploadId=upload_id)
+                    except Exception as e:
+                        logging.warning(f"Failed to abort multipart upload {self.file_key}: {e}")
+                raise
+
+        logging.info(f"Audio stream uploaded to S3: {self.file_key}, size: {self.size} bytes, parts: {len(parts)}")
+        return self.url
+
+
 async def s3_upload_file(file: UploadFile) -> FileBO:
     """
     Upload file to S3 storage
@@ -163,6 +265,7 @@ def _guess_content_type(filename: str) -> str:
     return content_type or 'application/octet-stream'
 
 
+@timed("upload", "s3")
 async def s3_upload_openai_img(img: Image) -> str | None:
     """
     Upload file to S3 storage
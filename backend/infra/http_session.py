@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
+
+from config import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class HttpSessionRegistry:
+    """
+    Process wide pooled aiohttp session shared by every outbound HTTP call.
+
+    The session is opened in the app lifespan (``start``) and closed on shutdown (``close``).
+    Calls made before ``start`` (scripts, one-off jobs) lazily create it on first use.
+    """
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+        self._requests: dict[str, int] = defaultdict(int)
+        self._new_connections: dict[str, int] = defaultdict(int)
+        self._reused_connections: dict[str, int] = defaultdict(int)
+        self._dns_hits: dict[str, int] = defaultdict(int)
+        self._dns_misses: dict[str, int] = defaultdict(int)
+
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session, creating it if needed.
+
+        :return: The shared aiohttp.ClientSession.
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    async def start(self):
+        """Create the shared session and optionally pre-connect to known upstream hosts."""
+        self.session()
+        logger.info("HTTP session registry started")
+        if SETTINGS.HTTP_WARMUP:
+            await self.warmup(self._warmup_urls())
+
+    async def close(self):
+        """Close the shared session and release pooled connections."""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        logger.info("HTTP session registry closed")
+
+    async def warmup(self, urls: list[str]):
+        """
+        Open keep-alive connections ahead of the first real request.
+
+        :param urls: URLs whose hosts should be pre-connected. Failures are ignored.
+        """
+        if not urls:
+            return
+
+        session = self.session()
+
+        async def _touch(url: str):
+            try:
+                async with session.head(url, allow_redirects=False,
+                                        timeout=aiohttp.ClientTimeout(total=SETTINGS.HTTP_CONNECT_TIMEOUT)):
+                    pass
+            except Exception as e:
+                logger.warning(f"HTTP warmup failed for {url}: {e}")
+
+        await asyncio.gather(*[_touch(url) for url in urls])
+        logger.info(f"HTTP warmup done for {len(urls)} hosts")
+
+    def stats(self) -> dict:
+        """
+        Per-host pool statistics.
+
+        :return: Dict keyed by host with idle/active connection counts and request counters.
+        """
+        idle: dict[str, int] = defaultdict(int)
+        active: dict[str, int] = defaultdict(int)
+        connector = self._session.connector if self._session and not self._session.closed else None
+        if connector is not None:
+            # aiohttp does not expose pool occupancy publicly, read it defensively.
+            for key, conns in getattr(connector, "_conns", {}).items():
+                idle[key.host] += len(conns)
+            for key, acquired in getattr(connector, "_acquired_per_host", {}).items():
+                active[key.host] += len(acquired)
+
+        hosts = set(idle) | set(active) | set(self._requests)
+        return {
+            "limit": SETTINGS.HTTP_POOL_LIMIT,
+            "limit_per_host": SETTINGS.HTTP_POOL_LIMIT_PER_HOST,
+            "hosts": {
+                host: {
+                    "idle": idle.get(host, 0),
+                    "active": active.get(host, 0),
+                    "requests": self._requests.get(host, 0),
+                    "new_connections": self._new_connections.get(host, 0),
+                    "reused_connections": self._reused_connections.get(host, 0),
+                    "dns_cache_hits": self._dns_hits.get(host, 0),
+                    "dns_cache_misses": self._dns_misses.get(host, 0),
+                }
+                for host in sorted(hosts)
+            },
+        }
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=SETTINGS.HTTP_POOL_LIMIT,
+            limit_per_host=SETTINGS.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=SETTINGS.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=SETTINGS.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=SETTINGS.HTTP_TIMEOUT,
+            connect=SETTINGS.HTTP_CONNECT_TIMEOUT,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            self._requests[ctx.host] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self._new_connections[getattr(ctx, "host", "")] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._reused_connections[getattr(ctx, "host", "")] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self._dns_hits[params.host] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self._dns_misses[params.host] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    @staticmethod
+    def _warmup_urls() -> list[str]:
+        candidates = [SETTINGS.XAPI_IO_HOST, SETTINGS.PROXY_OPENAI_BASE_URL]
+        candidates.extend(u.strip() for u in SETTINGS.HTTP_WARMUP_URLS.split(","))
+        urls = []
+        for c in candidates:
+            if not c:
+                continue
+            parsed = urlparse(c)
+            if parsed.scheme and parsed.netloc:
+                url = f"{parsed.scheme}://{parsed.netloc}/"
+                if url not in urls:
+                    urls.append(url)
+        return urls
+
+
+HTTP = HttpSessionRegistry()
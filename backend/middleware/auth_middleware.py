@@ -29,7 +29,8 @@ class AuthConfig:
         "/api/twitter-tts/tasks",
         "/api/callback",
         "/api/digital_human/get_by_digital_name",
-        "/innerapi/clone_twitter_audio"
+        "/innerapi/clone_twitter_audio",
+        "/innerapi/fal/webhook",
     ]
 
 
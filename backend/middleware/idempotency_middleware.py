@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+
+from common.error_messages import get_error_message
+from common.exceptions import ErrorCode
+from common.metrics import METRICS
+from common.response import RestResponse
+from config import SETTINGS
+from infra.db import idempotency_claim, idempotency_get, idempotency_complete, idempotency_release, \
+    idempotency_renew_lock, create_idempotency_indexes
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _error(error_code: ErrorCode) -> JSONResponse:
+    return JSONResponse(
+        status_code=200,
+        content=RestResponse(code=error_code, msg=get_error_message(error_code)).model_dump(exclude_none=True)
+    )
+
+
+def _succeeded(status_code: int, body: bytes) -> bool:
+    """2xx, and for RestResponse bodies code 0; failed requests are not replayed so they can be retried"""
+    if not 200 <= status_code < 300:
+        return False
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return True
+    return not isinstance(payload, dict) or payload.get("code", 0) == 0
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Idempotency-Key support for paid generation endpoints (IDEMPOTENCY_PATHS).
+
+    The first request with a key claims it in the idempotency_key collection and its
+    successful response is stored for IDEMPOTENCY_TTL. A repeat of the same request gets
+    the stored response without reaching the endpoint, so no work is scheduled and no
+    usage limit is consumed again. A duplicate arriving while the original is running waits
+    for its response; the original renews its claim while it runs, so only a claim whose
+    process died is taken over after IDEMPOTENCY_LOCK_TTL. Keys are scoped per user and path; reusing a key with another body
+    is rejected. Must run inside the auth middleware.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._paths = {p.strip() for p in SETTINGS.IDEMPOTENCY_PATHS.split(",") if p.strip()}
+        self._done_events: dict[str, asyncio.Event] = {}
+        self._indexes_created = False
+
+    async def dispatch(self, request: Request, call_next):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != "POST" or not idempotency_key or request.url.path not in self._paths:
+            return await call_next(request)
+        if len(idempotency_key) > 255:
+            return _error(ErrorCode.INVALID_PARAMETERS)
+
+        if not self._indexes_created:
+            self._indexes_created = True
+            await create_idempotency_indexes()
+
+        user = getattr(request.state, "user", None) or {}
+        key = f"{user.get('tenant_id') or user.get('username', '')}:{request.url.path}:{idempotency_key}"
+        fingerprint = hashlib.sha256(await request.body()).hexdigest()
+
+        entry = await idempotency_claim(key, fingerprint, SETTINGS.IDEMPOTENCY_LOCK_TTL, SETTINGS.IDEMPOTENCY_TTL)
+        if entry is None:
+            return await self._execute(key, request, call_next)
+
+        if entry["fingerprint"] != fingerprint:
+            METRICS.incr("idempotency.conflict")
+            return _error(ErrorCode.IDEMPOTENCY_KEY_REUSED)
+        if entry["status"] == "in_progress":
+            METRICS.incr("idempotency.waited")
+            entry = await self._wait(key)
+            if entry is None:
+                # the original failed and released the key, run this one instead
+                return await self.dispatch(request, call_next)
+            if entry["status"] == "in_progress":
+                return _error(ErrorCode.REQUEST_IN_PROGRESS)
+
+        METRICS.incr("idempotency.replayed")
+        logger.info(f"M idempotent replay {key}")
+        return Response(content=entry["body"], status_code=entry["status_code"], media_type=entry["media_type"],
+                        headers={REPLAYED_HEADER: "true"})
+
+    async def _execute(self, key: str, request: Request, call_next) -> Response:
+        event = self._done_events.setdefault(key, asyncio.Event())
+        renewal = asyncio.create_task(self._renew_lock(key))
+        stored = False
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            if _succeeded(response.status_code, body) and len(body) <= SETTINGS.IDEMPOTENCY_MAX_BODY:
+                await idempotency_complete(key, response.status_code, body, response.media_type)
+                stored = True
+            headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+            return Response(content=body, status_code=response.status_code, headers=headers,
+                            media_type=response.media_type, background=response.background)
+        finally:
+            renewal.cancel()
+            if not stored:
+                await idempotency_release(key)
+            event.set()
+            self._done_events.pop(key, None)
+
+    @staticmethod
+    async def _renew_lock(key: str):
+        while True:
+            await asyncio.sleep(SETTINGS.IDEMPOTENCY_LOCK_TTL / 3)
+            try:
+                if not await idempotency_renew_lock(key, SETTINGS.IDEMPOTENCY_LOCK_TTL):
+                    return
+            except Exception as e:
+                logger.warning(f"M idempotency lock renewal of {key} failed: {e}")
+
+    async def _wait(self, key: str) -> dict | None:
+        """Wait for the request holding key to finish, woken directly when it runs in this process"""
+        deadline = time.monotonic() + SETTINGS.IDEMPOTENCY_WAIT
+        while True:
+            event = self._done_events.get(key)
+            timeout = min(SETTINGS.IDEMPOTENCY_POLL_INTERVAL * (10 if event else 1), deadline - time.monotonic())
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(event.wait() if event else asyncio.sleep(timeout), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            entry = await idempotency_get(key)
+            if entry is None or entry["status"] != "in_progress" or time.monotonic() >= deadline:
+                return entry
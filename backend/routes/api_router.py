@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import logging
 import uuid
@@ -7,23 +8,30 @@ from fastapi import APIRouter, UploadFile, File, BackgroundTasks, Depends, Query
 from fastapi.responses import StreamingResponse
 from starlette.responses import Response, RedirectResponse
 
+from clients.circuit_breaker import BREAKERS
+from clients.fal_jobs import FAL_JOBS
 from clients.x_api_io_client import x_get_user_last_tweets_by_username
 from common.error import raise_error
+from common.metrics import METRICS
 from common.response import RestResponse
 from config import SETTINGS
 from entities.bo import FileBO, TwitterDTO
 from entities.dto import GenCoverImgReq, AIGCTask, AIGCTaskID, GenVideoReq, DigitalHuman, ID, Username, AIGCPublishReq, \
     GenerateLyricsReq, GenMusicReq, BasicInfoReq, GenXAudioReq, Username1, Profile, DigitalHumanPageReq, PointsDetails, \
-    InvitationCode, CloneXAudioReq
+    InvitationCode, CloneXAudioReq, GenerateAllReq, CancelSubTaskReq, QueuePosition, DigitalHumanDraft
 from infra.db import aigc_task_col, aigc_task_get_by_id, aigc_task_count_by_tenant_id, digital_human_col, \
     digital_human_get_by_id, digital_human_get_by_digital_human, aigc_task_delete_by_id, digital_human_col_delete_by_id, \
     get_profile_by_tenant_id, add_points, digital_human_save, profile_save, profiles_col, aigc_task_save, \
     digital_human_chat_count
 from infra.file import s3_upload_file
+from infra.http_session import HTTP
 from middleware.auth_middleware import get_optional_current_user
 from services.aigc_service import gen_cover_img_svc, gen_video_svc, aigc_task_publish_by_id, gen_lyrics_svc, \
-    gen_music_svc, save_basic_info, gen_twitter_audio_svc, clone_twitter_audio_svc
+    gen_music_svc, save_basic_info, gen_twitter_audio_svc, clone_twitter_audio_svc, cancel_sub_task_svc, \
+    queue_positions_svc
 from services.chat_service import event_generator
+from services.pipeline_service import generate_all_svc
+from services.timing_service import fill_eta, timing_stats_svc
 from services.twitter_service import twitter_fetch_user_svc, twitter_callback_svc, twitter_redirect_url
 
 logger = logging.getLogger(__name__)
@@ -48,6 +56,30 @@ async def health():
     return "UP"
 
 
+@router.get("/api/health/http_pool", include_in_schema=False)
+async def health_http_pool():
+    """Outbound HTTP pool statistics per host"""
+    return RestResponse(data=HTTP.stats())
+
+
+@router.get("/api/health/metrics", include_in_schema=False)
+async def health_metrics():
+    """In-process metrics snapshot"""
+    return RestResponse(data=METRICS.snapshot())
+
+
+@router.get("/api/health/circuits", include_in_schema=False)
+async def health_circuits():
+    """Circuit breaker state per upstream"""
+    return RestResponse(data=BREAKERS.stats())
+
+
+@router.get("/api/health/timings", include_in_schema=False)
+async def health_timings(hours: float = Query(default=24, gt=0, le=24 * 30)):
+    """p50/p95 of sub task stages per provider over the last hours"""
+    return RestResponse(data=await timing_stats_svc(hours * 3600))
+
+
 @router.post("/api/upload_file", summary="upload_file", response_model=RestResponse[FileBO])
 async def upload_file(
         file: UploadFile = File(...),
@@ -74,11 +106,44 @@ async def create_aigc_task(user: Optional[dict] = Depends(get_optional_current_u
         tenant_id=user.get("tenant_id", ""),
         created_at=datetime.datetime.now(),
         updated_at=datetime.datetime.now(),
+        draft=DigitalHumanDraft(materialized=True),
     )
     await aigc_task_col.insert_one(task.model_dump())
     return RestResponse(data=task)
 
 
+@router.post("/api/aigc_task/generate_all",
+             summary="aigc_task/generate_all",
+             response_model=RestResponse[AIGCTask]
+             )
+async def generate_all(req: GenerateAllReq, background_tasks: BackgroundTasks):
+    """Generate cover, videos, lyrics, music and audio in one call, progress is in task.pipeline"""
+    logging.info(f"M generate_all req: {req.model_dump_json()}")
+    ret = await generate_all_svc(req, background_tasks)
+    return RestResponse(data=ret)
+
+
+@router.post("/api/aigc_task/cancel",
+             summary="aigc_task/cancel",
+             response_model=RestResponse[AIGCTask]
+             )
+async def cancel_aigc_task(req: CancelSubTaskReq):
+    """Cancel a running sub task (or all running sub tasks) and its upstream requests"""
+    logging.info(f"M cancel req: {req.model_dump_json()}")
+    ret = await cancel_sub_task_svc(req)
+    return RestResponse(data=ret)
+
+
+@router.post("/api/aigc_task/queue",
+             summary="aigc_task/queue",
+             response_model=RestResponse[list[QueuePosition]]
+             )
+async def aigc_task_queue(req: AIGCTaskID):
+    """Queue positions of the task's sub tasks that are waiting for a generation slot"""
+    ret = await queue_positions_svc(req)
+    return RestResponse(data=ret)
+
+
 @router.post("/api/aigc_task/gen_cover_img",
              summary="aigc_task/gen_cover_img",
              response_model=RestResponse[AIGCTask]
@@ -149,12 +214,24 @@ async def clone_twitter_audio(req: CloneXAudioReq, background_tasks: BackgroundT
     return RestResponse(data=True)
 
 
+@router.post("/innerapi/fal/webhook",
+             summary="innerapi/fal/webhook",
+             response_model=RestResponse[bool]
+             )
+async def fal_webhook(req: dict):
+    logging.info(f"M fal_webhook request_id: {req.get('request_id')} status: {req.get('status')}")
+    await FAL_JOBS.handle_webhook(req)
+    return RestResponse(data=True)
+
+
 @router.post("/api/aigc_task/get",
              summary="aigc_task/get",
              response_model=RestResponse[AIGCTask]
              )
 async def get_aigc_task(req: AIGCTaskID):
     task = await aigc_task_get_by_id(req.task_id)
+    if task:
+        await fill_eta(task)
     return RestResponse(data=task)
 
 
@@ -296,10 +373,12 @@ async def adopt_digital_human(req: ID, user: Optional[dict] = Depends(get_option
              )
 async def get_x_user(req: Username1):
     username = req.username.replace("https://x.com/", "")
-    user = await twitter_fetch_user_svc(username)
+    user, tweets = await asyncio.gather(
+        twitter_fetch_user_svc(username),
+        x_get_user_last_tweets_by_username(username),
+    )
     if not user:
         raise_error(f"User {username} not found")
-    tweets = await x_get_user_last_tweets_by_username(username)
     return RestResponse(data=TwitterDTO(
         name=user.name,
         screen_name=user.username,
@@ -2,6 +2,7 @@ import logging
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 
 from common.error_messages import get_error_message
 from common.exceptions import CustomAgentException, ErrorCode
@@ -10,8 +11,11 @@ from entities.bo import TwitterTTSRequestBO
 from entities.dto import GenerateLyricsRequest, GenerateLyricsResponse, GenerateMusicRequest, GenerateMusicResponse
 from entities.dto import PredefinedVoice, PredefinedVoiceListResponse
 from entities.dto import TwitterTTSRequest, TwitterTTSResponse, TwitterTTSTask, TwitterTTSTaskListResponse
+from entities.dto import TTSStreamRequest
+from infra.file import audio_content_types
 from middleware.auth_middleware import get_current_user
 from services import twitter_tts_service
+from services.twitter_tts_processor import twitter_tts_processor
 from services.resource_usage_limit import check_limit_and_record
 
 router = APIRouter(include_in_schema=False)
@@ -69,6 +73,7 @@ async def create_twitter_tts_task(
 
         # Create task
         task = await twitter_tts_service.create_twitter_tts_task(request_bo)
+        twitter_tts_processor.wake(task.task_type)
 
         response = TwitterTTSResponse(
             task_id=task.task_id,
@@ -95,6 +100,47 @@ async def create_twitter_tts_task(
         )
 
 
+@router.post("/api/twitter-tts/stream", summary="Stream text to speech")
+async def stream_text_to_speech(
+        request: TTSStreamRequest,
+        user: dict = Depends(get_current_user)
+):
+    """
+    Convert text to speech and stream the audio while it is generated
+
+    - **text**: Text to convert
+    - **voice_id**: Optional voice ID
+    - **audio_url**: Optional reference audio URL, enables voice cloning
+    - **response_format**: Audio format (mp3, opus, aac, flac)
+
+    The audio is stored while streaming; its URL is returned in the X-Audio-Url header
+    and is available once the stream has completed.
+    """
+    try:
+        tenant_id = user.get("tenant_id")
+        if not tenant_id:
+            return RestResponse(
+                code=ErrorCode.INVALID_PARAMETERS,
+                msg="User does not have a valid tenant ID"
+            )
+
+        await check_limit_and_record(client=f"tenant-id-{tenant_id}", resource=f"tts")
+
+        audio_url, chunks = await twitter_tts_service.text_to_speech_stream_upload_svc(request)
+        media_type = audio_content_types.get(request.response_format.lower(), "application/octet-stream")
+        return StreamingResponse(chunks, media_type=media_type, headers={"X-Audio-Url": audio_url})
+
+    except CustomAgentException as e:
+        logger.error(f"Error in TTS stream: {str(e)}", exc_info=True)
+        return RestResponse(code=e.error_code, msg=e.message)
+    except Exception as e:
+        logger.error(f"Unexpected error in TTS stream: {str(e)}", exc_info=True)
+        return RestResponse(
+            code=ErrorCode.INTERNAL_ERROR,
+            msg=get_error_message(ErrorCode.INTERNAL_ERROR)
+        )
+
+
 @router.get("/api/twitter-tts/task/{task_id}", response_model=RestResponse[TwitterTTSTask],
             summary="Get Twitter TTS task by ID")
 async def get_twitter_tts_task(
@@ -227,6 +273,7 @@ async def retry_twitter_tts_task(
         success = await twitter_tts_service.retry_failed_twitter_tts_task(task_id)
 
         if success:
+            twitter_tts_processor.wake(task.task_type)
             return RestResponse(
                 data={"message": "Task retry initiated successfully"},
                 msg="Task retry initiated successfully"
@@ -1,25 +1,35 @@
 import asyncio
 import datetime
-import json
 import logging
-import re
+import time
 import uuid
 
 from fastapi import BackgroundTasks
 
 from agent.prompt.aigc import FIRST_FRAME_IMG_PROMPT, V_DANCE_IMAGE_PROMPT, V_SING_IMAGE_PROMPT, V_FIGURE_IMAGE_PROMPT, \
     V_DANCE_VIDEO_PROMPT, V_TURN_PROMPT, V_SPEECH_PROMPT, V_THINK_PROMPT, V_SING_VIDEO_PROMPT, V_DEFAULT_PROMPT
-from agent.prompt.tts import SLOGAN_PROMPT
-from clients.gen_fal_client import veo3_gen_video_svc_v2
-from clients.gen_img import gen_gpt_4o_img_svc, gen_text
-from clients.openai_gen_img import gemini_gen_img_svc
+from agent.prompt.tts import SLOGAN_PROMPT, SLOGAN_SCHEMA
+from clients.circuit_breaker import track_open_circuits, CircuitOpenError
+from clients.fal_jobs import FAL_JOBS
+from clients.gen_fal_client import veo3_submit_video_v2, parse_fal_video_url, gen_img_svc_v3
+from clients.gen_img import gen_gpt_4o_img_svc, gen_json
+from clients.hedge import hedged
+from clients.memo_store import GEN_MEMO
+from clients.openai_gen_img import gemini_gen_img_svc, gpt_image_1_gen_imgs_svc
+from clients.voice_profile import VOICE_PROFILES
+from common.cancellation import SUB_TASK_RUNS
 from common.error import raise_error
+from common.scheduler import SCHEDULER, Priority, SchedulerQueueFull
+from common.timing import record_timings, add_span, span
 from config import SETTINGS
 from entities.dto import GenCoverImgReq, AIGCTask, Cover, TaskStatus, GenVideoReq, Video, DigitalHuman, \
     DigitalVideo, GenCoverResp, AIGCPublishReq, Lyrics, GenerateLyricsResponse, \
     GenerateLyricsResp, GenerateLyricsReq, GenMusicReq, Music, GenerateMusicResponse, GenerateMusicResp, BasicInfoReq, \
-    GenXAudioReq, Audio, TwitterTTSTask, TaskType, TaskAndHuman, VideoKeyType, CloneXAudioReq, Fee
-from infra.db import aigc_task_get_by_id, aigc_task_save, digital_human_save, digital_human_get_by_digital_human
+    GenXAudioReq, Audio, TwitterTTSTask, TaskType, TaskAndHuman, VideoKeyType, CloneXAudioReq, Fee, FalJob, \
+    FalJobStatus, GenVideoResp, SubTask, CancelSubTaskReq, AIGCTaskID, QueuePosition, DigitalHumanDraft
+from infra.db import aigc_task_get_by_id, digital_human_save, digital_human_get_by_digital_human, \
+    aigc_task_update_sub_task, aigc_task_set_sub_task, aigc_task_set_fields
+from infra.file import download_and_upload_url, s3_upload_openai_img
 from services import twitter_tts_service
 from services.resource_usage_limit import check_limit_and_record
 from services.twitter_service import twitter_fetch_user_svc
@@ -41,12 +51,149 @@ style_map = {
 }
 
 
+async def _cancel_sub_task_run(sub_task: SubTask | None) -> bool:
+    """
+    Stop the in-flight run of a sub task that is superseded or cancelled: its coroutine, if
+    it runs in this process, and its upstream fal request.
+
+    Returns:
+        True if something was cancelled
+    """
+    if not sub_task or sub_task.status != TaskStatus.IN_PROGRESS:
+        return False
+    cancelled = SUB_TASK_RUNS.cancel(sub_task.sub_task_id)
+    if sub_task.provider_request_id:
+        await FAL_JOBS.cancel(sub_task.provider_application, sub_task.provider_request_id)
+        cancelled = True
+    if cancelled:
+        logging.info(f"M cancelled run of sub task {sub_task.sub_task_id}")
+    return cancelled
+
+
+async def cancel_sub_task_svc(req: CancelSubTaskReq) -> AIGCTask:
+    """Cancel one running sub task of a task, or all of them"""
+    task = await aigc_task_get_by_id(req.task_id)
+    if not task:
+        raise_error("task not found")
+
+    sub_tasks = [(path, getattr(task, path)) for path in ("cover", "lyrics", "music", "audio")]
+    sub_tasks += [("videos", v) for v in task.videos]
+    sub_tasks = [(path, s) for path, s in sub_tasks
+                 if s and s.status == TaskStatus.IN_PROGRESS and (not req.sub_task_id or s.sub_task_id == req.sub_task_id)]
+    if req.sub_task_id and not sub_tasks:
+        raise_error("sub task not running")
+
+    for path, sub_task in sub_tasks:
+        await _cancel_sub_task_run(sub_task)
+        await aigc_task_update_sub_task(task.task_id, path, sub_task.sub_task_id, {
+            "status": TaskStatus.CANCELLED,
+            "done_at": datetime.datetime.now(),
+        })
+    return await aigc_task_get_by_id(task.task_id)
+
+
+async def queue_positions_svc(req: AIGCTaskID) -> list[QueuePosition]:
+    """Queue positions of the task's waiting sub tasks, as seen by this process's scheduler"""
+    task = await aigc_task_get_by_id(req.task_id)
+    if not task:
+        raise_error("task not found")
+
+    sub_tasks = [task.cover, task.lyrics, task.music, task.audio, *task.videos]
+    ret = []
+    for sub_task in sub_tasks:
+        if not sub_task or sub_task.status != TaskStatus.IN_PROGRESS:
+            continue
+        position = SCHEDULER.position(sub_task.sub_task_id)
+        if position:
+            ret.append(QueuePosition(sub_task_id=sub_task.sub_task_id, **position))
+    return ret
+
+
+def _check_queue(pool: str, task: AIGCTask):
+    if SCHEDULER.queue_full(pool, task.tenant_id):
+        raise_error("too many generation jobs queued, please try again later")
+
+
+async def _run_scheduled(pool: str, priority: Priority, task: AIGCTask, path: str, sub_task_id: str, fn, *args):
+    """
+    Run a sub task once the tenant's fair share of the pool allows it. Timing spans of the
+    run (queue wait, provider calls, uploads) are appended to the sub task afterwards.
+    """
+    heartbeat = asyncio.create_task(_heartbeat(task.task_id, path, sub_task_id))
+    try:
+        with record_timings() as spans:
+            queued_at = datetime.datetime.now()
+            start = time.monotonic()
+            try:
+                async with SCHEDULER.slot(pool, task.tenant_id, priority, sub_task_id):
+                    add_span("queued", pool, queued_at, time.monotonic() - start)
+                    with span("run", pool):
+                        await fn(*args)
+            except SchedulerQueueFull as e:
+                logging.warning(f"M sub task {sub_task_id} rejected by scheduler: {e}")
+                await aigc_task_update_sub_task(task.task_id, path, sub_task_id, {
+                    "status": TaskStatus.RETRYABLE,
+                    "done_at": datetime.datetime.now(),
+                })
+    finally:
+        heartbeat.cancel()
+    if spans:
+        await aigc_task_update_sub_task(task.task_id, path, sub_task_id, {}, push={"timings": {"$each": spans}})
+
+
+async def _heartbeat(task_id: str, path: str, sub_task_id: str):
+    """Renew heartbeat_at of a sub task in progress, so reapers in any process leave it alone"""
+    while True:
+        try:
+            if not await aigc_task_update_sub_task(task_id, path, sub_task_id,
+                                                   {"heartbeat_at": datetime.datetime.now()},
+                                                   expected_status=TaskStatus.IN_PROGRESS):
+                return
+        except Exception as e:
+            logging.warning(f"M sub task {sub_task_id} heartbeat failed: {e}")
+        await asyncio.sleep(SETTINGS.REAPER_HEARTBEAT_INTERVAL)
+
+
+def _failed_status(open_circuits: list[str]) -> TaskStatus:
+    """RETRYABLE when the failure coincided with an open upstream circuit"""
+    if open_circuits:
+        logging.info(f"M upstream circuits open: {sorted(set(open_circuits))}, marking retryable")
+        return TaskStatus.RETRYABLE
+    return TaskStatus.FAILED
+
+
+def _cover_draft(output: GenCoverResp) -> dict:
+    """Digital human draft fields of a finished cover"""
+    return {
+        "cover_img": output.cover_img_url,
+        "sing_image": output.sing_first_frame_img_url,
+        "figure_image": output.figure_first_frame_img_url,
+        "first_frame_image": output.first_frame_img_url,
+        "dance_image": output.dance_first_frame_img_url,
+    }
+
+
+def _music_draft(output: GenerateMusicResp) -> dict:
+    """Digital human draft fields of finished music"""
+    return {
+        "songs.music_audio_url": output.audio_url,
+        "songs.music_style": output.style,
+        "songs.music_model": output.model,
+        "songs.music_voice": output.voice,
+        "songs.music_response_format": output.response_format,
+        "songs.music_speed": output.speed,
+    }
+
+
 async def gen_lyrics_svc(req: GenerateLyricsReq, background: BackgroundTasks) -> AIGCTask:
     task = await aigc_task_get_by_id(req.task_id)
 
+    _check_queue("llm", task)
     await check_limit_and_record(client=f"task-{task.task_id}", resource="gen-lyrics")
 
+    regenerate = task.lyrics is not None
     if task.lyrics:
+        await _cancel_sub_task_run(task.lyrics)
         task.lyrics.regenerate()
         task.lyrics.input = req
         task.lyrics.output = None
@@ -58,41 +205,47 @@ async def gen_lyrics_svc(req: GenerateLyricsReq, background: BackgroundTasks) ->
             created_at=datetime.datetime.now()
         )
 
-    await aigc_task_save(task)
+    await aigc_task_set_sub_task(task.task_id, "lyrics", task.lyrics)
+    sub_task_id = task.lyrics.sub_task_id
 
     async def _task_gen_lyrics():
-        try:
-            result = await twitter_tts_service.generate_lyrics_from_twitter_url(
-                twitter_url=task.cover.input.x_link,
-                tenant_id=task.tenant_id,
-                lang=task.lang,
-            )
-            response = GenerateLyricsResponse(**result)
-        except Exception as e:
-            logging.error(f"M failed to generate lyrics {e}", exc_info=True)
-            response = None
+        with track_open_circuits() as open_circuits:
+            try:
+                result = await twitter_tts_service.generate_lyrics_from_twitter_url(
+                    twitter_url=task.cover.input.x_link,
+                    tenant_id=task.tenant_id,
+                    lang=task.lang,
+                    bypass_cache=regenerate,
+                )
+                response = GenerateLyricsResponse(**result)
+            except Exception as e:
+                logging.error(f"M failed to generate lyrics {e}", exc_info=True)
+                response = None
 
-        cur_task = await aigc_task_get_by_id(task.task_id)
         if response:
-            cur_task.lyrics.output = GenerateLyricsResp(
+            output = GenerateLyricsResp(
                 lyrics=response.lyrics,
                 title=response.title,
             )
-            cur_task.lyrics.status = TaskStatus.DONE
-            cur_task.lyrics.done_at = datetime.datetime.now()
-
             fee = Fee.total_fee([
                 Fee.llm_fee(),
             ])
-            cur_task.lyrics.fee.append(fee)
-
-            await aigc_task_save(cur_task)
+            await aigc_task_update_sub_task(task.task_id, "lyrics", sub_task_id, {
+                "output": output.model_dump(),
+                "status": TaskStatus.DONE,
+                "done_at": datetime.datetime.now(),
+            }, push={"fee": fee.model_dump()}, draft={
+                "songs.lyrics": output.lyrics,
+                "songs.lyrics_title": output.title,
+            })
             return
 
-        cur_task.lyrics.status = TaskStatus.FAILED
-        await aigc_task_save(cur_task)
+        await aigc_task_update_sub_task(task.task_id, "lyrics", sub_task_id, {
+            "status": _failed_status(open_circuits),
+        })
 
-    background.add_task(_task_gen_lyrics)
+    background.add_task(SUB_TASK_RUNS.run, sub_task_id, _run_scheduled, "llm", Priority.INTERACTIVE, task, "lyrics",
+                        sub_task_id, _task_gen_lyrics)
 
     return task
 
@@ -100,9 +253,11 @@ async def gen_lyrics_svc(req: GenerateLyricsReq, background: BackgroundTasks) ->
 async def gen_music_svc(req: GenMusicReq, background: BackgroundTasks) -> AIGCTask:
     task = await aigc_task_get_by_id(req.task_id)
 
+    _check_queue("music", task)
     await check_limit_and_record(client=f"task-{task.task_id}", resource="gen_music")
 
     if task.music:
+        await _cancel_sub_task_run(task.music)
         task.music.regenerate()
         task.music.input = req
         task.music.output = None
@@ -114,58 +269,62 @@ async def gen_music_svc(req: GenMusicReq, background: BackgroundTasks) -> AIGCTa
             created_at=datetime.datetime.now()
         )
 
-    await aigc_task_save(task)
+    await aigc_task_set_sub_task(task.task_id, "music", task.music)
+    sub_task_id = task.music.sub_task_id
 
     async def _task_gen_music():
         lyrics = req.lyrics
         if len(lyrics) > 550:
             lyrics = lyrics[:550]
 
-        result = None
-        try:
-            result = await twitter_tts_service.generate_music_from_lyrics(
-                lyrics=lyrics,
-                style=req.style,
-                tenant_id=task.tenant_id,
-                voice=req.voice,
-                model=req.model,
-                response_format=req.response_format,
-                speed=req.speed,
-                reference_audio_url=req.reference_audio_url
-            )
+        with track_open_circuits() as open_circuits:
+            result = None
+            try:
+                result = await twitter_tts_service.generate_music_from_lyrics(
+                    lyrics=lyrics,
+                    style=req.style,
+                    tenant_id=task.tenant_id,
+                    voice=req.voice,
+                    model=req.model,
+                    response_format=req.response_format,
+                    speed=req.speed,
+                    reference_audio_url=req.reference_audio_url
+                )
 
-            response = GenerateMusicResponse(**result)
-        except Exception as e:
-            logging.exception(f"failed to generate music {e}")
-            response = None
+                response = GenerateMusicResponse(**result)
+            except Exception as e:
+                logging.exception(f"failed to generate music {e}")
+                response = None
 
-        cur_task = await aigc_task_get_by_id(task.task_id)
         if response and result:
-            cur_task.music.output = GenerateMusicResp(**result)
-            cur_task.music.status = TaskStatus.DONE
-            cur_task.music.done_at = datetime.datetime.now()
-
             fee = Fee.total_fee([
                 Fee.music_fee(),
             ])
-            cur_task.music.fee.append(fee)
-
-            await aigc_task_save(cur_task)
+            output = GenerateMusicResp(**result)
+            await aigc_task_update_sub_task(task.task_id, "music", sub_task_id, {
+                "output": output.model_dump(),
+                "status": TaskStatus.DONE,
+                "done_at": datetime.datetime.now(),
+            }, push={"fee": fee.model_dump()}, draft=_music_draft(output))
             return
 
-        cur_task.music.status = TaskStatus.FAILED
-        await aigc_task_save(cur_task)
+        await aigc_task_update_sub_task(task.task_id, "music", sub_task_id, {
+            "status": _failed_status(open_circuits),
+        })
 
-    background.add_task(_task_gen_music)
+    background.add_task(SUB_TASK_RUNS.run, sub_task_id, _run_scheduled, "music", Priority.BULK, task, "music",
+                        sub_task_id, _task_gen_music)
 
     return task
 
 
 async def gen_twitter_audio_svc(req: GenXAudioReq, background: BackgroundTasks) -> AIGCTask:
     task = await aigc_task_get_by_id(req.task_id)
+    _check_queue("tts", task)
 
     if task.audio:
         sub_task = task.audio
+        await _cancel_sub_task_run(sub_task)
         sub_task.regenerate()
         sub_task.input = req
         sub_task.output = []
@@ -177,7 +336,7 @@ async def gen_twitter_audio_svc(req: GenXAudioReq, background: BackgroundTasks)
             created_at=datetime.datetime.now()
         )
 
-    await aigc_task_save(task)
+    await aigc_task_set_sub_task(task.task_id, "audio", task.audio)
 
     async def _bg_x_audio_task():
         voice_id = "Abbess"
@@ -186,60 +345,60 @@ async def gen_twitter_audio_svc(req: GenXAudioReq, background: BackgroundTasks)
         tasks = []
         voice_clone_url = task.slogan_voice_url
         fee_items = []
-        try:
-
-            for twitter_url in req.x_tts_urls:
-                tts_task = TwitterTTSTask(
-                    task_id=task.audio.sub_task_id or str(uuid.uuid4()),
-                    tenant_id=task.tenant_id,
-                    twitter_url=twitter_url,
-                    voice_id=voice_id,
-                    username=task.twitter_username,
-                    audio_url_input=task.voice_clone_url,
-                    task_type=TaskType.VOICE_CLONE,
-                )
-                tasks.append(voice_clone_svc(tts_task, task.lang))
-                fee_items.append(Fee.clone_fee())
-
-            if not voice_clone_url:
-                tts_task = TwitterTTSTask(
-                    task_id=task.audio.sub_task_id or str(uuid.uuid4()),
-                    tenant_id=task.tenant_id,
-                    read_content=task.slogan,
-                    voice_id=voice_id,
-                    audio_url_input=task.voice_clone_url,
-                    task_type=TaskType.VOICE_CLONE,
-                )
-                slogan = await voice_clone_svc(tts_task, task.lang)
-                voice_clone_url = slogan.audio_url
-
+        with track_open_circuits() as open_circuits:
+            try:
+
+                for twitter_url in req.x_tts_urls:
+                    tts_task = TwitterTTSTask(
+                        task_id=task.audio.sub_task_id or str(uuid.uuid4()),
+                        tenant_id=task.tenant_id,
+                        twitter_url=twitter_url,
+                        voice_id=voice_id,
+                        username=task.twitter_username,
+                        audio_url_input=task.voice_clone_url,
+                        task_type=TaskType.VOICE_CLONE,
+                    )
+                    tasks.append(voice_clone_svc(tts_task, task.lang))
+                    fee_items.append(Fee.clone_fee())
+
+                if not voice_clone_url:
+                    tts_task = TwitterTTSTask(
+                        task_id=task.audio.sub_task_id or str(uuid.uuid4()),
+                        tenant_id=task.tenant_id,
+                        read_content=task.slogan,
+                        voice_id=voice_id,
+                        audio_url_input=task.voice_clone_url,
+                        task_type=TaskType.VOICE_CLONE,
+                    )
+                    slogan = await voice_clone_svc(tts_task, task.lang)
+                    voice_clone_url = slogan.audio_url
+
+                # tweet lookups from these calls are coalesced into one xAPI request
                 results = await asyncio.gather(*tasks, return_exceptions=True)
                 for r in results:
                     if isinstance(r, Exception):
                         logging.error(f"voice_clone_svc error: {r}")
                     elif r:
                         result.append(r)
-        except Exception as e:
-            logging.exception("Error in voice clone tasks")
+            except Exception as e:
+                logging.exception("Error in voice clone tasks")
 
-        cur_task = await aigc_task_get_by_id(task.task_id)
-        sub_task = cur_task.audio
         if result and voice_clone_url and len(result) == len(tasks):
-            sub_task.output = result
-            sub_task.status = TaskStatus.DONE
-            sub_task.done_at = datetime.datetime.now()
-            cur_task.slogan_voice_url = voice_clone_url
-
             fee = Fee.total_fee(fee_items)
-            sub_task.fee.append(fee)
-
-            await aigc_task_save(cur_task)
+            await aigc_task_update_sub_task(task.task_id, "audio", task.audio.sub_task_id, {
+                "output": [r.model_dump() for r in result],
+                "status": TaskStatus.DONE,
+                "done_at": datetime.datetime.now(),
+            }, push={"fee": fee.model_dump()}, task_fields={"slogan_voice_url": voice_clone_url},
+                draft={"audios": [r.model_dump() for r in result]})
             return
 
-        sub_task.status = TaskStatus.FAILED
-        await aigc_task_save(cur_task)
+        await aigc_task_update_sub_task(task.task_id, "audio", task.audio.sub_task_id, {
+            "status": _failed_status(open_circuits),
+        })
 
-    background.add_task(_bg_x_audio_task)
+    background.add_task(SUB_TASK_RUNS.run, task.audio.sub_task_id, _run_scheduled, "tts", Priority.INTERACTIVE, task,
+                        "audio", task.audio.sub_task_id, _bg_x_audio_task)
 
     return task
 
@@ -269,9 +428,10 @@ async def clone_twitter_audio_svc(req: CloneXAudioReq, background: BackgroundTas
                 await digital_human_save(digital_human)
 
                 cur_task = await aigc_task_get_by_id(digital_human.from_task_id)
-                if cur_task:
-                    cur_task.audio.output.append(result)
-                    await aigc_task_save(cur_task)
+                if cur_task and cur_task.audio:
+                    await aigc_task_update_sub_task(cur_task.task_id, "audio", cur_task.audio.sub_task_id, {},
+                                                    push={"output": result.model_dump()},
+                                                    draft={"audios": [result.model_dump()]})
         except Exception as e:
             logging.exception("Error in clone_twitter_audio_svc tasks")
 
@@ -286,11 +446,95 @@ async def save_basic_info(req: BasicInfoReq, background: BackgroundTasks) -> AIG
     task.voice_clone_url = req.voice_clone_url
     task.slogan = req.slogan
     task.updated_at = datetime.datetime.now()
-    await aigc_task_save(task)
+    await aigc_task_set_fields(task.task_id, {
+        "gender": task.gender,
+        "lang": task.lang,
+        "voice_clone_url": task.voice_clone_url,
+        "slogan": task.slogan,
+    })
+
+    if task.voice_clone_url:
+        # clone the voice ahead of the first audio
+        background.add_task(VOICE_PROFILES.voice_id, task.voice_clone_url)
 
     return task
 
 
+async def _gen_frame_img_hedged(img_urls: list[str], prompt: str, scenario: str) -> str | None:
+    """gpt-4o-image, hedged with gpt-image-1. Returns the uploaded image url"""
+
+    async def _backup():
+        ret = await gpt_image_1_gen_imgs_svc(img_urls=img_urls, prompt=prompt, scenario=scenario)
+        if ret and ret.data:
+            if ret.data[0].b64_json:
+                return await s3_upload_openai_img(ret.data[0])
+            return await download_and_upload_url(ret.data[0].url)
+        return None
+
+    return await hedged(scenario,
+                        lambda: gen_gpt_4o_img_svc(img_urls=img_urls, prompt=prompt, scenario=scenario),
+                        _backup)
+
+
+async def _gen_figure_img_hedged(img_url: str, prompt: str, scenario: str) -> str | None:
+    """gemini-2.5-flash-image, hedged with the fal image to image app. Returns the image url"""
+
+    async def _primary():
+        ret = await gemini_gen_img_svc(img_url=img_url, prompt=prompt, scenario=scenario)
+        if ret and ret.data:
+            return ret.data[0].url
+        return None
+
+    async def _backup():
+        url = await gen_img_svc_v3(img_url, prompt)
+        if url:
+            return await download_and_upload_url(url)
+        return None
+
+    return await hedged(scenario, _primary, _backup)
+
+
+# cover image variant -> output field, each variant is generated and persisted on its own
+_COVER_VARIANTS = {
+    "first_frame": "first_frame_img_url",
+    "dance": "dance_first_frame_img_url",
+    "sing": "sing_first_frame_img_url",
+    "figure": "figure_first_frame_img_url",
+}
+
+
+def _cover_memo_version() -> str:
+    """Models of the cover images, hedged pairs included"""
+    return f"gpt-4o-image|gpt-image-1,gemini-2.5-flash-image|{SETTINGS.IMAGE_TO_IMAGE_V3}"
+
+
+def _cover_memo_inputs(base_img_digest: str, style: str) -> dict:
+    return {
+        "base_img": base_img_digest,
+        "templates": [SETTINGS.GEN_T_URL_DANCE, SETTINGS.GEN_T_URL_SING],
+        "prompts": [FIRST_FRAME_IMG_PROMPT.format(style=style), V_DANCE_IMAGE_PROMPT, V_SING_IMAGE_PROMPT,
+                    V_FIGURE_IMAGE_PROMPT],
+    }
+
+
+async def _gen_cover_variant(variant: str, base_img: str, style: str) -> str | None:
+    if variant == "first_frame":
+        return await _gen_frame_img_hedged(img_urls=[base_img],
+                                           prompt=FIRST_FRAME_IMG_PROMPT.format(style=style),
+                                           scenario="first_frame")
+    if variant == "dance":
+        return await _gen_frame_img_hedged(img_urls=[SETTINGS.GEN_T_URL_DANCE, base_img],
+                                           prompt=V_DANCE_IMAGE_PROMPT,
+                                           scenario="dance")
+    if variant == "sing":
+        return await _gen_frame_img_hedged(img_urls=[SETTINGS.GEN_T_URL_SING, base_img],
+                                           prompt=V_SING_IMAGE_PROMPT,
+                                           scenario="sing")
+    return await _gen_figure_img_hedged(img_url=base_img,
+                                        prompt=V_FIGURE_IMAGE_PROMPT,
+                                        scenario="figure")
+
+
 async def gen_cover_img_svc(req: GenCoverImgReq, background: BackgroundTasks) -> AIGCTask:
     style = style_map.get(req.style_id, "")
     if not style:
@@ -314,137 +558,166 @@ async def gen_cover_img_svc(req: GenCoverImgReq, background: BackgroundTasks) ->
     task.twitter_username = username
     task.twitter_avatar_url = twitter_bo.avatar_url
 
+    _check_queue("image", task)
     await check_limit_and_record(client=f"task-{task.task_id}", resource="gen-img")
 
+    base_img = req.img_url or twitter_bo.avatar_url_400x400
+    # a retry of a failed cover with the same inputs keeps its finished variants
+    kept: dict[str, str] = {}
+    prev = task.cover
+    if prev and prev.output and prev.status in (TaskStatus.FAILED, TaskStatus.RETRYABLE) and not req.fresh \
+            and (prev.input.x_link, prev.input.img_url, prev.input.style_id) == (req.x_link, req.img_url, req.style_id):
+        kept = {v: getattr(prev.output, f) for v, f in _COVER_VARIANTS.items() if getattr(prev.output, f)}
+    # regenerating a finished cover asks for new images, same as an explicit fresh
+    fresh = req.fresh or (prev is not None and prev.status == TaskStatus.DONE)
+    memo_inputs = None
+    memo_key = ""
+    memoized = None
+    if GEN_MEMO.enabled("cover") and len(kept) < len(_COVER_VARIANTS):
+        memo_inputs = _cover_memo_inputs(await GEN_MEMO.content_digest(base_img), style)
+        memo_key = GEN_MEMO.key("cover", _cover_memo_version(), memo_inputs)
+        memoized = await GEN_MEMO.get("cover", memo_key, cost=4 * Fee.img_fee().amount, fresh=fresh)
+        if memoized:
+            kept = {v: memoized[f] for v, f in _COVER_VARIANTS.items()}
+
+    # the output fills in as variants finish
+    output = GenCoverResp(cover_img_url=kept.get("first_frame", ""),
+                          **{f: kept[v] for v, f in _COVER_VARIANTS.items() if v in kept})
     if task.cover:
+        await _cancel_sub_task_run(task.cover)
         task.cover.regenerate()
         task.cover.input = req
-        task.cover.output = None
+        task.cover.output = output
     else:
         task.cover = Cover(
             sub_task_id=str(uuid.uuid4()),
             input=req,
-            output=None,
+            output=output,
             created_at=datetime.datetime.now()
         )
+    task.cover.variants = {v: TaskStatus.DONE if v in kept else TaskStatus.IN_PROGRESS for v in _COVER_VARIANTS}
 
-    await aigc_task_save(task)
+    await aigc_task_set_sub_task(task.task_id, "cover", task.cover)
+    await aigc_task_set_fields(task.task_id, {
+        "twitter_link": task.twitter_link,
+        "twitter_username": task.twitter_username,
+        "twitter_avatar_url": task.twitter_avatar_url,
+    })
+    sub_task_id = task.cover.sub_task_id
 
     async def _task_gen_cover_img_svc():
         logging.info(f"M begin")
+        task_fields = {}
+
+        async def _gen_slogan():
+            # independent of the images, generated alongside them
+            if task.slogan:
+                return
+            logging.info(f"gen slogan {username}")
+            data = await gen_json(SLOGAN_PROMPT.format(account=username), SLOGAN_SCHEMA, "slogan")
+            if data:
+                task_fields["slogan"] = data["slogan"]
+                task_fields["slogan_description"] = data["description"]
+            else:
+                logging.error(f"M slogan gen failed {username}")
+
+        async def _gen_variant(variant: str) -> str | None:
+            try:
+                url = await _gen_cover_variant(variant, base_img, style)
+            except Exception as e:
+                logging.error(f"M cover variant {variant} error: {e}", exc_info=True)
+                url = None
+            fields = {f"variants.{variant}": TaskStatus.DONE if url else TaskStatus.FAILED}
+            if url:
+                fields[f"output.{_COVER_VARIANTS[variant]}"] = url
+                if variant == "first_frame":
+                    fields["output.cover_img_url"] = url
+            await aigc_task_update_sub_task(task.task_id, "cover", sub_task_id, fields)
+            return url
+
+        missing = [v for v in _COVER_VARIANTS if v not in kept]
+        with track_open_circuits() as open_circuits:
+            *results, _ = await asyncio.gather(*(_gen_variant(v) for v in missing), _gen_slogan())
+
+        urls = {**kept, **{v: url for v, url in zip(missing, results) if url}}
+        generated = sum(1 for url in results if url)
+        fee = Fee.total_fee([*(Fee.img_fee() for _ in range(generated)), Fee.llm_fee()])
+
+        if len(urls) == len(_COVER_VARIANTS):
+            output = GenCoverResp(cover_img_url=urls["first_frame"],
+                                  **{f: urls[v] for v, f in _COVER_VARIANTS.items()})
+            if memo_key and not memoized:
+                await GEN_MEMO.put("cover", memo_key, {f: urls[v] for v, f in _COVER_VARIANTS.items()}, memo_inputs)
+
+            logging.info(f"M cur_cover_img_svc: {output.model_dump_json()}")
+            await aigc_task_update_sub_task(task.task_id, "cover", sub_task_id, {
+                "output": output.model_dump(),
+                "status": TaskStatus.DONE,
+                "done_at": datetime.datetime.now(),
+            }, push={"fee": fee.model_dump()}, task_fields=task_fields, draft=_cover_draft(output))
+            return
 
-        if not task.slogan:
-            slogan_retry = 10
-            text = ""
-            while slogan_retry > 0:
-                try:
-                    logging.info(f"gen slogan {username}")
-                    text = await gen_text(SLOGAN_PROMPT.format(account=username))
-                    pattern = re.compile(r'\{.*?\}', re.DOTALL)
-                    match = pattern.search(text)
-                    if match:
-                        json_str = match.group(0)
-                        data = json.loads(json_str)
-                        if "slogan" in data:
-                            task.slogan = data["slogan"]
-                        if "description" in data:
-                            task.slogan_description = data["description"]
-                        break
-                except Exception as e:
-                    slogan_retry -= 1
-                    logging.error(f"M slogan gen text {text} error: {e} ", exc_info=True)
-
-        base_img = req.img_url
-        if not base_img:
-            base_img = twitter_bo.avatar_url_400x400
-        first_frame_imgs_task = gen_gpt_4o_img_svc(img_urls=[base_img],
-                                                   prompt=FIRST_FRAME_IMG_PROMPT.format(style=style),
-                                                   scenario="first_frame")
-        dance_imgs_task = gen_gpt_4o_img_svc(img_urls=[SETTINGS.GEN_T_URL_DANCE, base_img],
-                                             prompt=V_DANCE_IMAGE_PROMPT,
-                                             scenario="dance")
-        sing_imgs_task = gen_gpt_4o_img_svc(img_urls=[SETTINGS.GEN_T_URL_SING, base_img],
-                                            prompt=V_SING_IMAGE_PROMPT,
-                                            scenario="sing")
-        figure_imgs_task = gemini_gen_img_svc(img_url=base_img,
-                                              prompt=V_FIGURE_IMAGE_PROMPT,
-                                              scenario="figure")
-
-        first_frame_imgs, dance_imgs, sing_imgs, figure_imgs = await asyncio.gather(
-            first_frame_imgs_task,
-            dance_imgs_task,
-            sing_imgs_task,
-            figure_imgs_task
-        )
+        # finished variants stay in the output, a retry only generates the missing ones
+        logging.info(f"M cover {sub_task_id} missing variants: {[v for v in _COVER_VARIANTS if v not in urls]}")
+        await aigc_task_update_sub_task(task.task_id, "cover", sub_task_id, {
+            "status": _failed_status(open_circuits),
+        }, push={"fee": fee.model_dump()} if generated else None, task_fields=task_fields)
 
-        cur_task = await aigc_task_get_by_id(task.task_id)
-
-        first_frame_url = first_frame_imgs
-        # if first_frame_imgs and first_frame_imgs.data:
-        #     first_frame_url = await s3_upload_openai_img(first_frame_imgs.data[0])
-        # if not first_frame_url:
-        #     logging.info(f"M first_frame_url upload error")
-
-        dance_url = dance_imgs
-        # if dance_imgs and dance_imgs.data:
-        #     dance_url = await s3_upload_openai_img(dance_imgs.data[0])
-        # if not dance_url:
-        #     logging.info(f"M dance_url upload error")
-
-        sing_url = sing_imgs
-        # if sing_imgs and sing_imgs.data:
-        #     sing_url = await s3_upload_openai_img(sing_imgs.data[0])
-        # if not sing_url:
-        #     logging.info(f"M sing_url upload error")
-
-        figure_url = ""
-        if figure_imgs and figure_imgs.data:
-            # figure_url = await s3_upload_openai_img(figure_imgs.data[0])
-            figure_url = figure_imgs.data[0].url
-        if not figure_url:
-            logging.info(f"M figure_url upload error")
-
-        if first_frame_url and dance_url and sing_url and figure_url:
-            cur_task.cover.output = GenCoverResp(
-                first_frame_img_url=first_frame_url,
-                cover_img_url=first_frame_url,
-                dance_first_frame_img_url=dance_url,
-                sing_first_frame_img_url=sing_url,
-                figure_first_frame_img_url=figure_url,
-            )
+    # a memoized or complete cover only waits for the slogan
+    pool = "image" if len(kept) < len(_COVER_VARIANTS) else "llm"
+    background.add_task(SUB_TASK_RUNS.run, sub_task_id, _run_scheduled, pool, Priority.INTERACTIVE, task, "cover",
+                        sub_task_id, _task_gen_cover_img_svc)
 
-            fee = Fee.total_fee([
-                Fee.img_fee(),
-                Fee.img_fee(),
-                Fee.img_fee(),
-                Fee.img_fee(),
-                Fee.llm_fee(),
-            ])
-
-            cur_task.cover.status = TaskStatus.DONE
-            cur_task.cover.done_at = datetime.datetime.now()
-            cur_task.cover.fee.append(fee)
-            logging.info(f"M cur_cover_img_svc: {cur_task.cover.output.model_dump_json()}")
-            await aigc_task_save(cur_task)
-            return
+    return task
 
-        cur_task.cover.status = TaskStatus.FAILED
-        await aigc_task_save(cur_task)
 
-    background.add_task(_task_gen_cover_img_svc)
+def _video_inputs(task: AIGCTask, key: VideoKeyType) -> tuple[str, str]:
+    """First frame image url and prompt of a video"""
+    if VideoKeyType.DANCE == key:
+        prompt = V_DANCE_VIDEO_PROMPT
+    # elif VideoKeyType.GOGO == key:
+    #     prompt = V_GOGO_PROMPT
+    elif VideoKeyType.TURN == key:
+        prompt = V_TURN_PROMPT
+    # elif VideoKeyType.ANGRY == key:
+    #     prompt = V_ANGRY_PROMPT
+    # elif VideoKeyType.SAYING == key:
+    #     prompt = V_SAYING_PROMPT
+    elif VideoKeyType.SPEECH == key:
+        prompt = V_SPEECH_PROMPT
+    elif VideoKeyType.THINK == key:
+        prompt = V_THINK_PROMPT
+    elif VideoKeyType.SING == key:
+        prompt = V_SING_VIDEO_PROMPT
+    elif VideoKeyType.FIGURE == key:
+        prompt = V_FIGURE_IMAGE_PROMPT
+    else:
+        prompt = V_DEFAULT_PROMPT
+
+    if VideoKeyType.DANCE == key:
+        first_frame_img_url = task.cover.output.dance_first_frame_img_url
+    elif VideoKeyType.SING == key:
+        first_frame_img_url = task.cover.output.sing_first_frame_img_url
+    elif VideoKeyType.FIGURE == key:
+        first_frame_img_url = task.cover.output.figure_first_frame_img_url
+    else:
+        first_frame_img_url = task.cover.output.first_frame_img_url
 
-    return task
+    return first_frame_img_url, prompt
 
 
 async def gen_video_svc(req: GenVideoReq, background: BackgroundTasks) -> AIGCTask:
     org_task = await aigc_task_get_by_id(req.task_id)
-    if not org_task.cover or not org_task.cover.output:
+    if not org_task.cover or not org_task.cover.output or not _video_inputs(org_task, req.key)[0]:
+        # each video only needs its own first frame variant
         raise_error("cover img not found")
 
+    _check_queue("video", org_task)
     await check_limit_and_record(client=f"task-{org_task.task_id}", resource=f"gen-video-{req.key}")
     regenerate: bool = False
     for v in org_task.videos:
         if v.input.key == req.key:
+            await _cancel_sub_task_run(v)
             v.regenerate()
             v.input = req
             v.output = None
@@ -461,76 +734,129 @@ async def gen_video_svc(req: GenVideoReq, background: BackgroundTasks) -> AIGCTa
             )
         )
 
-    await aigc_task_save(org_task)
+    video = next(v for v in org_task.videos if v.input.key == req.key)
+    memoized = None
+    if GEN_MEMO.enabled("video"):
+        first_frame_img_url, prompt = _video_inputs(org_task, req.key)
+        video.memo_key = GEN_MEMO.key("video", SETTINGS.IMAGE_TO_VIDEO_V2,
+                                      {"first_frame_img_url": first_frame_img_url, "prompt": prompt})
+        memoized = await GEN_MEMO.get("video", video.memo_key, cost=Fee.video_fee().amount,
+                                      fresh=req.fresh or regenerate)
+        if memoized:
+            video.output = GenVideoResp(**memoized)
+            video.status = TaskStatus.DONE
+            video.done_at = datetime.datetime.now()
+    await aigc_task_set_sub_task(org_task.task_id, "videos", video)
+    if memoized:
+        await aigc_task_set_fields(org_task.task_id, {f"draft.videos.{video.sub_task_id}": video.output.view_url})
+        return org_task
 
     async def _task_video_svc(task: AIGCTask, req: GenVideoReq):
         logging.info(f"M _task_video_svc req: {req.model_dump_json()}")
 
-        if VideoKeyType.DANCE == req.key:
-            prompt = V_DANCE_VIDEO_PROMPT
-        # elif VideoKeyType.GOGO == req.key:
-        #     prompt = V_GOGO_PROMPT
-        elif VideoKeyType.TURN == req.key:
-            prompt = V_TURN_PROMPT
-        # elif VideoKeyType.ANGRY == req.key:
-        #     prompt = V_ANGRY_PROMPT
-        # elif VideoKeyType.SAYING == req.key:
-        #     prompt = V_SAYING_PROMPT
-        elif VideoKeyType.SPEECH == req.key:
-            prompt = V_SPEECH_PROMPT
-        elif VideoKeyType.THINK == req.key:
-            prompt = V_THINK_PROMPT
-        elif VideoKeyType.SING == req.key:
-            prompt = V_SING_VIDEO_PROMPT
-        elif VideoKeyType.FIGURE == req.key:
-            prompt = V_FIGURE_IMAGE_PROMPT
-        else:
-            prompt = V_DEFAULT_PROMPT
-
-        if VideoKeyType.DANCE == req.key:
-            first_frame_img_url = task.cover.output.dance_first_frame_img_url
-        elif VideoKeyType.SING == req.key:
-            first_frame_img_url = task.cover.output.sing_first_frame_img_url
-        elif VideoKeyType.FIGURE == req.key:
-            first_frame_img_url = task.cover.output.figure_first_frame_img_url
-        else:
-            first_frame_img_url = task.cover.output.first_frame_img_url
-
-        if VideoKeyType.DANCE == req.key:
-            data = await veo3_gen_video_svc_v2(first_frame_img_url, prompt)
-        elif VideoKeyType.SING == req.key:
-            data = await veo3_gen_video_svc_v2(first_frame_img_url, prompt)
-        elif VideoKeyType.FIGURE == req.key:
-            data = await veo3_gen_video_svc_v2(first_frame_img_url, prompt)
-        else:
-            data = await veo3_gen_video_svc_v2(first_frame_img_url, prompt)
-
-        cur_task = await aigc_task_get_by_id(task.task_id)
-        if data:
-            for v in cur_task.videos:
-                if v.input.key == req.key:
-                    v.output = data
-                    v.status = TaskStatus.DONE
-                    v.done_at = datetime.datetime.now()
-                    fee = Fee.total_fee([
-                        Fee.video_fee(),
-                    ])
-                    v.fee.append(fee)
-                    break
-
-            await aigc_task_save(cur_task)
-        else:
-            for v in cur_task.videos:
-                if v.input.key == req.key:
-                    v.status = TaskStatus.FAILED
-                    v.done_at = datetime.datetime.now()
-                    break
-            await aigc_task_save(cur_task)
-
-    background.add_task(_task_video_svc, org_task, req)
+        first_frame_img_url, prompt = _video_inputs(task, req.key)
+
+        sub_task_id = next(v.sub_task_id for v in task.videos if v.input.key == req.key)
+        try:
+            request_id = await veo3_submit_video_v2(first_frame_img_url, prompt, task.task_id, sub_task_id)
+        except Exception as e:
+            logging.error(f"M _task_video_svc submit error: {e}", exc_info=True)
+            await aigc_task_update_sub_task(task.task_id, "videos", sub_task_id, {
+                "status": TaskStatus.RETRYABLE if isinstance(e, CircuitOpenError) else TaskStatus.FAILED,
+                "done_at": datetime.datetime.now(),
+            })
+            return
+
+        # completion is handled by _on_video_job_done once the poller sees the job finish
+        await aigc_task_update_sub_task(task.task_id, "videos", sub_task_id, {
+            "provider_application": SETTINGS.IMAGE_TO_VIDEO_V2,
+            "provider_request_id": request_id,
+        })
+        try:
+            # the render occupies fal capacity until it finishes, so the video slot is held until then
+            with span("render", "fal"):
+                await FAL_JOBS.wait(request_id)
+        except asyncio.TimeoutError:
+            pass
+
+    background.add_task(SUB_TASK_RUNS.run, video.sub_task_id, _run_scheduled, "video", Priority.BULK, org_task,
+                        "videos", video.sub_task_id, _task_video_svc, org_task, req)
     return org_task
 
 
+async def _on_video_job_done(job: FalJob):
+    data = None
+    if job.status == FalJobStatus.COMPLETED:
+        _view_url = parse_fal_video_url(job.result)
+        if _view_url:
+            try:
+                a_view_url = await download_and_upload_url(_view_url)
+                data = GenVideoResp(out_id="", view_url=a_view_url, download_url="")
+            except Exception as e:
+                logging.error(f"M _on_video_job_done upload error: {e}", exc_info=True)
+
+    if data:
+        fields = {
+            "output": data.model_dump(),
+            "status": TaskStatus.DONE,
+            "done_at": datetime.datetime.now(),
+        }
+        fee = Fee.total_fee([
+            Fee.video_fee(),
+        ])
+        # in progress only, a redelivered job must not add its fee twice
+        updated = await aigc_task_update_sub_task(job.task_id, "videos", job.sub_task_id, fields,
+                                                  push={"fee": fee.model_dump()},
+                                                  draft={f"videos.{job.sub_task_id}": data.view_url},
+                                                  expected_status=TaskStatus.IN_PROGRESS)
+        if updated and GEN_MEMO.enabled("video"):
+            task = await aigc_task_get_by_id(job.task_id)
+            video = next((v for v in task.videos if v.sub_task_id == job.sub_task_id), None) if task else None
+            if video and video.memo_key:
+                await GEN_MEMO.put("video", video.memo_key, data.model_dump())
+    else:
+        updated = await aigc_task_update_sub_task(job.task_id, "videos", job.sub_task_id, {
+            "status": TaskStatus.CANCELLED if job.status == FalJobStatus.CANCELLED else TaskStatus.FAILED,
+            "done_at": datetime.datetime.now(),
+        }, expected_status=TaskStatus.IN_PROGRESS)
+    if not updated:
+        logging.info(f"M _on_video_job_done discard stale result {job.request_id} sub_task: {job.sub_task_id}")
+
+
+FAL_JOBS.register_handler("video", _on_video_job_done)
+
+
+async def _materialize_draft(task: AIGCTask) -> DigitalHumanDraft:
+    """
+    Rebuild the digital human draft of a ready task from its sub tasks, for tasks created
+    before drafts were maintained or whose draft missed an update
+    """
+    fee_total = 0.0
+    for sub_task in [task.cover, task.lyrics, task.music, task.audio, *task.videos]:
+        for fee in sub_task.fee:
+            fee_total += fee.amount
+
+    audios = list(task.audio.output)
+    for h in task.audio.history:
+        audios.extend(Audio(**h).output)
+
+    draft = DigitalHumanDraft(
+        materialized=True,
+        videos={v.sub_task_id: v.output.view_url for v in task.videos if v.status == TaskStatus.DONE},
+        songs={
+            "lyrics": task.lyrics.output.lyrics,
+            "lyrics_title": task.lyrics.output.title,
+            **{k.removeprefix("songs."): v for k, v in _music_draft(task.music.output).items()},
+        },
+        audios=audios,
+        fee_total=fee_total,
+        **_cover_draft(task.cover.output),
+    )
+    await aigc_task_set_fields(task.task_id, {"draft": draft.model_dump()})
+    logging.info(f"M materialized digital human draft of {task.task_id}")
+    return draft
+
+
 async def aigc_task_publish_by_id(req: AIGCPublishReq, user_dict: dict, background: BackgroundTasks) -> DigitalHuman:
     wallet_address = user_dict.get("wallet_address", "")
     task: AIGCTask = await aigc_task_get_by_id(req.task_id)
@@ -540,36 +866,20 @@ async def aigc_task_publish_by_id(req: AIGCPublishReq, user_dict: dict, backgrou
     task.check_all_ready()
 
     org = await digital_human_get_by_digital_human(task.twitter_username)
-    update = False
-    if org:
-        if org.from_task_id != task.task_id:
-            raise_error("username is repeated")
-        else:
-            update = True
+    if org and org.from_task_id != task.task_id:
+        raise_error("username is repeated")
+
+    # the draft is kept up to date as sub tasks finish, publishing copies it
+    draft = task.draft if task.draft.materialized else await _materialize_draft(task)
 
-    if update:
+    if org:
         id = org.id
         created_at = org.created_at
-
-        sum = 0.0
-        for fee in task.cover.fee:
-            sum += fee.amount
-        for fee in task.lyrics.fee:
-            sum += fee.amount
-        for fee in task.music.fee:
-            sum += fee.amount
-        for fee in task.audio.fee:
-            sum += fee.amount
-        for video in task.videos:
-            for fee in video.fee:
-                sum += fee.amount
         fee = org.fee
-        for fee in fee:
-            sum -= fee.amount
         fee.append(Fee.total_fee([
             Fee(
                 name="item",
-                amount=sum,
+                amount=draft.fee_total - sum(f.amount for f in fee),
                 items=[],
             ),
         ]))
@@ -578,20 +888,8 @@ async def aigc_task_publish_by_id(req: AIGCPublishReq, user_dict: dict, backgrou
         created_at = datetime.datetime.now()
         fee = []
 
-    videos: list[DigitalVideo] = []
-    for v in task.videos:
-        if v.status == TaskStatus.DONE and v.output.view_url:
-            videos.append(DigitalVideo(
-                key=v.input.key,
-                view_url=v.output.view_url,
-            ))
-
-    basic = TaskAndHuman(**task.model_dump())
-
-    audios = task.audio.output
-    if task.audio.history:
-        for h in task.audio.history:
-            audios.extend(Audio(**h).output)
+    videos = [DigitalVideo(key=v.input.key, view_url=draft.videos[v.sub_task_id])
+              for v in task.videos if draft.videos.get(v.sub_task_id)]
 
     bo = DigitalHuman(
         id=id,
@@ -599,27 +897,18 @@ async def aigc_task_publish_by_id(req: AIGCPublishReq, user_dict: dict, backgrou
         from_tenant_id=task.tenant_id,
         digital_name=task.twitter_username,
         publisher_wallet_address=wallet_address,
-        cover_img=task.cover.output.cover_img_url,
-        sing_image=task.cover.output.sing_first_frame_img_url,
-        figure_image=task.cover.output.figure_first_frame_img_url,
-        first_frame_image=task.cover.output.first_frame_img_url,
-        dance_image=task.cover.output.dance_first_frame_img_url,
+        cover_img=draft.cover_img,
+        sing_image=draft.sing_image,
+        figure_image=draft.figure_image,
+        first_frame_image=draft.first_frame_image,
+        dance_image=draft.dance_image,
         videos=videos,
         updated_at=datetime.datetime.now(),
         created_at=created_at,
-        songs={
-            "lyrics": task.lyrics.output.lyrics,
-            "lyrics_title": task.lyrics.output.title,
-            "music_audio_url": task.music.output.audio_url,
-            "music_style": task.music.output.style,
-            "music_model": task.music.output.model,
-            "music_voice": task.music.output.voice,
-            "music_response_format": task.music.output.response_format,
-            "music_speed": task.music.output.speed,
-        },
+        songs=draft.songs,
         fee=fee,
-        audios=audios,
-        **basic.model_dump()
+        audios=draft.audios,
+        **{f: getattr(task, f) for f in TaskAndHuman.model_fields},
     )
 
     await digital_human_save(bo)
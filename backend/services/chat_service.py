@@ -1,6 +1,7 @@
 import json
 from datetime import datetime
 
+from clients.governor import GOVERNOR
 from clients.llm_client import proxy_client
 from infra.db import messages_col
 
@@ -48,11 +49,11 @@ async def event_generator(conversation_id: str, user_message: str, twitter_accou
 
     messages = await build_history(conversation_id, twitter_account)
 
-    stream = await proxy_client.chat.completions.create(
+    stream = await GOVERNOR.call("proxy:grok-3", lambda: proxy_client.chat.completions.create(
         model="grok-3",
         messages=messages,
         stream=True,
-    )
+    ))
 
     full_content = ""
     async for chunk in stream:
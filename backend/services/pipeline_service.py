@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable
+
+from fastapi import BackgroundTasks
+
+from common.error import raise_error
+from config import SETTINGS
+from entities.dto import AIGCTask, GenerateAllReq, Pipeline, PipelineStage, PipelineStageStatus, TaskStatus, \
+    GenCoverImgReq, BasicInfoReq, GenerateLyricsReq, GenMusicReq, GenVideoReq, GenXAudioReq, SubTask
+from infra.db import aigc_task_get_by_id, aigc_task_set_fields, aigc_task_update_pipeline_stage
+from services.aigc_service import gen_cover_img_svc, save_basic_info, gen_lyrics_svc, gen_music_svc, gen_video_svc, \
+    gen_twitter_audio_svc
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One node of the generation DAG.
+
+    start submits the stage through its regular service function, which schedules the work on
+    the given BackgroundTasks; the stage is done once its sub task leaves IN_PROGRESS. A stage
+    with submit_deps starts once those stages are submitted, without waiting for them to finish,
+    and is skipped if one of their submits failed.
+    """
+
+    def __init__(self, name: str, deps: list[str],
+                 start: Callable[[AIGCTask, BackgroundTasks], Awaitable],
+                 sub_task: Callable[[AIGCTask], SubTask | None],
+                 submit_deps: list[str] | None = None):
+        self.name = name
+        self.deps = deps
+        self.start = start
+        self.sub_task = sub_task
+        self.submit_deps = submit_deps or []
+
+
+def build_stages(req: GenerateAllReq) -> list[Stage]:
+    """
+    Stages of a digital human and their dependencies: videos need the cover's first frames,
+    music needs the lyrics, the slogan audio needs the slogan (generated with the cover unless
+    given). Lyrics only read the cover input and start right after the cover is submitted.
+    """
+    stages = [
+        Stage("cover", [],
+              lambda task, bg: gen_cover_img_svc(
+                  GenCoverImgReq(task_id=task.task_id, x_link=req.x_link, img_url=req.img_url,
+                                 style_id=req.style_id, fresh=req.fresh), bg),
+              lambda task: task.cover),
+        Stage("lyrics", [],
+              lambda task, bg: gen_lyrics_svc(GenerateLyricsReq(task_id=task.task_id), bg),
+              lambda task: task.lyrics,
+              submit_deps=["cover"]),
+        Stage("music", ["lyrics"],
+              lambda task, bg: gen_music_svc(
+                  GenMusicReq(task_id=task.task_id, lyrics=task.lyrics.output.lyrics, style=req.music_style,
+                              reference_audio_url=req.music_reference_audio_url or task.voice_clone_url), bg),
+              lambda task: task.music),
+        Stage("audio", [] if req.slogan else ["cover"],
+              lambda task, bg: gen_twitter_audio_svc(
+                  GenXAudioReq(task_id=task.task_id, x_tts_urls=req.x_tts_urls), bg),
+              lambda task: task.audio),
+    ]
+    for key in req.video_keys:
+        stages.append(Stage(f"video_{key}", ["cover"],
+                            lambda task, bg, key=key: gen_video_svc(
+                                GenVideoReq(task_id=task.task_id, key=key, fresh=req.fresh), bg),
+                            lambda task, key=key: next((v for v in task.videos if v.input.key == key), None)))
+    return stages
+
+
+class PipelineRunner:
+    """
+    Runs the stages of one task as a DAG: every stage starts as soon as its dependencies are
+    done, so wall time follows the critical path (cover -> videos) instead of the sum of all
+    stages. Provider concurrency is still bounded by the governor limiters. Stage progress is
+    written to task.pipeline.
+    """
+
+    def __init__(self, task_id: str, pipeline_id: str, stages: list[Stage]):
+        self.task_id = task_id
+        self.pipeline_id = pipeline_id
+        self.stages = {stage.name: stage for stage in stages}
+        # service functions read-modify-write the task on submit, so submits run one at a time
+        self._submit_lock = asyncio.Lock()
+        self._submitted = {name: asyncio.Event() for name in self.stages}
+        self._submit_ok: dict[str, bool] = {}
+
+    async def run(self):
+        start = time.monotonic()
+        status: dict[str, PipelineStageStatus] = {name: PipelineStageStatus.PENDING for name in self.stages}
+        running: dict[asyncio.Task, str] = {}
+
+        while True:
+            for name, stage in self.stages.items():
+                if status[name] != PipelineStageStatus.PENDING:
+                    continue
+                deps = [status[d] for d in stage.deps]
+                if any(s in (PipelineStageStatus.FAILED, PipelineStageStatus.SKIPPED) for s in deps):
+                    status[name] = PipelineStageStatus.SKIPPED
+                    self._submit_done(name, False)
+                    await self._update(name, {"status": PipelineStageStatus.SKIPPED,
+                                              "error": "dependency failed"})
+                elif all(s == PipelineStageStatus.DONE for s in deps):
+                    status[name] = PipelineStageStatus.RUNNING
+                    running[asyncio.create_task(self._run_stage(stage))] = name
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                status[running.pop(task)] = task.result()
+
+        await self._update("", {}, {"done_at": datetime.datetime.now()})
+        logger.info(f"M pipeline {self.pipeline_id} of {self.task_id} finished in {time.monotonic() - start:.0f}s: "
+                    f"{ {name: str(s) for name, s in status.items()} }")
+
+    def _submit_done(self, name: str, ok: bool):
+        self._submit_ok[name] = ok
+        self._submitted[name].set()
+
+    async def _run_stage(self, stage: Stage) -> PipelineStageStatus:
+        # e.g. the lyrics read the cover input, which only exists once the cover is submitted
+        for dep in stage.submit_deps:
+            await self._submitted[dep].wait()
+        if not all(self._submit_ok.get(dep) for dep in stage.submit_deps):
+            self._submit_done(stage.name, False)
+            await self._update(stage.name, {"status": PipelineStageStatus.SKIPPED, "error": "dependency failed",
+                                            "done_at": datetime.datetime.now()})
+            return PipelineStageStatus.SKIPPED
+
+        await self._update(stage.name, {"status": PipelineStageStatus.RUNNING, "started_at": datetime.datetime.now()})
+        error = ""
+        try:
+            background = BackgroundTasks()
+            try:
+                async with self._submit_lock:
+                    task = await aigc_task_get_by_id(self.task_id)
+                    await stage.start(task, background)
+            except BaseException:
+                self._submit_done(stage.name, False)
+                raise
+            self._submit_done(stage.name, True)
+            await background()
+            sub_task_status = await self._wait(stage)
+            if sub_task_status != TaskStatus.DONE:
+                error = f"sub task {sub_task_status}"
+        except asyncio.TimeoutError:
+            error = "timed out"
+        except Exception as e:
+            logger.error(f"M pipeline stage {stage.name} of {self.task_id} error: {e}", exc_info=True)
+            error = str(e) or type(e).__name__
+
+        status = PipelineStageStatus.FAILED if error else PipelineStageStatus.DONE
+        await self._update(stage.name, {"status": status, "error": error, "done_at": datetime.datetime.now()})
+        return status
+
+    async def _wait(self, stage: Stage) -> TaskStatus:
+        """Wait for the stage's sub task to finish, video results arrive later through the fal poller"""
+        deadline = time.monotonic() + SETTINGS.PIPELINE_STAGE_TIMEOUT
+        while True:
+            task = await aigc_task_get_by_id(self.task_id)
+            sub_task = stage.sub_task(task)
+            if sub_task is None:
+                raise Exception("sub task not found")
+            if sub_task.status != TaskStatus.IN_PROGRESS:
+                return sub_task.status
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(SETTINGS.PIPELINE_POLL_INTERVAL)
+
+    async def _update(self, name: str, fields: dict, pipeline_fields: dict | None = None):
+        await aigc_task_update_pipeline_stage(self.task_id, self.pipeline_id, name, fields, pipeline_fields)
+
+
+async def generate_all_svc(req: GenerateAllReq, background: BackgroundTasks) -> AIGCTask:
+    """
+    Generate every part of a digital human in one request. Basic info is saved right away,
+    the stages run in the background and report progress in task.pipeline.
+    """
+    task = await aigc_task_get_by_id(req.task_id)
+    if not task:
+        raise_error("task not found")
+    if task.pipeline and not task.pipeline.done_at:
+        # a run older than two stage timeouts was lost, e.g. to a restart
+        stale_at = task.pipeline.created_at + datetime.timedelta(seconds=2 * SETTINGS.PIPELINE_STAGE_TIMEOUT)
+        if datetime.datetime.now() < stale_at:
+            raise_error("generation already in progress")
+
+    await save_basic_info(BasicInfoReq(task_id=req.task_id, gender=req.gender, slogan=req.slogan,
+                                       voice_clone_url=req.voice_clone_url, lang=req.lang), background)
+
+    stages = build_stages(req)
+    task.pipeline = Pipeline(
+        pipeline_id=str(uuid.uuid4()),
+        stages={stage.name: PipelineStage(name=stage.name, deps=stage.deps) for stage in stages},
+        created_at=datetime.datetime.now(),
+    )
+    await aigc_task_set_fields(task.task_id, {"pipeline": task.pipeline.model_dump()})
+
+    runner = PipelineRunner(task.task_id, task.pipeline.pipeline_id, stages)
+    background.add_task(runner.run)
+    return task
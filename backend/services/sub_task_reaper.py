@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+from typing import Iterator, Optional
+
+from clients.fal_jobs import FAL_JOBS
+from common.cancellation import SUB_TASK_RUNS
+from common.metrics import METRICS
+from config import SETTINGS
+from entities.dto import TaskStatus
+from infra.db import aigc_task_find_stale_sub_tasks, aigc_task_update_sub_task, create_aigc_task_indexes
+
+logger = logging.getLogger(__name__)
+
+_SUB_TASK_PATHS = ("cover", "lyrics", "music", "audio", "videos")
+
+
+def _parse_deadlines(value: str) -> dict[str, float]:
+    deadlines = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        path, seconds = item.split("=", 1)
+        try:
+            deadlines[path.strip()] = float(seconds)
+        except ValueError:
+            logging.warning(f"Invalid REAPER_DEADLINES entry: {item}")
+    return deadlines
+
+
+def _sub_tasks(doc: dict) -> Iterator[tuple[str, dict]]:
+    """(path, sub task) of every sub task of a raw task document"""
+    for path in _SUB_TASK_PATHS:
+        value = doc.get(path)
+        for sub_task in (value if path == "videos" else [value]) or []:
+            if sub_task:
+                yield path, sub_task
+
+
+class SubTaskReaper:
+    """
+    Settles sub tasks left IN_PROGRESS without a heartbeat for their deadline (REAPER_DEADLINES).
+
+    Generation runs in background tasks of the process that accepted the request, so a
+    restart leaves its sub tasks in progress forever. While queued or running, a sub task
+    renews heartbeat_at every REAPER_HEARTBEAT_INTERVAL, so only runs whose process is gone
+    go stale. A video whose fal request id is known is resumed through the fal job poller;
+    any other stale sub task is marked RETRYABLE so the user can generate it again. Runs at
+    startup and every REAPER_INTERVAL. Updates only apply to sub tasks still in progress, so
+    several processes can run the reaper at once.
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self.processing_task: Optional[asyncio.Task] = None
+        self._deadlines = _parse_deadlines(SETTINGS.REAPER_DEADLINES)
+        self._stats = {"runs": 0, "retryable": 0, "resumed": 0, "last_run_at": None}
+        METRICS.register_collector("sub_task_reaper", self.stats)
+
+    async def start(self):
+        """Start the periodic reaper, the first run happens right away"""
+        if self.is_running:
+            logger.warning("sub task reaper is already running")
+            return
+
+        await create_aigc_task_indexes()
+        self.is_running = True
+        self.processing_task = asyncio.create_task(self._process_loop())
+        logger.info("sub task reaper started")
+
+    async def stop(self):
+        """Stop the periodic reaper"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        if self.processing_task:
+            self.processing_task.cancel()
+            try:
+                await self.processing_task
+            except asyncio.CancelledError:
+                pass
+        logger.info("sub task reaper stopped")
+
+    def deadline(self, path: str) -> float:
+        return self._deadlines.get(path, SETTINGS.REAPER_DEFAULT_DEADLINE)
+
+    async def reap(self) -> dict[str, int]:
+        """
+        Settle one batch of stale sub tasks.
+
+        Returns:
+            Number of sub tasks per action, "resumed" or "retryable"
+        """
+        now = datetime.datetime.now()
+        cutoffs = {path: now - datetime.timedelta(seconds=self.deadline(path)) for path in _SUB_TASK_PATHS}
+        docs = await aigc_task_find_stale_sub_tasks(cutoffs, SETTINGS.REAPER_BATCH_SIZE)
+
+        counts: dict[str, int] = defaultdict(int)
+        for doc in docs:
+            for path, sub_task in _sub_tasks(doc):
+                alive_at = sub_task.get("heartbeat_at") or sub_task.get("created_at")
+                if sub_task.get("status") != TaskStatus.IN_PROGRESS or not alive_at or alive_at >= cutoffs[path]:
+                    continue
+                if SUB_TASK_RUNS.is_running(sub_task["sub_task_id"]):
+                    continue
+                try:
+                    action = await self._reap_sub_task(doc["task_id"], path, sub_task)
+                except Exception as e:
+                    logger.error(f"M reap {doc['task_id']} {path} {sub_task['sub_task_id']} failed: {e}",
+                                 exc_info=True)
+                    continue
+                if action:
+                    counts[action] += 1
+                    self._stats[action] += 1
+                    METRICS.incr("sub_task_reaper.reaped", path=path, action=action)
+
+        self._stats["runs"] += 1
+        self._stats["last_run_at"] = now.isoformat()
+        if counts:
+            logger.info(f"M sub task reaper scanned {len(docs)} tasks: {dict(counts)}")
+        return dict(counts)
+
+    @staticmethod
+    async def _reap_sub_task(task_id: str, path: str, sub_task: dict) -> str | None:
+        sub_task_id = sub_task["sub_task_id"]
+        request_id = sub_task.get("provider_request_id")
+        if path == "videos" and request_id:
+            resumed = await FAL_JOBS.resume(sub_task.get("provider_application") or SETTINGS.IMAGE_TO_VIDEO_V2,
+                                            request_id, "video", task_id, sub_task_id, sub_task["created_at"])
+            return "resumed" if resumed else None
+
+        fields = {"status": TaskStatus.RETRYABLE, "done_at": datetime.datetime.now()}
+        # finished cover variants are kept for the retry, the unfinished ones are retried
+        for variant, status in (sub_task.get("variants") or {}).items():
+            if status == TaskStatus.IN_PROGRESS:
+                fields[f"variants.{variant}"] = TaskStatus.RETRYABLE
+        updated = await aigc_task_update_sub_task(task_id, path, sub_task_id, fields,
+                                                  expected_status=TaskStatus.IN_PROGRESS)
+        if updated:
+            logger.info(f"M reaped stale {path} {sub_task_id} of {task_id}")
+        return "retryable" if updated else None
+
+    async def _process_loop(self):
+        """Main reaper loop"""
+        while self.is_running:
+            try:
+                await self.reap()
+                await asyncio.sleep(SETTINGS.REAPER_INTERVAL)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in sub task reaper loop: {e}", exc_info=True)
+                await asyncio.sleep(SETTINGS.REAPER_INTERVAL)
+
+    def stats(self) -> dict:
+        return {**self._stats, "deadlines": {path: self.deadline(path) for path in _SUB_TASK_PATHS}}
+
+
+# Global reaper instance
+SUB_TASK_REAPER = SubTaskReaper()
+
+
+async def start_sub_task_reaper():
+    """Start the sub task reaper"""
+    await SUB_TASK_REAPER.start()
+
+
+async def stop_sub_task_reaper():
+    """Stop the sub task reaper"""
+    await SUB_TASK_REAPER.stop()
@@ -0,0 +1,106 @@
+import datetime
+import logging
+from collections import defaultdict
+from typing import Iterator
+
+from common.ttl_cache import AsyncTTLCache
+from config import SETTINGS
+from entities.dto import AIGCTask, StageTimingStat, TaskStatus
+from infra.db import aigc_task_find_updated_since, create_aigc_task_indexes
+
+_SUB_TASK_FIELDS = ("cover", "lyrics", "music", "audio")
+
+_stats_cache = AsyncTTLCache("timing_stats", ttl=SETTINGS.TIMING_STATS_TTL, max_size=16)
+_indexes_created = False
+
+
+def _runs(doc: dict) -> Iterator[tuple[str, dict]]:
+    """(kind, run) of every sub task run of a raw task document, including earlier runs in history"""
+    sub_tasks = [(name, doc.get(name)) for name in _SUB_TASK_FIELDS]
+    sub_tasks += [("video", v) for v in doc.get("videos") or []]
+    for kind, sub_task in sub_tasks:
+        if not sub_task:
+            continue
+        yield kind, sub_task
+        for run in sub_task.get("history") or []:
+            yield kind, run
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+async def _load_stats(window: float) -> list[StageTimingStat]:
+    global _indexes_created
+    if not _indexes_created:
+        # the window query is backed by the updated_at index
+        _indexes_created = True
+        await create_aigc_task_indexes()
+    since = datetime.datetime.now() - datetime.timedelta(seconds=window)
+    docs = await aigc_task_find_updated_since(since, SETTINGS.TIMING_STATS_MAX_TASKS)
+
+    samples: dict[tuple[str, str, str], list[tuple[float, bool]]] = defaultdict(list)
+    for doc in docs:
+        for kind, run in _runs(doc):
+            status = run.get("status")
+            created_at, done_at = run.get("created_at"), run.get("done_at")
+            if status in (TaskStatus.DONE, TaskStatus.FAILED, TaskStatus.RETRYABLE) and created_at and done_at:
+                samples[(kind, "total", "")].append(((done_at - created_at).total_seconds(),
+                                                     status == TaskStatus.DONE))
+            for span in run.get("timings") or []:
+                samples[(kind, span["stage"], span.get("provider", ""))].append((span["duration"],
+                                                                                 span.get("ok", True)))
+
+    stats = []
+    for (kind, stage, provider), values in sorted(samples.items()):
+        ordered = sorted(d for d, ok in values if ok)
+        stats.append(StageTimingStat(
+            kind=kind,
+            stage=stage,
+            provider=provider,
+            count=len(values),
+            p50=round(_percentile(ordered, 0.5), 3) if ordered else 0,
+            p95=round(_percentile(ordered, 0.95), 3) if ordered else 0,
+            error_rate=round(1 - len(ordered) / len(values), 3),
+        ))
+    logging.info(f"M timing stats loaded from {len(docs)} tasks, {len(stats)} series")
+    return stats
+
+
+async def timing_stats_svc(window: float | None = None) -> list[StageTimingStat]:
+    """
+    p50/p95 duration per sub task kind, stage and provider over the tasks updated within window
+    seconds; stage "total" is the time from submit to done. Cached for TIMING_STATS_TTL.
+    """
+    window = window or SETTINGS.TIMING_STATS_WINDOW
+    return await _stats_cache.get_or_load(window, lambda: _load_stats(window))
+
+
+def _eta(total: StageTimingStat | None, elapsed: float) -> float | None:
+    """Remaining seconds by the median total, by the p95 once past the median, None past the p95"""
+    if not total or total.count < SETTINGS.TIMING_ETA_MIN_SAMPLES or not total.p50:
+        return None
+    for expected in (total.p50, total.p95):
+        if expected > elapsed:
+            return round(expected - elapsed, 1)
+    return None
+
+
+async def fill_eta(task: AIGCTask) -> AIGCTask:
+    """Set eta_seconds on the in-progress sub tasks of task"""
+    sub_tasks = [(name, getattr(task, name)) for name in _SUB_TASK_FIELDS]
+    sub_tasks += [("video", v) for v in task.videos]
+    sub_tasks = [(kind, s) for kind, s in sub_tasks if s and s.status == TaskStatus.IN_PROGRESS]
+    if not sub_tasks:
+        return task
+
+    try:
+        stats = await timing_stats_svc()
+    except Exception as e:
+        logging.warning(f"M timing stats unavailable: {e}")
+        return task
+    totals = {s.kind: s for s in stats if s.stage == "total"}
+    now = datetime.datetime.now()
+    for kind, sub_task in sub_tasks:
+        sub_task.eta_seconds = _eta(totals.get(kind), (now - sub_task.created_at).total_seconds())
+    return task
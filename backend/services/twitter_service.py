@@ -6,12 +6,11 @@ import re
 import secrets
 from urllib.parse import urlencode
 
-from aiohttp import ClientSession
-
 from clients.x_api_io_client import x_get_user_info_by_username, x_get_user_last_tweets_by_username
 from config import SETTINGS
 from entities.bo import TwitterBO, Country
 from infra.db import x_oauth_col, get_profile_by_tenant_id, profile_save, add_points, xapi_user_col
+from infra.http_session import HTTP
 
 AUTH_URL = "https://twitter.com/i/oauth2/authorize"
 TOKEN_URL = "https://api.twitter.com/2/oauth2/token"
@@ -102,34 +101,32 @@ async def twitter_callback_svc(code: str, state: str):
     basic_token = base64.b64encode(
         f"{SETTINGS.X_APP_CLIENT_ID}:{SETTINGS.X_APP_CLIENT_SECRET}".encode()
     ).decode()
-    async with ClientSession() as session:
-        async with session.post(
-                TOKEN_URL,
-                data={
-                    "client_id": SETTINGS.X_APP_CLIENT_ID,
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": SETTINGS.X_APP_REDIRECT_URI,
-                    "code_verifier": oauth2_params["code_verifier"],
-                },
-                headers={
-                    "Content-Type": "application/x-www-form-urlencoded",
-                    "Authorization": f"Basic {basic_token}"
-                },
-        ) as resp:
-            token_data = await resp.json()
-            logging.info(f"M Token response: {token_data}")
+    async with HTTP.session().post(
+            TOKEN_URL,
+            data={
+                "client_id": SETTINGS.X_APP_CLIENT_ID,
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": SETTINGS.X_APP_REDIRECT_URI,
+                "code_verifier": oauth2_params["code_verifier"],
+            },
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Authorization": f"Basic {basic_token}"
+            },
+    ) as resp:
+        token_data = await resp.json()
+        logging.info(f"M Token response: {token_data}")
 
     access_token = token_data.get("access_token")
     if not access_token:
         logging.error(f"M No access token found: {token_data}")
 
-    async with ClientSession() as session:
-        async with session.get(
-                USERINFO_URL,
-                headers={"Authorization": f"Bearer {access_token}"}
-        ) as user_resp:
-            user_data = await user_resp.json()
+    async with HTTP.session().get(
+            USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"}
+    ) as user_resp:
+        user_data = await user_resp.json()
 
     x_username = user_data.get("data", {}).get("username")
     x_user_id = user_data.get("data", {}).get("id")
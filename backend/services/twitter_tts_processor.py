@@ -1,206 +1,273 @@
-# import asyncio
-# import logging
-# from datetime import datetime
-# from typing import Optional
-# from abc import ABC, abstractmethod
-#
-# from entities.dto import TwitterTTSTask, TaskType, TaskStatus
-# from infra.db import twitter_tts_task_save
-# from services import twitter_tts_service
-#
-# logger = logging.getLogger(__name__)
-#
-#
-# class TaskProcessorStrategy(ABC):
-#     """Abstract base class for task processing strategies"""
-#
-#     @abstractmethod
-#     async def process(self, task: TwitterTTSTask) -> bool:
-#         """Process a task and return success status"""
-#         pass
-#
-#
-# class TTSTaskProcessor(TaskProcessorStrategy):
-#     """Processor for standard TTS tasks"""
-#
-#     async def process(self, task: TwitterTTSTask) -> bool:
-#         """Process TTS task using the original logic"""
-#         return await twitter_tts_service._process_tts_task(task)
-#
-#
-# class VoiceCloneTaskProcessor(TaskProcessorStrategy):
-#     """Processor for voice cloning tasks"""
-#
-#     async def process(self, task: TwitterTTSTask) -> bool:
-#         """Process voice cloning task"""
-#         return await twitter_tts_service._process_voice_clone_task(task)
-#
-#
-# class MusicGenTaskProcessor(TaskProcessorStrategy):
-#     """Processor for music generation tasks"""
-#
-#     async def process(self, task: TwitterTTSTask) -> bool:
-#         """Process music generation task"""
-#         return await twitter_tts_service._process_music_gen_task(task)
-#
-#
-# class TaskProcessorFactory:
-#     """Factory for creating task processors based on task type"""
-#
-#     _processors = {
-#         TaskType.TTS: TTSTaskProcessor(),
-#         TaskType.VOICE_CLONE: VoiceCloneTaskProcessor(),
-#         TaskType.MUSIC_GEN: MusicGenTaskProcessor(),
-#     }
-#
-#     @classmethod
-#     def get_processor(cls, task_type: TaskType) -> TaskProcessorStrategy:
-#         """Get processor for the specified task type"""
-#         return cls._processors.get(task_type, cls._processors[TaskType.TTS])
-#
-#
-# class TwitterTTSProcessor:
-#     """Background processor for Twitter TTS tasks"""
-#
-#     def __init__(self, processing_interval: int = 30):
-#         """
-#         Initialize the processor
-#
-#         Args:
-#             processing_interval: Interval between processing cycles in seconds
-#         """
-#         self.processing_interval = processing_interval
-#         self.is_running = False
-#         self.processing_task: Optional[asyncio.Task] = None
-#
-#     async def start(self):
-#         """Start the background processor"""
-#         if self.is_running:
-#             logger.warning("Twitter TTS processor is already running")
-#             return
-#
-#         self.is_running = True
-#         self.processing_task = asyncio.create_task(self._process_loop())
-#         logger.info("Twitter TTS processor started")
-#
-#     async def stop(self):
-#         """Stop the background processor"""
-#         if not self.is_running:
-#             logger.warning("Twitter TTS processor is not running")
-#             return
-#
-#         self.is_running = False
-#         if self.processing_task:
-#             self.processing_task.cancel()
-#             try:
-#                 await self.processing_task
-#             except asyncio.CancelledError:
-#                 pass
-#         logger.info("Twitter TTS processor stopped")
-#
-#     async def _process_loop(self):
-#         """Main processing loop"""
-#         while self.is_running:
-#             try:
-#                 await self._process_pending_tasks()
-#                 await asyncio.sleep(self.processing_interval)
-#             except asyncio.CancelledError:
-#                 break
-#             except Exception as e:
-#                 logger.error(f"Error in Twitter TTS processing loop: {e}", exc_info=True)
-#                 await asyncio.sleep(self.processing_interval)
-#
-#     async def _process_pending_tasks(self):
-#         """Process all pending Twitter TTS tasks"""
-#         try:
-#             # Get pending tasks
-#             pending_tasks = await twitter_tts_service.get_pending_twitter_tts_tasks()
-#
-#             if not pending_tasks:
-#                 logger.debug("No pending Twitter TTS tasks to process")
-#                 return
-#
-#             logger.info(f"Processing {len(pending_tasks)} pending Twitter TTS tasks")
-#
-#             # Process tasks concurrently (with limit to avoid overwhelming the system)
-#             semaphore = asyncio.Semaphore(3)  # Process max 3 tasks concurrently
-#
-#             async def process_single_task(task: TwitterTTSTask):
-#                 async with semaphore:
-#                     try:
-#                         # Use strategy pattern to process task based on type
-#                         processor = TaskProcessorFactory.get_processor(task.task_type)
-#                         await processor.process(task)
-#                     except Exception as e:
-#                         logger.error(f"Error processing task {task.task_id}: {e}", exc_info=True)
-#                         # Update task with error
-#                         task.status = TaskStatus.FAILED
-#                         task.error_message = str(e)
-#                         task.updated_at = datetime.now()
-#                         await twitter_tts_task_save(task)
-#
-#             # Create tasks for concurrent processing
-#             tasks = [process_single_task(task) for task in pending_tasks]
-#
-#             # Wait for all tasks to complete
-#             await asyncio.gather(*tasks, return_exceptions=True)
-#
-#             logger.info(f"Completed processing {len(pending_tasks)} Twitter TTS tasks")
-#
-#         except Exception as e:
-#             logger.error(f"Error in _process_pending_tasks: {e}", exc_info=True)
-#
-#     async def process_single_task(self, task_id: str) -> bool:
-#         """
-#         Process a single Twitter TTS task by ID
-#
-#         Args:
-#             task_id: Task ID to process
-#
-#         Returns:
-#             True if successful, False otherwise
-#         """
-#         try:
-#             task = await twitter_tts_service.get_twitter_tts_task(task_id)
-#             if not task:
-#                 logger.error(f"Task {task_id} not found")
-#                 return False
-#
-#             if task.status != "in_progress":
-#                 logger.warning(f"Task {task_id} is not in progress status: {task.status}")
-#                 return False
-#
-#             # Use strategy pattern to process task based on type
-#             processor = TaskProcessorFactory.get_processor(task.task_type)
-#             return await processor.process(task)
-#
-#         except Exception as e:
-#             logger.error(f"Error processing single task {task_id}: {e}", exc_info=True)
-#             return False
-#
-#
-# # Global processor instance
-# twitter_tts_processor = TwitterTTSProcessor()
-#
-#
-# async def start_twitter_tts_processor():
-#     """Start the Twitter TTS processor"""
-#     await twitter_tts_processor.start()
-#
-#
-# async def stop_twitter_tts_processor():
-#     """Stop the Twitter TTS processor"""
-#     await twitter_tts_processor.stop()
-#
-#
-# async def process_twitter_tts_task_immediately(task_id: str) -> bool:
-#     """
-#     Process a Twitter TTS task immediately without waiting for the background processor
-#
-#     Args:
-#         task_id: Task ID to process
-#
-#     Returns:
-#         True if successful, False otherwise
-#     """
-#     return await twitter_tts_processor.process_single_task(task_id)
\ No newline at end of file
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+
+from clients.circuit_breaker import track_open_circuits
+from clients.x_api_io_client import x_get_tweets_by_ids
+from common.metrics import METRICS
+from common.scheduler import SCHEDULER, Priority, SchedulerQueueFull
+from config import SETTINGS
+from entities.dto import TwitterTTSTask, TaskType, TaskStatus
+from infra.db import twitter_tts_task_claim, twitter_tts_task_renew_lease, twitter_tts_task_release, \
+    twitter_tts_task_finish, create_twitter_tts_indexes
+from services import twitter_tts_service
+
+logger = logging.getLogger(__name__)
+
+
+class TaskProcessorStrategy(ABC):
+    """Abstract base class for task processing strategies"""
+
+    # scheduler pool the task runs in, shared with the aigc sub tasks of the same kind
+    pool = "tts"
+
+    @abstractmethod
+    async def process(self, task: TwitterTTSTask) -> bool:
+        """Process a task, setting its results on it, and return success status"""
+        pass
+
+
+class TTSTaskProcessor(TaskProcessorStrategy):
+    """Processor for standard TTS tasks"""
+
+    async def process(self, task: TwitterTTSTask) -> bool:
+        return await twitter_tts_service._process_tts_task(task)
+
+
+class VoiceCloneTaskProcessor(TaskProcessorStrategy):
+    """Processor for voice cloning tasks"""
+
+    async def process(self, task: TwitterTTSTask) -> bool:
+        return await twitter_tts_service._process_voice_clone_task(task)
+
+
+class MusicGenTaskProcessor(TaskProcessorStrategy):
+    """Processor for music generation tasks"""
+
+    pool = "music"
+
+    async def process(self, task: TwitterTTSTask) -> bool:
+        return await twitter_tts_service._process_music_gen_task(task)
+
+
+class TaskProcessorFactory:
+    """Factory for creating task processors based on task type"""
+
+    _processors = {
+        TaskType.TTS: TTSTaskProcessor(),
+        TaskType.VOICE_CLONE: VoiceCloneTaskProcessor(),
+        TaskType.MUSIC_GEN: MusicGenTaskProcessor(),
+    }
+
+    @classmethod
+    def get_processor(cls, task_type: TaskType) -> TaskProcessorStrategy:
+        """Get processor for the specified task type"""
+        return cls._processors.get(task_type, cls._processors[TaskType.TTS])
+
+
+def _parse_concurrency(value: str) -> dict[TaskType, int]:
+    concurrency = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        task_type, limit = item.split("=", 1)
+        try:
+            concurrency[TaskType(task_type.strip())] = int(limit)
+        except ValueError:
+            logging.warning(f"Invalid TWITTER_TTS_CONCURRENCY entry: {item}")
+    return concurrency
+
+
+class TwitterTTSProcessor:
+    """
+    Claim-based background worker for Twitter TTS tasks (/api/twitter-tts/create).
+
+    Each task type runs in its own lane with up to TWITTER_TTS_CONCURRENCY tasks in flight.
+    A lane claims the oldest unleased in-progress task with an atomic find_one_and_update
+    and holds a lease on it, renewed while the task runs; only the lease owner stores the
+    result. Any number of processes can run the processor, and a task whose worker died is
+    claimed again once its lease expires, up to TWITTER_TTS_MAX_ATTEMPTS times. The tweets
+    of a claimed batch are fetched together, and a lane claims again as soon as one of its
+    tasks finishes, so the queue drains at the configured capacity.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_running = False
+        self._concurrency = _parse_concurrency(SETTINGS.TWITTER_TTS_CONCURRENCY)
+        self._lanes: list[asyncio.Task] = []
+        self._in_flight: dict[TaskType, set[asyncio.Task]] = defaultdict(set)
+        self._wakeups: dict[TaskType, asyncio.Event] = defaultdict(asyncio.Event)
+        self._stats: dict[str, dict] = defaultdict(lambda: {"claimed": 0, "done": 0, "failed": 0, "released": 0,
+                                                            "lost": 0})
+        METRICS.register_collector("twitter_tts_processor", self.stats)
+
+    async def start(self):
+        """Start one lane per task type"""
+        if self.is_running:
+            logger.warning("Twitter TTS processor is already running")
+            return
+
+        await create_twitter_tts_indexes()
+        self.is_running = True
+        for task_type in TaskType:
+            if self._concurrency.get(task_type, 0) > 0:
+                self._lanes.append(asyncio.create_task(self._lane(task_type)))
+        logger.info(f"Twitter TTS processor {self.worker_id} started")
+
+    async def stop(self):
+        """Stop the lanes, tasks still running are given back for other workers to claim"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        running = [t for tasks in self._in_flight.values() for t in tasks]
+        for task in self._lanes + running:
+            task.cancel()
+        await asyncio.gather(*self._lanes, *running, return_exceptions=True)
+        self._lanes = []
+        logger.info("Twitter TTS processor stopped")
+
+    def wake(self, task_type: TaskType | None = None):
+        """Claim right away instead of at the next poll, e.g. after a task was created"""
+        for t in [task_type] if task_type else list(TaskType):
+            self._wakeups[t].set()
+
+    async def _lane(self, task_type: TaskType):
+        """Claim and run tasks of one type while there is capacity"""
+        limit = self._concurrency[task_type]
+        in_flight = self._in_flight[task_type]
+        wakeup = self._wakeups[task_type]
+        while self.is_running:
+            try:
+                wakeup.clear()
+                claimed = []
+                while len(in_flight) + len(claimed) < limit:
+                    task = await twitter_tts_task_claim(task_type, self.worker_id, SETTINGS.TWITTER_TTS_LEASE)
+                    if not task:
+                        break
+                    claimed.append(task)
+
+                if claimed:
+                    self._stats[task_type]["claimed"] += len(claimed)
+                    await self._prefetch_tweets(claimed)
+                    for task in claimed:
+                        run = asyncio.create_task(self._run(task))
+                        in_flight.add(run)
+                        run.add_done_callback(in_flight.discard)
+                        run.add_done_callback(lambda _: wakeup.set())
+
+                try:
+                    await asyncio.wait_for(wakeup.wait(), SETTINGS.TWITTER_TTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in Twitter TTS {task_type} lane: {e}", exc_info=True)
+                await asyncio.sleep(SETTINGS.TWITTER_TTS_POLL_INTERVAL)
+
+    @staticmethod
+    async def _prefetch_tweets(tasks: list[TwitterTTSTask]):
+        """Fetch the tweets a batch reads in one xAPI request, the tasks then hit the tweet cache"""
+        ids = {task.tweet_id or twitter_tts_service.extract_tweet_id_from_url(task.twitter_url)
+               for task in tasks if task.task_type != TaskType.MUSIC_GEN and not task.read_content}
+        ids.discard(None)
+        ids.discard("")
+        if ids:
+            await x_get_tweets_by_ids(sorted(ids))
+
+    async def _run(self, task: TwitterTTSTask):
+        stats = self._stats[task.task_type]
+        if task.attempts > SETTINGS.TWITTER_TTS_MAX_ATTEMPTS:
+            await self._finish(task, TaskStatus.FAILED, f"gave up after {task.attempts - 1} attempts")
+            return
+
+        heartbeat = asyncio.create_task(self._renew_lease(task))
+        try:
+            processor = TaskProcessorFactory.get_processor(task.task_type)
+            ok, error, queue_full = False, "", False
+            with track_open_circuits() as open_circuits:
+                try:
+                    async with SCHEDULER.slot(processor.pool, task.tenant_id, Priority.BULK, task.task_id):
+                        ok = await processor.process(task)
+                except SchedulerQueueFull:
+                    queue_full = True
+                except Exception as e:
+                    logger.error(f"Error processing task {task.task_id}: {e}", exc_info=True)
+                    error = str(e)
+
+            if not ok and (open_circuits or queue_full):
+                # upstream unavailable or the tenant's queue is full, try again later without spending an attempt
+                await twitter_tts_task_release(task.task_id, self.worker_id, SETTINGS.TWITTER_TTS_RETRY_DELAY)
+                stats["released"] += 1
+                logger.info(f"M Twitter TTS task {task.task_id} released, open circuits: {sorted(set(open_circuits))}")
+                return
+            await self._finish(task, TaskStatus.DONE if ok else TaskStatus.FAILED, error or "processing failed")
+        except asyncio.CancelledError:
+            # shutting down, let another worker claim it right away
+            await asyncio.shield(twitter_tts_task_release(task.task_id, self.worker_id))
+            raise
+        finally:
+            heartbeat.cancel()
+
+    async def _renew_lease(self, task: TwitterTTSTask):
+        while True:
+            await asyncio.sleep(SETTINGS.TWITTER_TTS_LEASE / 3)
+            try:
+                if not await twitter_tts_task_renew_lease(task.task_id, self.worker_id, SETTINGS.TWITTER_TTS_LEASE):
+                    logger.warning(f"M Twitter TTS task {task.task_id} lease lost")
+                    return
+            except Exception as e:
+                logger.warning(f"M Twitter TTS task {task.task_id} lease renewal failed: {e}")
+
+    async def _finish(self, task: TwitterTTSTask, status: TaskStatus, error: str):
+        fields = {
+            "status": status,
+            "tweet_id": task.tweet_id,
+            "tweet_content": task.tweet_content,
+        }
+        if status == TaskStatus.DONE:
+            fields.update({"audio_url": task.audio_url, "title": task.title, "error_message": None,
+                           "completed_at": datetime.now()})
+        else:
+            fields["error_message"] = error
+
+        stats = self._stats[task.task_type]
+        if not await twitter_tts_task_finish(task.task_id, self.worker_id, fields):
+            stats["lost"] += 1
+            logger.warning(f"M Twitter TTS task {task.task_id} lease lost, {status} result dropped")
+            return
+        stats["done" if status == TaskStatus.DONE else "failed"] += 1
+        METRICS.incr("twitter_tts_processor.finished", task_type=task.task_type, status=status)
+        logger.info(f"M Twitter TTS task {task.task_id} {status}")
+
+    def stats(self) -> dict:
+        return {
+            str(task_type): {
+                **self._stats[task_type],
+                "in_flight": len(self._in_flight[task_type]),
+                "concurrency": self._concurrency.get(task_type, 0),
+            }
+            for task_type in TaskType
+        }
+
+
+# Global processor instance
+twitter_tts_processor = TwitterTTSProcessor()
+
+
+async def start_twitter_tts_processor():
+    """Start the Twitter TTS processor"""
+    await twitter_tts_processor.start()
+
+
+async def stop_twitter_tts_processor():
+    """Stop the Twitter TTS processor"""
+    await twitter_tts_processor.stop()
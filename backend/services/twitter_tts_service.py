@@ -1,21 +1,28 @@
-import json
+import asyncio
 import logging
 import re
+import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Optional, AsyncIterator
 
-from agent.prompt.tts import LYRICS_PROMPT
-from clients.gen_img import gen_text
-from clients.tts_client import text_to_speech_svc
+from agent.prompt.tts import LYRICS_PROMPT, LYRICS_SCHEMA
+from clients.gen_img import gen_json
+from clients.tts_client import text_to_speech_svc, text_to_speech_stream_svc, text_to_speech_url_svc
+from clients.voice_profile import VOICE_PROFILES
 from clients.x_api_io_client import x_get_tweets_by_id
 from config import SETTINGS
 from entities.bo import TwitterTTSRequestBO, TwitterTTSResp
-from entities.dto import TwitterTTSTask, TwitterTTSTaskListResponse
-from infra.file import upload_audio_file
+from entities.dto import TwitterTTSTask, TwitterTTSTaskListResponse, TTSStreamRequest, TaskType, TaskStatus
+from infra.db import twitter_tts_task_save, twitter_tts_task_get_by_id, twitter_tts_task_get_by_username_and_url, \
+    twitter_tts_task_get_by_tenant
+from infra.file import upload_audio_file, S3StreamUpload
 from utils import remove_square_brackets
 
 logger = logging.getLogger(__name__)
 
+# stream uploads outlive the request that started them
+_stream_uploads: set[asyncio.Task] = set()
+
 
 def extract_tweet_id_from_url(twitter_url: str) -> Optional[str]:
     """
@@ -41,7 +48,7 @@ def extract_tweet_id_from_url(twitter_url: str) -> Optional[str]:
 
 async def create_twitter_tts_task(request: TwitterTTSRequestBO) -> TwitterTTSTask:
     """
-    Create a new Twitter TTS task
+    Create a new Twitter TTS task, processed by the background processor
     
     Args:
         request: Twitter TTS request business object
@@ -49,333 +56,151 @@ async def create_twitter_tts_task(request: TwitterTTSRequestBO) -> TwitterTTSTas
     Returns:
         Created TwitterTTSTask or existing one if duplicate
     """
-    # try:
-    #     # Check if task already exists for the same username + twitter_url + tenant_id
-    #     if request.username:
-    #         existing_task = await twitter_tts_task_get_by_username_and_url(
-    #             username=request.username,
-    #             twitter_url=request.twitter_url,
-    #             tenant_id=request.tenant_id
-    #         )
-    #         if existing_task:
-    #             logger.info(
-    #                 f"Task already exists for username {request.username} and URL {request.twitter_url}, returning existing task {existing_task.task_id}")
-    #             return existing_task
-    #
-    #     # Extract tweet ID from URL
-    #     tweet_id = extract_tweet_id_from_url(request.twitter_url) or ""
-    #     # if not tweet_id:
-    #     #     raise ValueError(f"Invalid Twitter URL: {request.twitter_url}")
-    #
-    #     # Create task
-    #     task = TwitterTTSTask(
-    #         task_id=str(uuid.uuid4()),
-    #         tenant_id=request.tenant_id,
-    #         twitter_url=request.twitter_url,
-    #         tweet_id=tweet_id,
-    #         task_type=TaskType(request.task_type) if request.task_type else TaskType.TTS,
-    #         voice=request.voice,
-    #         model=request.model,
-    #         response_format=request.response_format,
-    #         speed=request.speed,
-    #         voice_id=request.voice_id,
-    #         audio_url_input=request.audio_url,
-    #         username=request.username,
-    #         style=request.style,
-    #         status=TaskStatus.IN_PROGRESS,
-    #         created_at=datetime.now(),
-    #         updated_at=datetime.now(),
-    #         digital_human_id=request.digital_human_id,
-    #     )
-    #
-    #     # Save to database
-    #     await twitter_tts_task_save(task)
-    #     logger.info(f"Created Twitter TTS task {task.task_id} for tweet {tweet_id}")
-    #
-    #     return task
-    #
-    # except Exception as e:
-    #     logger.error(f"Error creating Twitter TTS task: {e}", exc_info=True)
-    #     raise
+    try:
+        # Check if task already exists for the same username + twitter_url + tenant_id
+        if request.username:
+            existing_task = await twitter_tts_task_get_by_username_and_url(
+                username=request.username,
+                twitter_url=request.twitter_url,
+                tenant_id=request.tenant_id
+            )
+            if existing_task:
+                logger.info(
+                    f"Task already exists for username {request.username} and URL {request.twitter_url}, returning existing task {existing_task.task_id}")
+                return existing_task
+
+        # Extract tweet ID from URL
+        tweet_id = extract_tweet_id_from_url(request.twitter_url) or ""
+
+        # Create task
+        task = TwitterTTSTask(
+            task_id=str(uuid.uuid4()),
+            tenant_id=request.tenant_id,
+            twitter_url=request.twitter_url,
+            tweet_id=tweet_id,
+            task_type=TaskType(request.task_type) if request.task_type else TaskType.TTS,
+            voice=request.voice,
+            model=request.model,
+            response_format=request.response_format,
+            speed=request.speed,
+            voice_id=request.voice_id,
+            audio_url_input=request.audio_url,
+            username=request.username,
+            style=request.style,
+            status=TaskStatus.IN_PROGRESS,
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
+            digital_human_id=request.digital_human_id,
+        )
+
+        # Save to database
+        await twitter_tts_task_save(task)
+        logger.info(f"Created Twitter TTS task {task.task_id} for tweet {tweet_id}")
+
+        return task
 
+    except Exception as e:
+        logger.error(f"Error creating Twitter TTS task: {e}", exc_info=True)
+        raise
 
-async def process_twitter_tts_task(task: TwitterTTSTask) -> bool:
-    """
-    Process a Twitter TTS task using strategy pattern
-    
-    Args:
-        task: Twitter TTS task to process
-        
-    Returns:
-        True if successful, False otherwise
-    """
-    # try:
-    #     logger.info(f"Processing Twitter TTS task {task.task_id} with type {task.task_type}")
-    #
-    #     # Update task status
-    #     task.status = TaskStatus.IN_PROGRESS
-    #     task.processing_started_at = datetime.now()
-    #     task.updated_at = datetime.now()
-    #     await twitter_tts_task_save(task)
-    #
-    #     # Use strategy pattern to process based on task type
-    #     if task.task_type == TaskType.TTS:
-    #         return await _process_tts_task(task)
-    #     elif task.task_type == TaskType.VOICE_CLONE:
-    #         return await _process_voice_clone_task(task)
-    #     elif task.task_type == TaskType.MUSIC_GEN:
-    #         return await _process_music_gen_task(task)
-    #     else:
-    #         logger.error(f"Unknown task type: {task.task_type}")
-    #         return False
-    #
-    # except Exception as e:
-    #     logger.error(f"Error processing Twitter TTS task {task.task_id}: {e}", exc_info=True)
-    #
-    #     # Update task with error
-    #     task.status = TaskStatus.FAILED
-    #     task.error_message = str(e)
-    #     task.updated_at = datetime.now()
-    #     await twitter_tts_task_save(task)
-    #
-    #     return False
+
+async def _fetch_tweet_text(task: TwitterTTSTask) -> str:
+    """Text of the task's tweet, also stored on the task; raises if it cannot be fetched"""
+    task.tweet_id = task.tweet_id or extract_tweet_id_from_url(task.twitter_url) or ""
+    if not task.tweet_id:
+        raise ValueError(f"Invalid Twitter URL: {task.twitter_url}")
+    # the processor prefetches the tweets of a claimed batch, this is normally a cache hit
+    tweet = await x_get_tweets_by_id(task.tweet_id)
+    if not tweet or not tweet.get("text"):
+        raise Exception(f"Failed to fetch tweet content for {task.tweet_id}")
+    task.tweet_content = tweet["text"]
+    return tweet["text"]
 
 
 async def _process_tts_task(task: TwitterTTSTask) -> bool:
     """
-    Process a standard TTS task (original logic)
+    Process a standard TTS task, reading the tweet aloud
     
     Args:
-        task: Twitter TTS task to process
+        task: Twitter TTS task to process, audio_url is set on success
         
     Returns:
         True if successful, False otherwise
     """
-    # try:
-    #     # Step 1: Fetch tweet content using twitter_client
-    #     tweet_summary = await get_tweet_summary(task.tweet_id)
-    #     if not tweet_summary or 'content' not in tweet_summary:
-    #         raise Exception(f"Failed to fetch tweet content for {task.tweet_id}")
-    #
-    #     tweet_content = tweet_summary['content']
-    #     if not tweet_content.get('full_text'):
-    #         raise Exception("Tweet content is empty")
-    #
-    #     # Extract tweet text
-    #     tweet_text = tweet_content['full_text']
-    #     task.tweet_content = tweet_text
-    #
-    #     # Step 2: Generate prompt
-    #     prompt = TTS_PROMPT.format(posts=tweet_text)
-    #
-    #     message = await call_model(prompt)
-    #     title = ""
-    #     if message and "#" in message:
-    #         title = message.split("#")[0]
-    #
-    #     # Step 3: Generate TTS audio with optional parameters
-    #     tts_kwargs = {
-    #         "text": message,
-    #         "voice": task.voice,
-    #         "model": task.model,
-    #         "response_format": task.response_format,
-    #         "speed": task.speed
-    #     }
-    #
-    #     # Add optional parameters if they exist
-    #     if task.voice_id:
-    #         tts_kwargs["voice_id"] = task.voice_id
-    #     if task.audio_url_input:
-    #         tts_kwargs["audio_url"] = task.audio_url_input
-    #
-    #     audio_data = await text_to_speech_svc(**tts_kwargs)
-    #
-    #     if not audio_data:
-    #         raise Exception("TTS generation failed")
-    #
-    #     # Step 4: Upload audio to object storage
-    #     file_extension = task.response_format
-    #     audio_url = await upload_audio_file(audio_data, file_extension)
-    #
-    #     if not audio_url:
-    #         raise Exception("Failed to upload audio file")
-    #
-    #     # Update task with success
-    #     task.audio_url = audio_url
-    #     task.status = TaskStatus.DONE
-    #     task.title = title
-    #     task.completed_at = datetime.now()
-    #     task.updated_at = datetime.now()
-    #     await twitter_tts_task_save(task)
-    #
-    #     digital_human = await digital_human_get_by_id(task.digital_human_id)
-    #     digital_human.tts_title = title
-    #     digital_human.tts_audio_url = audio_url
-    #     await digital_human_save(digital_human)
-    #
-    #     logger.info(f"Successfully processed TTS task {task.task_id}")
-    #     return True
-    #
-    # except Exception as e:
-    #     logger.error(f"Error processing TTS task {task.task_id}: {e}", exc_info=True)
-    #     raise
+    text = await _fetch_tweet_text(task)
+
+    tts_kwargs = {}
+    if task.voice_id:
+        tts_kwargs["voice_id"] = task.voice_id
+    if task.audio_url_input:
+        tts_kwargs["audio_url"] = task.audio_url_input
+
+    audio_url = await text_to_speech_url_svc(
+        text[:SETTINGS.TTS_MAX_CHARS],
+        voice=task.voice,
+        model=task.model,
+        response_format=task.response_format,
+        speed=task.speed or 1.0,
+        **tts_kwargs
+    )
+    if not audio_url:
+        raise Exception("TTS generation failed")
+
+    task.audio_url = audio_url
+    logger.info(f"Successfully processed TTS task {task.task_id}")
+    return True
 
 
 async def _process_voice_clone_task(task: TwitterTTSTask) -> bool:
     """
-    Process a voice cloning task
+    Process a voice cloning task, reading the tweet with the voice of audio_url_input
     
     Args:
-        task: Twitter TTS task to process
+        task: Twitter TTS task to process, audio_url is set on success
         
     Returns:
         True if successful, False otherwise
     """
-    # try:
-    #     # Step 1: Fetch tweet content using twitter_client
-    #     tweet_summary = await get_tweet_summary(task.tweet_id)
-    #     if not tweet_summary or 'content' not in tweet_summary:
-    #         raise Exception(f"Failed to fetch tweet content for {task.tweet_id}")
-    #
-    #     tweet_content = tweet_summary['content']
-    #     if not tweet_content.get('full_text'):
-    #         raise Exception("Tweet content is empty")
-    #
-    #     # Extract tweet text
-    #     tweet_text = tweet_content['full_text']
-    #     task.tweet_content = tweet_text
-    #
-    #     # Step 2: Generate prompt for voice cloning
-    #     prompt = TTS_PROMPT.format(posts=tweet_text)
-    #     message = await call_model(prompt)
-    #     title = ""
-    #     if message and "#" in message:
-    #         title = message.split("#")[0]
-    #
-    #     # Step 3: Generate voice cloned audio
-    #     if not task.audio_url_input:
-    #         raise Exception("Audio URL is required for voice cloning")
-    #
-    #     voice_clone_kwargs = {
-    #         "text": message,
-    #         "model": "speech-02-hd",  # Voice clone specific model
-    #         "response_format": task.response_format or "mp3",
-    #         "speed": task.speed or 1.0,
-    #         "audio_url": task.audio_url_input,
-    #         "voice_application": SETTINGS.VOICE_APPLICATION_CLONE
-    #     }
-    #
-    #     audio_data = await text_to_speech_svc(**voice_clone_kwargs)
-    #
-    #     if not audio_data:
-    #         raise Exception("Voice clone generation failed")
-    #
-    #     # Step 4: Upload audio to object storage
-    #     file_extension = task.response_format or "mp3"
-    #     audio_url = await upload_audio_file(audio_data, file_extension)
-    #
-    #     if not audio_url:
-    #         raise Exception("Failed to upload audio file")
-    #
-    #     # Update task with success
-    #     task.audio_url = audio_url
-    #     task.status = TaskStatus.DONE
-    #     task.title = title
-    #     task.completed_at = datetime.now()
-    #     task.updated_at = datetime.now()
-    #     await twitter_tts_task_save(task)
-    #
-    #     digital_human = await digital_human_get_by_id(task.digital_human_id)
-    #     digital_human.tts_title = title
-    #     digital_human.tts_audio_url = audio_url
-    #     await digital_human_save(digital_human)
-    #
-    #     logger.info(f"M Successfully processed voice clone task {task.task_id}")
-    #     return True
-    #
-    # except Exception as e:
-    #     logger.error(f"Error processing voice clone task {task.task_id}: {e}", exc_info=True)
-    #     raise
+    if not task.audio_url_input:
+        raise ValueError("Audio URL is required for voice cloning")
+
+    result = await voice_clone_svc(task, "")
+    if not result:
+        raise Exception("Voice clone generation failed")
+
+    task.audio_url = result.audio_url
+    return True
 
 
 async def _process_music_gen_task(task: TwitterTTSTask) -> bool:
     """
-    Process a music generation task
+    Process a music generation task, a song about the tweet's author
     
     Args:
-        task: Twitter TTS task to process
+        task: Twitter TTS task to process, audio_url and title are set on success
         
     Returns:
         True if successful, False otherwise
     """
-    # try:
-    #     # Step 1: Extract username from tweet URL
-    #     import re
-    #     url_match = re.search(r'https?://(?:www\.)?(?:x\.com|twitter\.com)/([^/]+)', task.twitter_url)
-    #     if url_match:
-    #         username = url_match.group(1)
-    #     else:
-    #         raise Exception("Username not provided and cannot be extracted from Twitter URL")
-    #
-    #     # Step 2: Get user context for music generation
-    #     from clients.twitter_client import get_user_music_generation_context, generate_music_prompt_from_context
-    #
-    #     logger.info(f"M Getting user context for music generation: {username}")
-    #     user_context = await get_user_music_generation_context(username)
-    #
-    #     if not user_context:
-    #         raise Exception(f"Failed to get user context for {username}, falling back to tweet-based generation")
-    #
-    #     # Step 3: Generate music prompt based on user context and style
-    #     style, profile_summary, tweets_summary = await generate_music_prompt_from_context(user_context, task.style)
-    #     music_prompt = SONG_PROMPT.format(style=style, content=profile_summary + '\n' + tweets_summary)
-    #     logger.info(
-    #         f"Generated music prompt for user {username} with style '{task.style}': {len(music_prompt)} characters")
-    #
-    #     # Step 4: Generate music using the enhanced prompt
-    #     # For now, we'll use TTS as a placeholder, but this would be replaced with actual music generation
-    #     logger.info(
-    #         f"Music generation for task {task.task_id} with enhanced user context - using placeholder TTS generation")
-    #
-    #     message = await call_model(music_prompt)
-    #     # Use the enhanced prompt for TTS generation
-    #     tts_kwargs = {
-    #         "text": None,
-    #         "prompt": message,
-    #         "voice": task.voice or "alloy",
-    #         "model": task.model or "tts-1",
-    #         "response_format": task.response_format or "mp3",
-    #         "speed": task.speed or 1.0,
-    #         "reference_audio_url": task.audio_url_input,
-    #         "voice_application": SETTINGS.VOICE_APPLICATION_MUSIC
-    #     }
-    #
-    #     audio_data = await text_to_speech_svc(**tts_kwargs)
-    #
-    #     if not audio_data:
-    #         raise Exception("Music generation failed")
-    #
-    #     # Step 5: Upload audio to object storage
-    #     file_extension = task.response_format or "mp3"
-    #     audio_url = await upload_audio_file(audio_data, file_extension)
-    #
-    #     if not audio_url:
-    #         raise Exception("Failed to upload audio file")
-    #
-    #     # Update task with success
-    #     task.audio_url = audio_url
-    #     task.status = TaskStatus.DONE
-    #     task.title = f"Music for @{username}"  # Set title based on username
-    #     task.completed_at = datetime.now()
-    #     task.updated_at = datetime.now()
-    #     await twitter_tts_task_save(task)
-    #
-    #     logger.info(f"M Successfully processed music generation task {task.task_id} for user {username}")
-    #     return True
-    #
-    # except Exception as e:
-    #     logger.error(f"M Error processing music generation task {task.task_id}: {e}", exc_info=True)
-    #     raise
+    lyrics = await generate_lyrics_from_twitter_url(task.twitter_url, task.tenant_id)
+    if not lyrics or not lyrics.get("lyrics"):
+        raise Exception(f"Lyrics generation failed for {task.twitter_url}")
+
+    music = await generate_music_from_lyrics(
+        lyrics["lyrics"],
+        task.style or "pop",
+        task.tenant_id,
+        voice=task.voice or "alloy",
+        model=task.model or "tts-1",
+        response_format=task.response_format or "mp3",
+        speed=task.speed or 1.0,
+        reference_audio_url=task.audio_url_input or "",
+    )
+
+    task.audio_url = music["audio_url"]
+    task.title = lyrics["title"]
+    logger.info(f"M Successfully processed music generation task {task.task_id}")
+    return True
 
 
 async def get_twitter_tts_task(task_id: str) -> Optional[TwitterTTSTask]:
@@ -388,11 +213,11 @@ async def get_twitter_tts_task(task_id: str) -> Optional[TwitterTTSTask]:
     Returns:
         TwitterTTSTask or None if not found
     """
-    # try:
-    #     return await twitter_tts_task_get_by_id(task_id)
-    # except Exception as e:
-    #     logger.error(f"Error getting Twitter TTS task {task_id}: {e}", exc_info=True)
-    #     return None
+    try:
+        return await twitter_tts_task_get_by_id(task_id)
+    except Exception as e:
+        logger.error(f"Error getting Twitter TTS task {task_id}: {e}", exc_info=True)
+        return None
 
 
 async def get_twitter_tts_tasks_by_tenant(
@@ -419,39 +244,25 @@ async def get_twitter_tts_tasks_by_tenant(
     Returns:
         TwitterTTSTaskListResponse
     """
-    # try:
-    #     tasks, total = await twitter_tts_task_get_by_tenant(tenant_id, page, page_size, status, task_type, style,
-    #                                                         username)
-    #
-    #     return TwitterTTSTaskListResponse(
-    #         tasks=tasks,
-    #         total=total,
-    #         page=page,
-    #         page_size=page_size
-    #     )
-    #
-    # except Exception as e:
-    #     logger.error(f"Error getting Twitter TTS tasks for tenant {tenant_id}: {e}", exc_info=True)
-    #     raise
+    try:
+        tasks, total = await twitter_tts_task_get_by_tenant(tenant_id, page, page_size, status, task_type, style,
+                                                            username)
 
+        return TwitterTTSTaskListResponse(
+            tasks=tasks,
+            total=total,
+            page=page,
+            page_size=page_size
+        )
 
-async def get_pending_twitter_tts_tasks() -> list[TwitterTTSTask]:
-    """
-    Get all pending Twitter TTS tasks
-    
-    Returns:
-        List of pending tasks
-    """
-    # try:
-    #     return await twitter_tts_task_get_pending()
-    # except Exception as e:
-    #     logger.error(f"Error getting pending Twitter TTS tasks: {e}", exc_info=True)
-    #     return []
+    except Exception as e:
+        logger.error(f"Error getting Twitter TTS tasks for tenant {tenant_id}: {e}", exc_info=True)
+        raise
 
 
 async def retry_failed_twitter_tts_task(task_id: str) -> bool:
     """
-    Retry a failed Twitter TTS task
+    Retry a failed Twitter TTS task, the processor picks it up again
     
     Args:
         task_id: Task ID to retry
@@ -459,31 +270,34 @@ async def retry_failed_twitter_tts_task(task_id: str) -> bool:
     Returns:
         True if retry initiated, False otherwise
     """
-    # try:
-    #     task = await twitter_tts_task_get_by_id(task_id)
-    #     if not task:
-    #         logger.error(f"Task {task_id} not found")
-    #         return False
-    #
-    #     if task.status != TaskStatus.FAILED:
-    #         logger.warning(f"Task {task_id} is not in failed status: {task.status}")
-    #         return False
-    #
-    #     # Reset task for retry
-    #     task.status = TaskStatus.IN_PROGRESS
-    #     task.error_message = None
-    #     task.processing_started_at = None
-    #     task.completed_at = None
-    #     task.updated_at = datetime.now()
-    #
-    #     await twitter_tts_task_save(task)
-    #     logger.info(f"Retry initiated for Twitter TTS task {task_id}")
-    #
-    #     return True
-    #
-    # except Exception as e:
-    #     logger.error(f"Error retrying Twitter TTS task {task_id}: {e}", exc_info=True)
-    #     return False
+    try:
+        task = await twitter_tts_task_get_by_id(task_id)
+        if not task:
+            logger.error(f"Task {task_id} not found")
+            return False
+
+        if task.status != TaskStatus.FAILED:
+            logger.warning(f"Task {task_id} is not in failed status: {task.status}")
+            return False
+
+        # Reset task for retry
+        task.status = TaskStatus.IN_PROGRESS
+        task.error_message = None
+        task.processing_started_at = None
+        task.completed_at = None
+        task.lease_owner = None
+        task.lease_until = None
+        task.attempts = 0
+        task.updated_at = datetime.now()
+
+        await twitter_tts_task_save(task)
+        logger.info(f"Retry initiated for Twitter TTS task {task_id}")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Error retrying Twitter TTS task {task_id}: {e}", exc_info=True)
+        return False
 
 
 async def get_all_predefined_voices(category: str = None, is_active: bool = True) -> tuple[list, int]:
@@ -521,13 +335,15 @@ async def get_predefined_voice_by_id(voice_id: str):
     #     return None
 
 
-async def generate_lyrics_from_twitter_url(twitter_url: str, tenant_id: str, lang: str = "English") -> dict:
+async def generate_lyrics_from_twitter_url(twitter_url: str, tenant_id: str, lang: str = "English",
+                                           bypass_cache: bool = False) -> dict:
     """
     Generate lyrics from Twitter URL by analyzing user profile and recent tweets
     
     Args:
         twitter_url: Twitter/X post URL
         tenant_id: Tenant ID for the request
+        bypass_cache: Ask the LLM again instead of reusing a cached response (regenerate)
         
     Returns:
         Dictionary containing generated lyrics and metadata
@@ -535,22 +351,10 @@ async def generate_lyrics_from_twitter_url(twitter_url: str, tenant_id: str, lan
     try:
 
         prompt = LYRICS_PROMPT.format(twitter_url=twitter_url, language=lang)
-        text = await gen_text(prompt)
-        logger.info(f"generate_lyrics_from_twitter_url LLM resp={text}")
-
-        pattern = re.compile(r'\{.*?\}', re.DOTALL)
-        match = pattern.search(text)
+        data = await gen_json(prompt, LYRICS_SCHEMA, "lyrics", bypass_cache=bypass_cache)
+        logger.info(f"generate_lyrics_from_twitter_url LLM resp={data}")
 
-        data = {}
-        if match:
-            json_str = match.group(0)
-            try:
-                data = json.loads(json_str)
-            except json.JSONDecodeError as e:
-                logger.error(e, exc_info=True)
-                raise
-
-        if not data or len(data) < 2:
+        if not data:
             return {}
 
         return {
@@ -651,7 +455,7 @@ async def voice_clone_svc(task: TwitterTTSTask, lang) -> TwitterTTSResp | None:
                 return None
             tweet_text = tweet['text']
             task.tweet_content = tweet_text
-            text = tweet_text[:280]
+            text = tweet_text[:SETTINGS.TTS_MAX_CHARS]
         voice_clone_kwargs = {
             "text": text,
             "model": "speech-02-hd",  # Voice clone specific model
@@ -661,18 +465,25 @@ async def voice_clone_svc(task: TwitterTTSTask, lang) -> TwitterTTSResp | None:
             "voice_application": SETTINGS.VOICE_APPLICATION_CLONE
         }
 
-        audio_data = await text_to_speech_svc(**voice_clone_kwargs)
-
-        if not audio_data:
-            logger.error("M Voice clone generation failed")
-            return None
-
-        # Step 4: Upload audio to object storage
-        file_extension = task.response_format or "mp3"
-        audio_url = await upload_audio_file(audio_data, file_extension)
+        # synthesize with the voice cloned once from the reference audio, the clone
+        # application (re-analyzing the reference every call) is the fallback
+        voice_id = await VOICE_PROFILES.voice_id(task.audio_url_input)
+        if voice_id:
+            profile_kwargs = {**voice_clone_kwargs, "voice_id": voice_id,
+                              "voice_application": SETTINGS.VOICE_APPLICATION_ID}
+            profile_kwargs.pop("audio_url")
+            # identical requests (same text and voice) are served from the TTS cache,
+            # long reads are split into sentences and synthesized concurrently
+            audio_url = await text_to_speech_url_svc(**profile_kwargs)
+            if not audio_url:
+                logger.warning(f"M Synthesis with voice profile {voice_id} failed, cloning again")
+                await VOICE_PROFILES.invalidate(task.audio_url_input)
+                audio_url = await text_to_speech_url_svc(**voice_clone_kwargs)
+        else:
+            audio_url = await text_to_speech_url_svc(**voice_clone_kwargs)
 
         if not audio_url:
-            logger.error("M Failed to upload audio file")
+            logger.error("M Voice clone generation failed")
             return None
 
         logger.info(f"M Successfully processed voice clone task {task.task_id}")
@@ -694,3 +505,64 @@ async def voice_clone_svc(task: TwitterTTSTask, lang) -> TwitterTTSResp | None:
     except Exception as e:
         logger.error(f"M Error processing voice clone task {task.task_id}: {e}", exc_info=True)
         return None
+
+
+async def text_to_speech_stream_upload_svc(req: TTSStreamRequest) -> tuple[str, AsyncIterator[bytes]]:
+    """
+    Synthesize speech and relay it chunk by chunk while a multipart upload persists it.
+
+    Synthesis and upload run in their own task, so the file is stored even if the client
+    disconnects. The first chunk is awaited here so failures surface before streaming starts.
+
+    Returns:
+        (url the audio will be stored at, async iterator of audio chunks)
+    """
+    kwargs = {
+        "text": req.text,
+        "voice": req.voice,
+        "model": req.model,
+        "response_format": req.response_format,
+        "speed": req.speed,
+    }
+    if req.voice_id:
+        kwargs["voice_id"] = req.voice_id
+    if req.audio_url:
+        kwargs["audio_url"] = req.audio_url
+        kwargs["model"] = "speech-02-hd"
+        kwargs["voice_application"] = SETTINGS.VOICE_APPLICATION_CLONE
+
+    upload = S3StreamUpload(req.response_format)
+    queue: asyncio.Queue[bytes | Exception | None] = asyncio.Queue()
+
+    async def _produce():
+        upload.start()
+        try:
+            async for chunk in text_to_speech_stream_svc(**kwargs):
+                upload.write(chunk)
+                queue.put_nowait(chunk)
+        except Exception as e:
+            logger.error(f"M TTS stream failed: {e}", exc_info=True)
+            await upload.abort()
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(None)
+        if await upload.finish():
+            logger.info(f"M TTS stream stored at {upload.url}, {upload.size} bytes")
+
+    task = asyncio.create_task(_produce())
+    _stream_uploads.add(task)
+    task.add_done_callback(_stream_uploads.discard)
+
+    first = await queue.get()
+    if isinstance(first, Exception):
+        raise first
+
+    async def _relay():
+        item = first
+        while item is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            item = await queue.get()
+
+    return upload.url, _relay()
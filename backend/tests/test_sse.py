@@ -0,0 +1,93 @@
+import asyncio
+import random
+
+import pytest
+
+from clients.sse import SSEDecoder, SSEEvent, iter_sse
+
+# every kind of line ending, comments, multi-line data, multi-byte characters and the [DONE] marker
+STREAM = (
+    ": keep-alive comment\n"
+    "event: delta\n"
+    "id: 1\n"
+    "data: {\"text\": \"héllo 世界 🎵\"}\n"
+    "\n"
+    "data: first line\r\n"
+    "data: second line\r\n"
+    ": comment between data lines\r\n"
+    "data:third line, no space\r\n"
+    "\r\n"
+    "retry: 3000\r"
+    "data: cr only ✓\r"
+    "\r"
+    "event: ignored, no data\n"
+    "\n"
+    "data: mixed\r\n"
+    "data: endings\r"
+    "data: 🎶🎶\n"
+    "\r\n"
+    "data: [DONE]\n"
+    "\n"
+).encode("utf-8")
+
+EXPECTED = [
+    SSEEvent(event="delta", data="{\"text\": \"héllo 世界 🎵\"}", id="1"),
+    SSEEvent(data="first line\nsecond line\nthird line, no space", id="1"),
+    SSEEvent(data="cr only ✓", id="1", retry=3000),
+    SSEEvent(data="mixed\nendings\n🎶🎶", id="1", retry=3000),
+    SSEEvent(data="[DONE]", id="1", retry=3000),
+]
+
+
+def _decode(chunks: list[bytes]) -> list[SSEEvent]:
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events += decoder.feed(chunk)
+    return events + decoder.flush()
+
+
+def _split(data: bytes, rng: random.Random) -> list[bytes]:
+    cuts = sorted(rng.sample(range(1, len(data)), rng.randint(1, min(40, len(data) - 1))))
+    return [data[i:j] for i, j in zip([0] + cuts, cuts + [len(data)])]
+
+
+def test_single_chunk():
+    assert _decode([STREAM]) == EXPECTED
+    assert EXPECTED[-1].is_done
+
+
+def test_byte_by_byte():
+    assert _decode([STREAM[i:i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_splits(seed):
+    chunks = _split(STREAM, random.Random(seed))
+    assert _decode(chunks) == _decode([STREAM])
+
+
+def test_crlf_split_across_chunks():
+    i = STREAM.index(b"\r\n")
+    assert _decode([STREAM[:i + 1], STREAM[i + 1:]]) == EXPECTED
+
+
+def test_utf8_split_mid_character():
+    i = STREAM.index("🎵".encode("utf-8"))
+    assert _decode([STREAM[:i + 2], STREAM[i + 2:]]) == EXPECTED
+
+
+def test_unterminated_last_event():
+    assert _decode([b"data: a\r\ndata: b\r"]) == [SSEEvent(data="a\nb")]
+
+
+def test_iter_sse_stops_on_done():
+    async def chunks():
+        for chunk in _split(STREAM, random.Random(0)):
+            yield chunk
+
+    async def collect(stop_on_done):
+        return [event async for event in iter_sse(chunks(), stop_on_done=stop_on_done)]
+
+    assert asyncio.run(collect(True)) == EXPECTED[:-1]
+    assert asyncio.run(collect(False)) == EXPECTED